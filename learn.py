@@ -32,9 +32,9 @@ if checkpoints:
     _, restart_checkpoint = checkpoints.pop()
 del checkpoints
 
-env = TinyScreen(gym.make("bkdk/BKDK-v0"))
-env._window = None
-env._clock = None
+# The screen is shown by a separate viewer process, which doesn't
+# slow down training.
+env = TinyScreen(gym.make("bkdk/BKDK-v0", render_mode="human"))
 env.reset(seed=seed)
 
 """
@@ -200,7 +200,6 @@ while True:  # Run until solved
             # Create a mask so we only calculate loss on the updated Q-values
             masks = tf.one_hot(action_sample, num_actions)
 
-            env._render_pygame("human")
             with tf.GradientTape() as tape:
                 # Train the model on the states and updated Q-values
                 q_values = model(state_sample)
@@ -225,6 +224,7 @@ while True:  # Run until solved
                 overwrite=True)
             # restart from checkpoint to work around memory leak
             # XXX or is it just the huge buffers? FIXME!
+            env.close()
             sys.stdout.flush()
             sys.stderr.flush()
             os.execl(sys.executable,
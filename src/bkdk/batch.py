@@ -0,0 +1,182 @@
+import numpy as np
+
+from .shapes import ALL_SHAPES
+
+BOARD_SIZE = 9
+NUM_CHOICES = 3
+NUM_POSITIONS = BOARD_SIZE**2
+NUM_ACTIONS = NUM_CHOICES * NUM_POSITIONS
+
+# Index used in BoardBatch.choices for an already-placed choice.
+EMPTY = len(ALL_SHAPES)
+
+_ROWMASK = (1 << BOARD_SIZE) - 1
+_BOXMASKS = np.array((0x1C0, 0x38, 0x7), dtype=np.int64)
+
+
+def _popcount9(x):
+    """Return the number of set bits in each (up to 9-bit) x."""
+    return _POPCOUNT[x]
+
+
+_POPCOUNT = np.array([bin(x).count("1") for x in range(1 << BOARD_SIZE)],
+                     dtype=np.int64)
+
+
+def _build_placement_tables():
+    """Build the per-(shape, position) lookup tables.  The extra
+    shape at index EMPTY is never placeable."""
+    num_shapes = len(ALL_SHAPES) + 1
+    rows = np.zeros((num_shapes, NUM_POSITIONS, BOARD_SIZE), dtype=np.int64)
+    valid = np.zeros((num_shapes, NUM_POSITIONS), dtype=bool)
+    padded = np.zeros((num_shapes,) + ALL_SHAPES[0]._np_padded.shape,
+                      dtype=np.uint8)
+    for index, shape in enumerate(ALL_SHAPES):
+        padded[index] = shape._np_padded
+        for row in range(BOARD_SIZE - shape.num_rows + 1):
+            for col in range(BOARD_SIZE - shape.num_columns + 1):
+                position = row * BOARD_SIZE + col
+                valid[index, position] = True
+                for i, o_row in enumerate(shape.rows):
+                    rows[index, position, row + i] = o_row << col
+
+    # Pack each placement's rows into two words (rows 0-6 and 7-8)
+    # so collision tests are two ANDs rather than nine.
+    lo, hi = _pack(rows)
+    return rows, lo, hi, valid, padded
+
+
+def _pack(rows):
+    rows = rows.astype(np.uint64)
+    shifts = np.arange(7, dtype=np.uint64) * BOARD_SIZE
+    lo = np.bitwise_or.reduce(rows[..., :7] << shifts, axis=-1)
+    hi = np.bitwise_or.reduce(rows[..., 7:] << shifts[:2], axis=-1)
+    return lo, hi
+
+
+(_PLACED_ROWS,
+ _PLACED_LO,
+ _PLACED_HI,
+ _PLACEABLE,
+ _PADDED_SHAPES) = _build_placement_tables()
+
+
+class ShapeStreams:
+    """Sequences of shape indexes, one per random number generator,
+    extended on demand.  Stream i deals the same shapes, in the same
+    order, as a Board created with rngs[i] would.
+    """
+    def __init__(self, rngs, chunk_size=192):
+        self._rngs = list(rngs)
+        self._chunk_size = chunk_size
+        self._shapes = np.empty((len(self._rngs), 0), dtype=np.int64)
+
+    def take(self, streams, positions):
+        """Return the shape at each of positions in each of streams."""
+        if positions.size and positions.max() >= self._shapes.shape[1]:
+            self._extend()
+        return self._shapes[streams, positions]
+
+    def _extend(self):
+        extra = np.array([rng.integers(len(ALL_SHAPES), size=self._chunk_size)
+                          for rng in self._rngs], dtype=np.int64)
+        self._shapes = np.hstack((self._shapes, extra))
+
+
+class BoardBatch:
+    """Many games of BKDK, stepped in lockstep with NumPy.
+
+    Each board is stored as nine 9-bit integers, like a Bitmap, and
+    follows the same rules as Board.one_move.  Board i draws its
+    shapes from stream streams[i] of shape_streams.
+    """
+    def __init__(self, shape_streams, streams):
+        num_boards = len(streams)
+        self._shape_streams = shape_streams
+        self.streams = np.asarray(streams, dtype=np.int64)
+        self.rows = np.zeros((num_boards, BOARD_SIZE), dtype=np.int64)
+        self.score = np.zeros(num_boards, dtype=np.int64)
+        self._dealt = np.zeros(num_boards, dtype=np.int64)
+        self.choices = np.full((num_boards, NUM_CHOICES), EMPTY,
+                               dtype=np.int64)
+        self._new_choices(np.ones(num_boards, dtype=bool))
+
+    def __len__(self):
+        return len(self.streams)
+
+    def _new_choices(self, where):
+        where = np.flatnonzero(where)
+        if not where.size:
+            return
+        positions = self._dealt[where, None] + np.arange(NUM_CHOICES)
+        self.choices[where] = self._shape_streams.take(
+            self.streams[where, None], positions)
+        self._dealt[where] += NUM_CHOICES
+
+    def select(self, where):
+        """Discard every board not selected by where."""
+        self.streams = self.streams[where]
+        self.rows = self.rows[where]
+        self.score = self.score[where]
+        self._dealt = self._dealt[where]
+        self.choices = self.choices[where]
+
+    @property
+    def observations(self):
+        """The boards and choices as a (N, 156) array, laid out as
+        gymnasium.spaces.utils.flatten lays out Env observations."""
+        bits = np.arange(BOARD_SIZE, dtype=np.int64)
+        board = (self.rows[:, :, None] >> bits) & 1
+        choices = _PADDED_SHAPES[self.choices]
+        return np.hstack((board.reshape((len(self), -1)),
+                          choices.reshape((len(self), -1))))
+
+    @property
+    def valid_actions(self):
+        """A (N, 243) boolean array of the actions that would place
+        a shape, indexed as Env.step's integer actions."""
+        lo, hi = _pack(self.rows)
+        valid = (_PLACEABLE[self.choices]
+                 & ((_PLACED_LO[self.choices] & lo[:, None, None]) == 0)
+                 & ((_PLACED_HI[self.choices] & hi[:, None, None]) == 0))
+        return valid.reshape((len(self), NUM_ACTIONS))
+
+    def one_move(self, actions):
+        """Perform one move on every board.  Every action must be
+        valid.  Returns the points resulting from each move."""
+        index = np.arange(len(self))
+        choice, position = np.divmod(actions, NUM_POSITIONS)
+        shape = self.choices[index, choice]
+        placed = _PLACED_ROWS[shape, position]
+
+        # Place the shape on the board
+        self.rows |= placed
+
+        # Resolve completed groupings and update score
+        saved_score = self.score.copy()
+        self.score += self.resolve() * 18
+        self.score += _popcount9(self.rows & placed).sum(axis=1)
+
+        # Update the choices for the next round
+        self.choices[index, choice] = EMPTY
+        self._new_choices((self.choices == EMPTY).all(axis=1))
+
+        return self.score - saved_score
+
+    def resolve(self):
+        """Resolve any solved sections, returning the number of
+        sections cleared on each board."""
+        rows = self.rows
+        full_rows = rows == _ROWMASK
+        full_cols = np.bitwise_and.reduce(rows, axis=1)
+        bands = np.bitwise_and.reduce(rows.reshape((-1, 3, 3)), axis=2)
+        full_boxes = (bands[:, :, None] & _BOXMASKS) == _BOXMASKS
+
+        # Clear completed lines and boxes
+        box_masks = (full_boxes * _BOXMASKS).sum(axis=2)
+        nonfull_mask = ~(full_cols[:, None] | np.repeat(box_masks, 3, axis=1))
+        self.rows = np.where(full_rows, 0, rows & nonfull_mask)
+
+        return (full_rows.sum(axis=1)
+                + _popcount9(full_cols)
+                + full_boxes.sum(axis=(1, 2)))
@@ -0,0 +1,519 @@
+"""Micro-benchmarks of the game engine, the environment and its
+wrappers, screenshot decoding and NEAT evaluation.
+
+Each benchmark is a function that sets up some state and returns a
+callable to time.  The callable returns the number of operations it
+performed, so results are reported per operation whatever the size
+of the workload.  Every benchmark is warmed up, then calibrated so
+that one repetition takes at least min_time seconds, then repeated;
+the statistics are of the per-operation time of each repetition.
+
+Results are written as JSON, and can be compared with a saved
+baseline: a benchmark whose median time exceeds the baseline's by
+more than the threshold is a regression, and makes the run fail.
+
+scaling measures how environment throughput scales with the number
+of worker processes, or threads, each stepping its own TinyScreen
+with bkdk.ts.core's profiling policy.
+"""
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import multiprocessing
+import platform
+import queue
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+
+import gymnasium as gym
+import numpy as np
+
+from .board import Board
+from .ts.core import TinyScreen, _profile_oneframe
+
+BENCHMARKS = {}
+
+# Files the screenshot and NEAT benchmarks need, from a source tree.
+_SOURCE_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+SCREENSHOTS = os.path.join(_SOURCE_DIR, "tests", "resources",
+                           "screenshots", "*.jpg")
+NEAT_CONFIG = os.path.join(_SOURCE_DIR, "neat.cfg")
+
+SEED = 186283
+
+
+class SkipBenchmark(Exception):
+    """Raised by a benchmark that can't run here."""
+
+
+def benchmark(name):
+    """Register the decorated function as the benchmark name."""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def _midgame_board(moves=6):
+    """Return a board after playing moves moves, always choosing
+    the first valid move."""
+    board = Board(random_number_generator=np.random.default_rng(SEED))
+    for _ in range(moves):
+        choice, rowcol = next(board.valid_moves)
+        board.one_move(choice, rowcol)
+    return board
+
+
+def _first_valid_moves(seed=SEED):
+    """Return the moves of a game played by always choosing the
+    first valid move."""
+    board = Board(random_number_generator=np.random.default_rng(seed))
+    moves = []
+    for move in iter(lambda: next(board.valid_moves, None), None):
+        board.one_move(*move)
+        moves.append(move)
+    return moves
+
+
+@benchmark("bitmap.can_place_at")
+def _bench_can_place_at():
+    board = _midgame_board()
+    shapes = [shape for shape in board.choices if shape is not None]
+    positions = [(row, column) for row in range(9) for column in range(9)]
+
+    def run():
+        for shape in shapes:
+            for rowcol in positions:
+                board._can_place_at(rowcol, shape)
+        return len(shapes) * len(positions)
+    return run
+
+
+@benchmark("board.resolve")
+def _bench_resolve():
+    board = _midgame_board()
+    rows = list(board.rows)
+
+    def run():
+        board.rows[:] = rows
+        board.resolve()
+        return 1
+    return run
+
+
+@benchmark("board.one_move")
+def _bench_one_move():
+    moves = _first_valid_moves()
+
+    def run():
+        board = Board(random_number_generator=np.random.default_rng(SEED))
+        for choice, rowcol in moves:
+            board.one_move(choice, rowcol)
+        return len(moves)
+    return run
+
+
+@benchmark("board.valid_moves")
+def _bench_valid_moves():
+    board = _midgame_board()
+
+    def run():
+        list(board.valid_moves)
+        return 1
+    return run
+
+
+def _make_env(tinyscreen=False):
+    env = gym.make("bkdk/BKDK-v0")
+    if tinyscreen:
+        env = TinyScreen(env)
+    return env
+
+
+@benchmark("env.reset")
+def _bench_env_reset():
+    env = _make_env()
+    seeds = iter(range(sys.maxsize))
+
+    def run():
+        env.reset(seed=next(seeds))
+        return 1
+    return run
+
+
+def _bench_steps(env):
+    """Return a function that replays a game in env."""
+    actions = [(choice,) + rowcol
+               for choice, rowcol in _first_valid_moves()]
+
+    def run():
+        env.reset(seed=SEED)
+        for action in actions:
+            env.step(action)
+        return len(actions)
+    return run
+
+
+@benchmark("env.step")
+def _bench_env_step():
+    return _bench_steps(_make_env())
+
+
+@benchmark("tinyscreen.step")
+def _bench_tinyscreen_step():
+    return _bench_steps(_make_env(tinyscreen=True))
+
+
+@benchmark("tinyscreen.observation")
+def _bench_tinyscreen_observation():
+    env = TinyScreen(_make_env().unwrapped)
+    env.reset(seed=SEED)
+    obs = env.unwrapped._observation
+
+    def run():
+        env.observation(obs)
+        return 1
+    return run
+
+
+def _screenshot_decoder(**kwargs):
+    from .screenshot import Screenshot
+
+    filenames = sorted(glob.glob(SCREENSHOTS))
+    if not filenames:
+        raise SkipBenchmark(f"no screenshots match {SCREENSHOTS}")
+
+    def run():
+        for filename in filenames:
+            with Screenshot(filename, **kwargs) as screenshot:
+                screenshot.board.tolist()
+                for choice in screenshot.choices:
+                    choice.tolist()
+        return len(filenames)
+    return run
+
+
+@benchmark("screenshot.decode")
+def _bench_screenshot_decode():
+    return _screenshot_decoder()
+
+
+@benchmark("screenshot.decode_draft")
+def _bench_screenshot_decode_draft():
+    return _screenshot_decoder(draft=True)
+
+
+def _neat_population(num_genomes=20):
+    try:
+        import neat
+    except ImportError:
+        raise SkipBenchmark("neat-python is not installed")
+    if not os.path.exists(NEAT_CONFIG):
+        raise SkipBenchmark(f"{NEAT_CONFIG} not found")
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                         neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                         NEAT_CONFIG)
+    config.pop_size = num_genomes
+    config.random_seed = SEED
+    random.seed(SEED)
+    return config, list(neat.Population(config).population.items())
+
+
+@benchmark("neat.eval_lockstep")
+def _bench_eval_lockstep():
+    from . import lockstep
+
+    config, genomes = _neat_population()
+
+    def run():
+        lockstep.eval_genomes(genomes, config, num_games=1)
+        return len(genomes)
+    return run
+
+
+@benchmark("neat.eval_gym")
+def _bench_eval_gym():
+    from . import evolve
+
+    config, genomes = _neat_population(num_genomes=2)
+
+    def run():
+        evolve.eval_genomes(genomes, config, num_games=1)
+        return len(genomes)
+    return run
+
+
+def measure(func, repeat=5, warmup=1, min_time=0.2):
+    """Time func, which returns the number of operations it performed,
+    and return statistics of the seconds per operation."""
+    for _ in range(warmup):
+        func()
+
+    # Calibrate the number of calls per repetition.
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - start >= min_time:
+            break
+        loops *= 2
+
+    times = []
+    for _ in range(repeat):
+        ops = 0
+        start = time.perf_counter()
+        for _ in range(loops):
+            ops += func()
+        times.append((time.perf_counter() - start) / ops)
+
+    return {
+        "loops": loops,
+        "repeat": repeat,
+        "times": times,
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def run(patterns=None, **kwargs):
+    """Run every benchmark matching any of patterns, or all of them,
+    and return the results.  kwargs are passed to measure."""
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if patterns and not any(fnmatch.fnmatch(name, pattern)
+                                for pattern in patterns):
+            continue
+        try:
+            results[name] = measure(setup(), **kwargs)
+        except SkipBenchmark as e:
+            results[name] = {"skipped": str(e)}
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(results, baseline, threshold=0.1):
+    """Return (name, ratio) for each benchmark whose median time is
+    more than threshold slower than baseline's."""
+    regressions = []
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name, {})
+        if "median" not in result or "median" not in base:
+            continue
+        ratio = result["median"] / base["median"]
+        if ratio > 1 + threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def _format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g}{unit}"
+    return f"{seconds / 1e-9:.3g}ns"
+
+
+def print_results(results, baseline=None, file=None):
+    for name, result in results["results"].items():
+        if "skipped" in result:
+            print(f"{name:24} skipped: {result['skipped']}", file=file)
+            continue
+        line = (f"{name:24} {_format_time(result['median']):>8} "
+                f"+- {_format_time(result['stdev']):>8} per op")
+        base = (baseline or {"results": {}})["results"].get(name, {})
+        if "median" in base:
+            line += f"  ({result['median'] / base['median']:.2f}x baseline)"
+        print(line, file=file)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description="BKDK benchmarks")
+    parser.add_argument("--baseline", action="store", metavar="FILE",
+                        help="compare results with those saved in FILE, "
+                        "and fail if any have regressed")
+    parser.add_argument("--list", action="store_true",
+                        help="list the benchmarks and exit")
+    parser.add_argument("--min-time", action="store", type=float,
+                        default=0.2,
+                        help="minimum seconds per repetition "
+                        "(default: 0.2)")
+    parser.add_argument("--output", action="store", metavar="FILE",
+                        help="write the results to FILE as JSON")
+    parser.add_argument("--repeat", action="store", type=int, default=5,
+                        help="repetitions of each benchmark (default: 5)")
+    parser.add_argument("--threshold", action="store", type=float,
+                        default=0.1,
+                        help="fractional slowdown against the baseline "
+                        "counted as a regression (default: 0.1)")
+    parser.add_argument("--warmup", action="store", type=int, default=1,
+                        help="calls before timing starts (default: 1)")
+    parser.add_argument("patterns", nargs="*", metavar="PATTERN",
+                        help="run only benchmarks matching PATTERN, "
+                        "e.g. \"board.*\"")
+    args = parser.parse_args(args)
+
+    if args.list:
+        for name in BENCHMARKS:
+            print(name)
+        return 0
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+
+    results = run(args.patterns, repeat=args.repeat, warmup=args.warmup,
+                  min_time=args.min_time)
+    print_results(results, baseline)
+    if args.output is not None:
+        with open(args.output, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    for name, ratio in regressions:
+        print(f"REGRESSION: {name} is {ratio:.2f}x slower than baseline",
+              file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def _scaling_worker(barrier, duration, seed, results):
+    """Step an environment for duration seconds, once every worker
+    is ready, and put the steps taken, the seconds taken and the
+    process's peak memory use on results."""
+    env = TinyScreen(_make_env())
+    env.reset(seed=seed)
+    barrier.wait()
+    steps = 0
+    start = time.perf_counter()
+    end = start + duration
+    while (now := time.perf_counter()) < end:
+        for _ in range(100):
+            if _profile_oneframe(env):
+                env.reset()
+        steps += 100
+    env.close()
+    # ru_maxrss is in kilobytes on Linux.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    results.put((steps, now - start, max_rss))
+
+
+def _run_workers(num_workers, mode, duration):
+    """Return each worker's results from _scaling_worker."""
+    if mode == "processes":
+        context = multiprocessing.get_context()
+        barrier = context.Barrier(num_workers)
+        results = context.Queue()
+        worker_type = context.Process
+    else:
+        barrier = threading.Barrier(num_workers)
+        results = queue.Queue()
+        worker_type = threading.Thread
+    workers = [worker_type(target=_scaling_worker,
+                           args=(barrier, duration, SEED + i, results))
+               for i in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    worker_results = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return worker_results
+
+
+def scaling(worker_counts, modes=("processes", "threads"), duration=2.0):
+    """Measure environment throughput with each of worker_counts
+    workers, in each of modes, and return the results."""
+    results = []
+    for mode in modes:
+        single = None
+        for num_workers in worker_counts:
+            workers = _run_workers(num_workers, mode, duration)
+            steps_per_second = sum(steps / seconds
+                                   for steps, seconds, _ in workers)
+            if single is None:
+                single = steps_per_second / num_workers
+            max_rss = [rss for _, _, rss in workers]
+            if mode == "threads":
+                # Threads share one process's memory.
+                max_rss = [max(max_rss) / num_workers] * num_workers
+            results.append({
+                "mode": mode,
+                "workers": num_workers,
+                "steps_per_second": steps_per_second,
+                "speedup": steps_per_second / single,
+                "efficiency": steps_per_second / (single * num_workers),
+                "memory_per_worker": statistics.mean(max_rss),
+            })
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "duration": duration,
+        "results": results,
+    }
+
+
+def print_scaling(results, file=None):
+    print(f"{'mode':10} {'workers':>7} {'steps/s':>10} {'speedup':>8} "
+          f"{'efficiency':>10} {'MB/worker':>9}", file=file)
+    for result in results["results"]:
+        print(f"{result['mode']:10} {result['workers']:7d} "
+              f"{result['steps_per_second']:10.0f} "
+              f"{result['speedup']:8.2f} "
+              f"{result['efficiency']:10.0%} "
+              f"{result['memory_per_worker'] / 2**20:9.1f}", file=file)
+
+
+def scaling_main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(
+        description="BKDK environment throughput scaling benchmark")
+    parser.add_argument("--duration", action="store", type=float,
+                        default=2.0,
+                        help="seconds each worker steps its environment "
+                        "(default: 2)")
+    parser.add_argument("--max-workers", action="store", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="run with 1, 2, 4, ... up to MAX_WORKERS "
+                        "workers (default: the number of CPUs)")
+    parser.add_argument("--mode", choices=("processes", "threads", "both"),
+                        default="both",
+                        help="run workers as processes, threads, or both "
+                        "(the default)")
+    parser.add_argument("--output", action="store", metavar="FILE",
+                        help="write the results to FILE as JSON")
+    args = parser.parse_args(args)
+
+    worker_counts = []
+    num_workers = 1
+    while num_workers < args.max_workers:
+        worker_counts.append(num_workers)
+        num_workers *= 2
+    worker_counts.append(args.max_workers)
+    modes = ("processes", "threads") if args.mode == "both" else (args.mode,)
+
+    results = scaling(worker_counts, modes, args.duration)
+    print_scaling(results)
+    if args.output is not None:
+        with open(args.output, "w") as fp:
+            json.dump(results, fp, indent=2)
+    return 0
@@ -0,0 +1,113 @@
+"""Caching of genomes' scores across generations.
+
+Elites, and any other genomes that survive unchanged, would otherwise
+be evaluated again every generation.  FitnessCache remembers scores
+keyed on a hash of everything in a genome that affects how it
+plays, along with the games it played and how it played them, so
+identical networks playing identical games are never played twice.
+Scores only carry over between generations when every generation
+plays the same games, that is, when the evaluation seed is fixed.
+"""
+import collections
+import hashlib
+import os
+import pickle
+
+import neat
+import numpy as np
+
+
+def genome_hash(genome):
+    """Return a digest of genome's nodes and expressed connections."""
+    digest = hashlib.blake2b(digest_size=16)
+    for key in sorted(genome.nodes):
+        ng = genome.nodes[key]
+        digest.update(repr((key, ng.bias, ng.response,
+                            ng.activation, ng.aggregation)).encode())
+    connections = [cg for cg in genome.connections.values() if cg.enabled]
+    keys = np.array([cg.key for cg in connections],
+                    dtype=np.int64).reshape((-1, 2))
+    weights = np.array([cg.weight for cg in connections])
+    order = np.lexsort((keys[:, 1], keys[:, 0]))
+    digest.update(keys[order].tobytes())
+    digest.update(weights[order].tobytes())
+    return digest.digest()
+
+
+class FitnessCache(neat.reporting.BaseReporter):
+    """Remember the scores returned by score, which should behave as
+    lockstep.score_genomes, evicting the least recently used when
+    more than max_size are held.  If filename is given the cache is
+    loaded from it, if it exists, and saved to it after every
+    generation.  Scores are keyed on evaluator, the name of the
+    evaluator score uses, and the number of network outputs, as well
+    as the genome and games, since different evaluators and action
+    heads play the same games differently.
+    """
+    def __init__(self, score, num_games, max_size=100000, filename=None,
+                 evaluator="lockstep"):
+        self._score = score
+        self.num_games = num_games
+        self.evaluator = evaluator
+        self.max_size = max_size
+        self.filename = filename
+        self.hits = self.misses = 0
+        self._cache = collections.OrderedDict()
+        if filename is not None and os.path.exists(filename):
+            with open(filename, "rb") as fp:
+                self._cache = pickle.load(fp)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def evaluate(self, genomes, config):
+        genomes = dict(genomes)
+        for genome_id, fitness in self.score(genomes.items(), config).items():
+            genomes[genome_id].fitness = fitness
+
+    def score(self, genomes, config, first_game=0, num_games=None):
+        if num_games is None:
+            num_games = self.num_games
+        games = (self.evaluator, config.genome_config.num_outputs,
+                 config.random_seed, first_game, num_games)
+
+        scores = {}
+        misses = []
+        for genome_id, genome in genomes:
+            key = genome_hash(genome), games
+            score = self._cache.get(key)
+            if score is None:
+                misses.append((genome_id, genome, key))
+            else:
+                self._cache.move_to_end(key)
+                scores[genome_id] = score
+        self.hits += len(scores)
+        self.misses += len(misses)
+
+        if misses:
+            new_scores = self._score([(genome_id, genome)
+                                      for genome_id, genome, _ in misses],
+                                     config, first_game, num_games)
+            for genome_id, _, key in misses:
+                scores[genome_id] = self._cache[key] = new_scores[genome_id]
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+        return scores
+
+    def save(self, filename):
+        tmpfile = f"{filename}.tmp"
+        with open(tmpfile, "wb") as fp:
+            pickle.dump(self._cache, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpfile, filename)
+
+    def start_generation(self, generation):
+        self.hits = self.misses = 0
+
+    def post_evaluate(self, config, population, species, best_genome):
+        print(f"Fitness cache: {self.hits} hits, {self.misses} misses, "
+              f"{len(self)} entries")
+
+    def end_generation(self, config, population, species_set):
+        if self.filename is not None:
+            self.save(self.filename)
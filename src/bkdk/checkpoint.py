@@ -0,0 +1,251 @@
+"""Checkpointing that doesn't hold up evolution.
+
+neat.Checkpointer pickles, compresses and writes each checkpoint
+before the next generation can start, and keeps every checkpoint
+forever.  AsyncCheckpointer takes a shallow snapshot of the population
+at the end of each generation, then pickles, compresses and writes it
+in a background thread while the next generation is evaluated.  It
+keeps only the most recent checkpoints, plus periodic milestones.
+
+Genomes are pickled with their genes' attributes in columns, which is
+several times faster to save and to restore than pickling each gene
+as an object.  Otherwise the files are in neat.Checkpointer's format,
+so either can restore the other's.
+"""
+import collections
+import copy
+import glob
+import gzip
+import io
+import itertools
+import os
+import pickle
+import random
+import threading
+
+import neat
+
+from .metrics import timed
+
+
+def _pack_genes(genes):
+    values = list(genes.values())
+    if not values:
+        return None, [], [], []
+    gene_type = type(values[0])
+    names = [a.name for a in gene_type._gene_attributes]
+    return (gene_type, list(genes),
+            [[getattr(gene, name) for gene in values] for name in names],
+            names)
+
+
+def _unpack_genes(gene_type, keys, columns, names):
+    genes = {}
+    for key, *values in zip(keys, *columns):
+        gene = object.__new__(gene_type)
+        gene.__dict__ = dict(zip(names, values))
+        gene.key = key
+        genes[key] = gene
+    return genes
+
+
+def _unpack_genome(genome_type, state, nodes, connections):
+    genome = object.__new__(genome_type)
+    genome.__dict__.update(state)
+    genome.nodes = _unpack_genes(*nodes)
+    genome.connections = _unpack_genes(*connections)
+    return genome
+
+
+class _Pickler(pickle.Pickler):
+    def reducer_override(self, obj):
+        if not isinstance(obj, neat.DefaultGenome):
+            return NotImplemented
+        state = obj.__dict__.copy()
+        nodes = _pack_genes(state.pop("nodes"))
+        connections = _pack_genes(state.pop("connections"))
+        return _unpack_genome, (type(obj), state, nodes, connections)
+
+
+def _snapshot(config, population, species_set):
+    """Return shallow copies of everything the next generation might
+    change before the checkpoint is pickled.  Genes never change once
+    a genome is in the population, but fitnesses and species do."""
+    genomes = {}
+
+    def genome(g):
+        if id(g) not in genomes:
+            genomes[id(g)] = copy.copy(g)
+        return genomes[id(g)]
+
+    population = {gid: genome(g) for gid, g in population.items()}
+    species_set = copy.copy(species_set)
+    # The species set refers to every reporter, some of which
+    # (evaluators, this) can't be pickled.  They're reattached on
+    # restore.
+    species_set.reporters = neat.reporting.ReporterSet()
+    species_set.genome_to_species = dict(species_set.genome_to_species)
+    species = {}
+    for sid, s in species_set.species.items():
+        s = species[sid] = copy.copy(s)
+        s.representative = genome(s.representative)
+        s.members = {gid: genome(g) for gid, g in s.members.items()}
+        s.fitness_history = list(s.fitness_history)
+    species_set.species = species
+    return copy.copy(config), population, species_set
+
+
+class AsyncCheckpointer(neat.reporting.BaseReporter):
+    """Save the simulation state every generation_interval generations,
+    keeping the last keep checkpoints and those of every generation
+    that is a multiple of milestone_interval.  If adopt_existing is
+    true, as when resuming a run, checkpoints already written with
+    filename_prefix are counted as written before any this writes, and
+    rotated with them; otherwise they are left alone.
+    """
+    def __init__(self, generation_interval=1, keep=3, milestone_interval=100,
+                 filename_prefix="neat-checkpoint-", compresslevel=1,
+                 adopt_existing=False):
+        self.generation_interval = generation_interval
+        self.keep = keep
+        self.milestone_interval = milestone_interval
+        self.filename_prefix = filename_prefix
+        self.compresslevel = compresslevel
+
+        self.current_generation = None
+        self.last_generation_checkpoint = -1
+
+        self._cond = threading.Condition()
+        self._pending = collections.deque()
+        self._writing = False
+        self._written = []
+        if adopt_existing:
+            self._written = self._existing_checkpoints()
+        self._error = None
+        self._thread = None
+
+    def _existing_checkpoints(self):
+        """Return the generations and filenames of the checkpoints
+        with our prefix, in order of generation."""
+        prefix = self.filename_prefix
+        existing = []
+        for filename in glob.glob(glob.escape(prefix) + "*"):
+            suffix = filename[len(prefix):]
+            if suffix.isdigit():
+                existing.append((int(suffix), filename))
+        return sorted(existing)
+
+    def is_milestone(self, generation):
+        return (bool(self.milestone_interval)
+                and generation % self.milestone_interval == 0)
+
+    def start_generation(self, generation):
+        self.current_generation = generation
+
+    def end_generation(self, config, population, species_set):
+        dg = self.current_generation - self.last_generation_checkpoint
+        if dg >= self.generation_interval:
+            self.save_checkpoint(config, population, species_set,
+                                 self.current_generation)
+            self.last_generation_checkpoint = self.current_generation
+
+    def save_checkpoint(self, config, population, species_set, generation):
+        """Queue the current simulation state to be saved."""
+        with timed("checkpoint_snapshot"):
+            data = (generation,) \
+                + _snapshot(config, population, species_set) \
+                + (random.getstate(),)
+
+        with self._cond:
+            self._raise_error()
+            # If the writer has fallen behind, this checkpoint
+            # supersedes any queued checkpoint that wouldn't be kept.
+            self._pending = collections.deque(
+                (g, d) for g, d in self._pending if self.is_milestone(g))
+            self._pending.append((generation, data))
+            self._cond.notify_all()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write,
+                                                daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        """Wait until every queued checkpoint has been written."""
+        with self._cond:
+            self._cond.wait_for(lambda: not (self._pending or self._writing)
+                                or self._error is not None)
+            self._raise_error()
+
+    close = flush
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _write(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                generation, data = self._pending.popleft()
+                self._writing = True
+            try:
+                with timed("checkpoint_write"):
+                    buf = io.BytesIO()
+                    _Pickler(buf, protocol=pickle.HIGHEST_PROTOCOL).dump(data)
+                    filename = f"{self.filename_prefix}{generation}"
+                    tmpfile = f"{filename}.tmp"
+                    with open(tmpfile, "wb") as fp:
+                        fp.write(gzip.compress(buf.getbuffer(),
+                                               self.compresslevel))
+                    os.replace(tmpfile, filename)
+                self._written = [(g, f) for g, f in self._written
+                                 if f != filename]
+                self._written.append((generation, filename))
+                self._rotate()
+            except Exception as e:
+                with self._cond:
+                    self._error = e
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
+
+    def _rotate(self):
+        """Remove checkpoints that are no longer wanted."""
+        recent = self._written[-self.keep:] if self.keep else []
+        kept = []
+        for generation, filename in self._written:
+            if (generation, filename) in recent \
+               or self.is_milestone(generation):
+                kept.append((generation, filename))
+            else:
+                os.remove(filename)
+        self._written = kept
+
+    @staticmethod
+    def restore_checkpoint(filename, config=None):
+        """Resume the simulation from a checkpoint written by this or
+        by neat.Checkpointer.  If config is supplied it's used in
+        place of the configuration saved in the checkpoint, unless
+        their genomes have different numbers of inputs or outputs, in
+        which case ValueError is raised."""
+        with gzip.open(filename) as fp:
+            generation, saved_config, population, species_set, rndstate \
+                = pickle.load(fp)
+        if config is None:
+            config = saved_config
+        for name in ("num_inputs", "num_outputs"):
+            saved = getattr(saved_config.genome_config, name)
+            value = getattr(config.genome_config, name)
+            if value != saved:
+                raise ValueError(f"checkpoint has {name} = {saved}, "
+                                 f"not {value}")
+        random.setstate(rndstate)
+        p = neat.Population(config, (population, species_set, generation))
+        species_set.reporters = p.reporters
+        # neat.Checkpointer doesn't save the genome indexer: carry on
+        # from the highest genome key seen, rather than from 1.
+        p.reproduction.genome_indexer = itertools.count(
+            max(population, default=0) + 1)
+        return p
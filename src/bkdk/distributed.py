@@ -0,0 +1,253 @@
+"""Fitness evaluation by worker processes on other machines.
+
+The coordinator, a DistributedEvaluator, listens on a TCP address.
+Workers, started with the evolve-worker command, connect to it,
+receive the NEAT configuration, and then repeatedly pull a chunk of
+genomes, evaluate it, and push back the fitnesses.  While a worker
+is evaluating it sends heartbeats; the chunks of any worker that
+disconnects or falls silent are requeued for the others.
+
+Messages are pickled, so coordinators and workers authenticate each
+other with a shared key, taken from the BKDK_AUTHKEY environment
+variable by the command line tools.
+"""
+import argparse
+import collections
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+
+from multiprocessing.connection import Client, Listener
+
+import neat
+
+from . import lockstep, metrics, parallel, profiling
+
+
+def parse_address(address):
+    """Convert "host:port" into a (host, port) tuple."""
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def authkey_from_environment():
+    authkey = os.environ.get("BKDK_AUTHKEY")
+    if not authkey:
+        raise SystemExit("BKDK_AUTHKEY is not set")
+    return authkey.encode()
+
+
+class DistributedEvaluator(neat.reporting.BaseReporter):
+    """Evaluate genomes in workers connected over TCP.
+
+    If num_local_workers is nonzero that many workers are started
+    on this machine, so a single machine behaves like a cluster.
+    If profile is one of profiling.KINDS the workers profile their
+    evaluations, and the merged results are kept in self.profile.
+    """
+    def __init__(self, address, authkey, config, evaluator="lockstep",
+                 num_local_workers=0, chunk_size=25,
+                 num_games=lockstep.NUM_GAMES,
+                 heartbeat_interval=5, heartbeat_timeout=30,
+                 profile=None):
+        self.evaluator = evaluator
+        self.chunk_size = chunk_size
+        self.num_games = num_games
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.num_requeued = 0
+        self.profile = None
+        if profile is not None:
+            self.profile = profiling.MergedProfile(profile)
+
+        self._config = config
+        self._cond = threading.Condition()
+        self._pending = collections.deque()
+        self._assigned = {}
+        self._results = {}
+        self._job_ids = itertools.count()
+        self._worker_ids = itertools.count(1)
+        self._workers = set()
+        self._closed = False
+
+        self._authkey = authkey
+        self._listener = Listener(address, authkey=authkey)
+        self.address = self._listener.address
+        threading.Thread(target=self._accept, daemon=True).start()
+
+        self._local_workers = []
+        for _ in range(num_local_workers):
+            self.add_local_worker()
+
+    def add_local_worker(self):
+        """Start a worker process on this machine."""
+        process = multiprocessing.Process(target=run_worker,
+                                          args=(self.address, self._authkey))
+        process.start()
+        self._local_workers.append(process)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for process in self._local_workers:
+            process.join()
+        self._listener.close()
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except (OSError, multiprocessing.AuthenticationError):
+                continue
+            threading.Thread(target=self._serve, args=(conn,),
+                             daemon=True).start()
+
+    def _serve(self, conn):
+        """Handle one worker's connection."""
+        worker_id = next(self._worker_ids)
+        with self._cond:
+            self._workers.add(worker_id)
+        try:
+            conn.send(("config", self._config, self.heartbeat_interval,
+                       self.profile and self.profile.kind))
+            while conn.poll(self.heartbeat_timeout):
+                message = conn.recv()
+                if message[0] == "pull":
+                    conn.send(self._next_job(worker_id))
+                elif message[0] == "result":
+                    self._complete(*message[1:])
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            self._requeue(worker_id)
+
+    def _next_job(self, worker_id):
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending or self._closed,
+                                timeout=self.heartbeat_interval)
+            if self._closed:
+                return ("stop",)
+            if not self._pending:
+                return ("wait",)
+            job_id, task = self._pending.popleft()
+            self._assigned[job_id] = worker_id, task
+            return ("job", job_id, task)
+
+    def _complete(self, job_id, results, times, profile):
+        with self._cond:
+            # Requeued jobs may be completed twice; keep the first.
+            if self._assigned.pop(job_id, None) is None:
+                return
+            metrics.merge_times(times)
+            if profile is not None:
+                self.profile.add(profile)
+            for genome_id, fitness in results:
+                self._results[genome_id] = fitness
+            self._cond.notify_all()
+
+    def _requeue(self, worker_id):
+        """Return a lost worker's jobs to the front of the queue."""
+        with self._cond:
+            self._workers.discard(worker_id)
+            lost = [job_id for job_id, (owner, _) in self._assigned.items()
+                    if owner == worker_id]
+            for job_id in reversed(lost):
+                _, task = self._assigned.pop(job_id)
+                self._pending.appendleft((job_id, task))
+            self.num_requeued += len(lost)
+            self._cond.notify_all()
+
+    def evaluate(self, genomes, config):
+        genomes = dict(genomes)
+        for genome_id, fitness in self.score(genomes.items(), config).items():
+            genomes[genome_id].fitness = fitness
+
+    def score(self, genomes, config, first_game=0, num_games=None):
+        """Return a dict mapping each genome's id to its average score
+        over the specified games (by default, all of them)."""
+        if num_games is None:
+            num_games = self.num_games
+        packed = [parallel.pack_genome(genome) for _, genome in genomes]
+        with self._cond:
+            for start in range(0, len(packed), self.chunk_size):
+                task = (self.evaluator, config.random_seed,
+                        first_game, num_games,
+                        packed[start:start + self.chunk_size])
+                self._pending.append((next(self._job_ids), task))
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: len(self._results) == len(packed))
+            results, self._results = self._results, {}
+        return results
+
+    def post_evaluate(self, config, population, species, best_genome):
+        print(f"Workers connected: {len(self._workers)}, "
+              f"chunks requeued: {self.num_requeued}")
+
+
+def run_worker(address, authkey):
+    """Evaluate genomes for the coordinator at address until it
+    tells us to stop or goes away."""
+    conn = Client(address, authkey=authkey)
+    _, config, heartbeat_interval, profile = conn.recv()
+    parallel._init_worker(config, profile)
+
+    send_lock = threading.Lock()
+    stopping = threading.Event()
+
+    def send(message):
+        with send_lock:
+            conn.send(message)
+
+    def send_heartbeats():
+        while not stopping.wait(heartbeat_interval):
+            try:
+                send(("heartbeat",))
+            except OSError:
+                return
+
+    threading.Thread(target=send_heartbeats, daemon=True).start()
+    try:
+        while True:
+            send(("pull",))
+            reply = conn.recv()
+            if reply[0] == "stop":
+                return
+            if reply[0] == "job":
+                _, job_id, task = reply
+                results, _, _, times, profile = parallel._eval_chunk(task)
+                send(("result", job_id, results, times, profile))
+    except (EOFError, OSError):
+        pass
+    finally:
+        stopping.set()
+        conn.close()
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description="BKDK evolver worker")
+    parser.add_argument("--num-workers", action="store", type=int,
+                        help="number of worker processes to run "
+                        "(default: one per CPU)")
+    parser.add_argument("address",
+                        help="HOST:PORT of the coordinating evolve")
+    args = parser.parse_args(args)
+
+    if args.num_workers is None:
+        args.num_workers = multiprocessing.cpu_count()
+    address = parse_address(args.address)
+    authkey = authkey_from_environment()
+
+    workers = [multiprocessing.Process(target=run_worker,
+                                       args=(address, authkey))
+               for _ in range(args.num_workers)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
@@ -5,6 +5,37 @@ from gymnasium import spaces
 
 from .board import Board
 
+BOARD_SIZE = 9
+NUM_CHOICES = 3
+NUM_ACTIONS = NUM_CHOICES * BOARD_SIZE**2
+
+# The factored action head: one output per choice, then one per row,
+# then one per column.
+NUM_FACTORED_OUTPUTS = NUM_CHOICES + 2 * BOARD_SIZE
+
+
+def action_scores(outputs):
+    """Return a network's outputs as one score per action, along
+    the last axis, with actions encoded as per Env.step.__doc__.
+
+    Networks may have one output per action, which are returned as
+    they are, or NUM_FACTORED_OUTPUTS outputs, scoring each choice,
+    row and column, in which case each action scores the sum of its
+    choice's, its row's and its column's outputs.  Other numbers of
+    outputs raise ValueError.
+    """
+    outputs = np.asarray(outputs, dtype=float)
+    if outputs.shape[-1] == NUM_ACTIONS:
+        return outputs
+    if outputs.shape[-1] != NUM_FACTORED_OUTPUTS:
+        raise ValueError(f"{outputs.shape[-1]} outputs: expected "
+                         f"{NUM_ACTIONS} or {NUM_FACTORED_OUTPUTS}")
+    choice = outputs[..., :NUM_CHOICES, None, None]
+    row = outputs[..., None, NUM_CHOICES:-BOARD_SIZE, None]
+    column = outputs[..., None, None, -BOARD_SIZE:]
+    return (choice + row + column).reshape(
+        outputs.shape[:-1] + (NUM_ACTIONS,))
+
 
 class Env(gym.Env):
 
@@ -15,9 +46,9 @@ class Env(gym.Env):
 
     def __init__(self, render_mode=None):
         # XXX fetch these from somewhere... bkdk.Board?
-        self.board_size = 9
+        self.board_size = BOARD_SIZE
         self.shape_size = 5
-        num_choices = 3
+        num_choices = NUM_CHOICES
 
         self.observation_space = spaces.Dict({
             "board": spaces.Box(
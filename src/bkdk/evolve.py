@@ -1,4 +1,6 @@
 import argparse
+import configparser
+import functools
 import multiprocessing
 import pickle
 import random
@@ -8,25 +10,48 @@ import gymnasium as gym
 import neat
 
 from gymnasium.spaces.utils import flatten
+from neat.config import ConfigParameter, DefaultClassConfig
 
+from . import distributed, islands, lockstep, parallel, profiling, racing
 from . import visualize
+from .cache import FitnessCache
+from .checkpoint import AsyncCheckpointer
+from .env import NUM_ACTIONS, NUM_FACTORED_OUTPUTS, action_scores
+from .metrics import MetricsReporter, timed
+from .species import FastSpeciesSet
+from .stats import StatsReader, StatsStore
 
 
-def eval_genomes(genomes, config):
+def eval_genomes(genomes, config, num_games=5):
     """Fitness function wrapped for Population.run()."""
     for genome_id, genome in genomes:
-        genome.fitness = eval_genome(genome, config)
+        genome.fitness = eval_genome(genome, config, num_games)
 
 
-def eval_genome(genome, config):
+def eval_genome(genome, config, num_games=5):
     """Fitness function wrapped for ParallelEvaluator."""
     net = neat.nn.FeedForwardNetwork.create(genome, config)
-    return eval_network(net, seed=config.random_seed)
+    # Timed as a whole, to keep timing out of the game loop.
+    with timed("gym_games"):
+        return eval_network(net, num_games=num_games,
+                            seed=config.random_seed)
 
 
-def eval_network(net, num_games=5, seed=None):
-    """Evaluate the fitness of the supplied neural network."""
-    env = gym.make("bkdk/BKDK-v0")
+def score_genomes(genomes, config, first_game=0, num_games=5):
+    """Return a dict mapping each genome's id to its average score,
+    as lockstep.score_genomes does."""
+    if first_game:
+        raise ValueError("gym evaluator cannot skip games")
+    return {genome_id: eval_genome(genome, config, num_games)
+            for genome_id, genome in genomes}
+
+
+def eval_network(net, num_games=5, seed=None, env=None):
+    """Evaluate the fitness of the supplied neural network.  If env
+    is supplied it is reused rather than a new one being created."""
+    owns_env = env is None
+    if owns_env:
+        env = gym.make("bkdk/BKDK-v0")
 
     total_reward = 0
     for _ in range(num_games):
@@ -36,11 +61,11 @@ def eval_network(net, num_games=5, seed=None):
 
         while not (terminated or truncated):
             inputs = flatten(env.observation_space, observation)
-            outputs = net.activate(inputs)
+            outputs = action_scores(net.activate(inputs))
 
             ranked_outputs = list(sorted(
                 ((activation, index)
-                 for index, activation in enumerate(outputs)),
+                 for index, activation in enumerate(outputs.tolist())),
                 reverse=True))
 
             # Try each action in order, until either a) we performed a
@@ -59,10 +84,30 @@ def eval_network(net, num_games=5, seed=None):
                 total_reward -= 1
             total_reward += reward
 
-    env.close()
+    if owns_env:
+        env.close()
     return total_reward / num_games
 
 
+def load_evaluation_config(filename):
+    """Read the [Evaluation] section of a NEAT-Python configuration
+    file.  NEAT-Python itself ignores this section."""
+    parser = configparser.ConfigParser()
+    with open(filename) as fp:
+        parser.read_file(fp)
+    params = {}
+    if parser.has_section("Evaluation"):
+        params = dict(parser.items("Evaluation"))
+    return DefaultClassConfig(params, [
+        ConfigParameter("num_games", int, 5),
+        ConfigParameter("seed", str, "random"),
+        ConfigParameter("cache_size", int, 0),
+        ConfigParameter("racing", bool, False),
+        ConfigParameter("racing_initial_games", int, 2),
+        ConfigParameter("racing_keep_fraction", float, 0.5),
+    ])
+
+
 class RandomSeedUpdater(neat.reporting.BaseReporter):
     def __init__(self, config):
         self._config = config
@@ -72,6 +117,92 @@ class RandomSeedUpdater(neat.reporting.BaseReporter):
         random.seed(self._config.random_seed)
 
 
+def load_config(args):
+    """Load the NEAT-Python and evaluation configurations named by
+    args, with any overrides given on the command line applied."""
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                         neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                         args.config_filename)
+    if args.population_size is not None:
+        config.pop_size = args.population_size
+    if args.action_head is not None:
+        num_outputs = {"flat": NUM_ACTIONS,
+                       "factored": NUM_FACTORED_OUTPUTS}[args.action_head]
+        genome_config = config.genome_config
+        genome_config.num_outputs = num_outputs
+        genome_config.output_keys = list(range(num_outputs))
+    if args.speciation == "fast":
+        # Configured by the same [DefaultSpeciesSet] section.
+        config.species_set_type = FastSpeciesSet
+    eval_config = load_evaluation_config(args.config_filename)
+    if args.num_games is not None:
+        eval_config.num_games = args.num_games
+    if args.racing is not None:
+        eval_config.racing = args.racing
+    if eval_config.racing and args.evaluator != "lockstep":
+        raise SystemExit("racing requires the lockstep evaluator")
+    if args.evaluation_seed is not None:
+        eval_config.seed = args.evaluation_seed
+    try:
+        evaluation_seed(eval_config.seed)
+    except argparse.ArgumentTypeError as e:
+        raise SystemExit(f"{args.config_filename}: {e}")
+    return config, eval_config
+
+
+def evaluation_seed(value):
+    """Check value is an evaluation seed: an integer, or "random"."""
+    if value != "random":
+        try:
+            int(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                f"invalid evaluation seed: {value!r} "
+                "(expected an integer, or \"random\")")
+    return value
+
+
+def restore_checkpoint(filename, config):
+    """Restore the population saved in the checkpoint filename, to
+    evolve with config.  Checkpoints of genomes with other numbers of
+    outputs, saved with another --action-head for example, are
+    refused."""
+    try:
+        return AsyncCheckpointer.restore_checkpoint(filename, config)
+    except ValueError as e:
+        raise SystemExit(f"{filename}: {e}")
+
+
+def serial_evaluator(evaluator, num_games):
+    """Return the score and fitness functions of the named evaluator,
+    for evaluation in this process."""
+    if evaluator == "lockstep":
+        return (lockstep.score_genomes,
+                functools.partial(lockstep.eval_genomes, num_games=num_games))
+    return (score_genomes,
+            functools.partial(eval_genomes, num_games=num_games))
+
+
+def wrap_evaluator(p, eval_config, evaluator, score, ff,
+                   cache_filename=None):
+    """Return ff, the named evaluator's fitness function, with
+    fitnesses cached and genomes raced as eval_config specifies."""
+    if eval_config.cache_size or cache_filename is not None:
+        cache = FitnessCache(score, eval_config.num_games,
+                             max_size=eval_config.cache_size or 100000,
+                             filename=cache_filename,
+                             evaluator=evaluator)
+        p.add_reporter(cache)
+        score, ff = cache.score, cache.evaluate
+
+    if eval_config.racing:
+        ff = racing.RacingEvaluator(
+            score, eval_config.num_games,
+            initial_games=eval_config.racing_initial_games,
+            keep_fraction=eval_config.racing_keep_fraction).evaluate
+    return ff
+
+
 def run(args):
     """Evolve a feed-forward neural network to play the game."""
 
@@ -83,29 +214,11 @@ def run(args):
         random.seed(args.random_seed)
 
     # Load configuration.
-    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
-                         neat.DefaultSpeciesSet, neat.DefaultStagnation,
-                         args.config_filename)
-    if args.population_size is not None:
-        config.pop_size = args.population_size
-
-    # Create the population, which is the top-level object for a NEAT run.
-    p = neat.Population(config)
-
-    # Add a stdout reporter to show progress in the terminal.
-    p.add_reporter(neat.StdOutReporter(True))
-    p.add_reporter(RandomSeedUpdater(config))
-    if not args.profile:
-        stats = neat.StatisticsReporter()
-        p.add_reporter(stats)
-        p.add_reporter(neat.Checkpointer(1))
-
-    # Run the GA until max_generations or a solution is found.
-    if args.num_workers == 1:
-        ff = eval_genomes
+    config, eval_config = load_config(args)
+    if args.islands > 1:
+        winner = islands.run(args, config, eval_config)
     else:
-        ff = neat.ParallelEvaluator(args.num_workers, eval_genome).evaluate
-    winner = p.run(ff, args.max_generations)
+        winner = _run_population(args, config, eval_config)
     if args.profile:
         return
 
@@ -120,28 +233,173 @@ def run(args):
     print(f"average score: {fitness}")
 
     # Visualize some things.
+    if args.islands > 1:
+        for island in range(args.islands):
+            stats = StatsReader(islands.stats_directory(args.stats_dir,
+                                                        island))
+            visualize.plot_stats(stats, ylog=False, view=True,
+                                 filename=f"avg_fitness-island-{island}.svg")
+            visualize.plot_species(stats, view=True,
+                                   filename=f"speciation-island-{island}.svg")
+        return
+    stats = StatsReader(args.stats_dir)
     visualize.plot_stats(stats, ylog=False, view=True)
     visualize.plot_species(stats, view=True)
 
 
+def _run_population(args, config, eval_config):
+    """Evolve a single population, and return the winning genome."""
+    # Create the population, which is the top-level object for a NEAT run.
+    if args.resume is not None:
+        p = restore_checkpoint(args.resume, config)
+    else:
+        p = neat.Population(config)
+    if isinstance(p.species, FastSpeciesSet):
+        p.species.num_workers = args.speciation_workers
+
+    # Record where the time goes.  This reporter must be added first.
+    metrics = MetricsReporter(p, args.metrics_file)
+    p.add_reporter(metrics)
+
+    # Add a stdout reporter to show progress in the terminal.
+    p.add_reporter(neat.StdOutReporter(True))
+    if eval_config.seed == "random":
+        p.add_reporter(RandomSeedUpdater(config))
+    else:
+        config.random_seed = int(eval_config.seed)
+    if not args.profile:
+        stats = StatsStore(args.stats_dir, truncate=args.resume is None,
+                           resumed=p if args.resume is not None else None)
+        p.add_reporter(stats)
+        checkpointer = AsyncCheckpointer(
+            adopt_existing=args.resume is not None)
+        p.add_reporter(checkpointer)
+
+    # Run the GA until max_generations or a solution is found.
+    evaluator = None
+    if args.listen is not None:
+        evaluator = distributed.DistributedEvaluator(
+            distributed.parse_address(args.listen),
+            distributed.authkey_from_environment(),
+            config,
+            evaluator=args.evaluator,
+            num_local_workers=args.num_workers,
+            num_games=eval_config.num_games,
+            profile=args.profile_workers)
+    elif args.num_workers != 1:
+        evaluator = parallel.PersistentEvaluator(
+            args.num_workers, config,
+            evaluator=args.evaluator,
+            num_games=eval_config.num_games,
+            profile=args.profile_workers)
+    elif args.profile_workers is not None:
+        raise SystemExit("--profile-workers requires worker processes")
+
+    if evaluator is not None:
+        p.add_reporter(evaluator)
+        score, ff = evaluator.score, evaluator.evaluate
+    else:
+        score, ff = serial_evaluator(args.evaluator, eval_config.num_games)
+    ff = wrap_evaluator(p, eval_config, args.evaluator, score, ff,
+                        args.fitness_cache)
+
+    try:
+        winner = p.run(ff, args.max_generations)
+    finally:
+        if evaluator is not None:
+            evaluator.close()
+            if evaluator.profile is not None:
+                filenames = evaluator.profile.write("evolve-workers")
+                print(f"Worker profile written to {', '.join(filenames)}")
+        if isinstance(p.species, FastSpeciesSet):
+            p.species.close()
+        if not args.profile:
+            checkpointer.close()
+            stats.close()
+        metrics.close()
+    return winner
+
+
 def main(args=None):
     if args is None:
         args = sys.argv[1:]
 
     parser = argparse.ArgumentParser(description="BKDK evolver")
 
-    parser.add_argument("--max-generations", action="store",
+    parser.add_argument("--action-head", choices=("flat", "factored"),
+                        help="override the configured num_outputs with "
+                        "one output per action (flat), or one per choice, "
+                        "row and column (factored)")
+    parser.add_argument("--evaluator", choices=("gym", "lockstep"),
+                        default="lockstep",
+                        help="play each genome's games one at a time "
+                        "in the Gymnasium environment, or all at once in "
+                        "lockstep (the default)")
+    parser.add_argument("--evaluation-seed", action="store",
+                        type=evaluation_seed,
+                        help="evaluate every generation with the same "
+                        "EVALUATION_SEED, or \"random\" for a new seed "
+                        "each generation")
+    parser.add_argument("--fitness-cache", action="store", metavar="FILE",
+                        help="cache fitnesses in FILE between runs")
+    parser.add_argument("--islands", action="store", type=int, default=1,
+                        help="split the population into ISLANDS populations, "
+                        "each evolving in its own process, and writing its "
+                        "own island-N- checkpoints and metrics (default: 1)")
+    parser.add_argument("--listen", action="store", metavar="HOST:PORT",
+                        help="coordinate evolve-worker processes connecting "
+                        "to HOST:PORT, alongside NUM_WORKERS local workers "
+                        "(BKDK_AUTHKEY must be set)")
+    parser.add_argument("--max-generations", action="store", type=int,
                         help="halt the GA after MAX_GENERATIONS generations")
-    parser.add_argument("--num-workers", action="store")
-    parser.add_argument("--population-size", action="store",
+    parser.add_argument("--metrics-file", action="store", metavar="FILE",
+                        default="evolve-metrics.jsonl",
+                        help="append per-generation timings to FILE "
+                        "(default: evolve-metrics.jsonl)")
+    parser.add_argument("--migrants", action="store", type=int, default=2,
+                        help="number of its fittest genomes each island "
+                        "sends to the next at each migration (default: 2)")
+    parser.add_argument("--migration-interval", action="store", type=int,
+                        default=10, metavar="GENERATIONS",
+                        help="generations between migrations between "
+                        "islands (default: 10)")
+    parser.add_argument("--num-games", action="store", type=int,
+                        help="override the configured number of games "
+                        "each genome plays")
+    parser.add_argument("--num-workers", action="store", type=int)
+    parser.add_argument("--population-size", action="store", type=int,
                         help="override the configured population size")
     parser.add_argument("--profile", action="store_true",
                         help="run in Python profiler")
-    parser.add_argument("--random-seed", action="store",
+    parser.add_argument("--profile-workers", choices=profiling.KINDS,
+                        help="profile evaluation in every worker process, "
+                        "with cProfile or by sampling stacks, and write "
+                        "the merged results to evolve-workers.*")
+    parser.add_argument("--racing", action=argparse.BooleanOptionalAction,
+                        help="override whether genomes are evaluated by "
+                        "successive halving")
+    parser.add_argument("--random-seed", action="store", type=int,
                         help="seed Python's random number generator")
+    parser.add_argument("--resume", action="store", metavar="CHECKPOINT",
+                        help="continue the run saved in CHECKPOINT, or "
+                        "with --islands, in every island's checkpoint of "
+                        "the same generation as CHECKPOINT")
+    parser.add_argument("--speciation", choices=("default", "fast"),
+                        default="fast",
+                        help="speciate with NEAT-Python's DefaultSpeciesSet, "
+                        "or with the identical but faster FastSpeciesSet "
+                        "(the default)")
+    parser.add_argument("--speciation-workers", action="store", type=int,
+                        default=1,
+                        help="number of processes computing genetic "
+                        "distances for the fast speciation (default: 1)")
+    parser.add_argument("--stats-dir", action="store", metavar="DIR",
+                        default="evolve-stats",
+                        help="store per-generation statistics and the "
+                        "hall of fame in DIR (default: evolve-stats)")
     parser.add_argument("config_filename",
                         help="NEAT-Python configuration file")
-    args = parser.parse_args()
+    args = parser.parse_args(args)
 
     if args.profile:
         import cProfile
@@ -0,0 +1,199 @@
+"""Decoding of screenshots in bulk.
+
+The bkdk command decodes every screenshot in the directories, and
+matching the globs, it is given, in a pool of worker processes.  One
+JSON object is written per screenshot, on a line of its own, as each
+is decoded, so results appear in the order they complete:
+
+  {"filename": ..., "scale": 2, "board": [[0, 1, ...], ...],
+   "board_confidence": [[100, 100, ...], ...],
+   "choices": [{"shape": [4, 5], "cells": [[...], ...],
+                "confidence": [[...], ...]}, ...],
+   "errors": []}
+
+Filenames are absolute, with symbolic links resolved.  Screenshots
+are decoded in draft mode where possible, at 1/scale of their size;
+any with cells that can't be decoded are decoded again at full size,
+and have a scale of 1.  Cells are 0 or 1; each choice's cells are
+padded to 5x5, as ChoiceDecoder.tolist pads them.  Confidences are
+the percentage of each cell's pixels that are its color.  A board or
+choice's cells that can't be decoded are null, and the reason is in
+errors, but its confidences are still given: a choice's are those of
+the last layout tried.
+
+When writing to a file, screenshots already in it are skipped, so an
+interrupted run can be restarted, from anywhere, with any arguments
+that find the same screenshots.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+
+from .screenshot import CellDecodingError, Screenshot
+
+EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def find_screenshots(paths):
+    """Return the real paths of the screenshots in, or matching, each
+    of paths, sorted and without duplicates.  Directories are searched
+    recursively for files with one of EXTENSIONS."""
+    filenames = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, basenames in os.walk(path):
+                filenames.update(
+                    os.path.join(dirpath, basename)
+                    for basename in basenames
+                    if os.path.splitext(basename)[1].lower() in EXTENSIONS)
+        else:
+            filenames.update(filename
+                             for filename in glob.glob(path, recursive=True)
+                             if os.path.isfile(filename))
+    return sorted(set(map(os.path.realpath, filenames)))
+
+
+def decode_screenshot(filename, draft=True):
+    """Return the JSON-ready decoding of the screenshot filename.
+    Screenshots with cells that can't be decoded in draft mode are
+    decoded again at full resolution."""
+    result, cell_errors = _decode_screenshot_at(filename, draft)
+    if draft and cell_errors:
+        result, _ = _decode_screenshot_at(filename, False)
+    return result
+
+
+def _decode_screenshot_at(filename, draft):
+    result = {"filename": filename,
+              "scale": None,
+              "board": None,
+              "board_confidence": None,
+              "choices": [],
+              "errors": []}
+    cell_errors = False
+    try:
+        with Screenshot(filename, draft=draft) as screenshot:
+            result["scale"] = screenshot.scale
+            board = screenshot.board
+            result["board_confidence"] = board.confidences()
+            try:
+                result["board"] = board.tolist()
+            except CellDecodingError as e:
+                result["errors"].append(f"board: {e}")
+                cell_errors = True
+            for index, choice in enumerate(screenshot.choices):
+                try:
+                    cells = choice.tolist()
+                except CellDecodingError as e:
+                    result["errors"].append(f"choice {index}: {e}")
+                    cells = None
+                    cell_errors = True
+                result["choices"].append({
+                    "shape": list(choice._shape),
+                    "cells": cells,
+                    "confidence": choice.confidences()})
+    except Exception as e:
+        result["errors"].append(f"{e.__class__.__name__}: {e}")
+    return result, cell_errors
+
+
+def processed_filenames(output):
+    """Return the real paths of the screenshots already in output.
+    A partial last line, left by an interrupted run, is truncated;
+    other lines that can't be read are reported, and skipped."""
+    filenames = set()
+    if not os.path.exists(output):
+        return filenames
+    with open(output, "rb+") as fp:
+        complete = 0
+        for number, line in enumerate(fp, 1):
+            if not line.endswith(b"\n"):
+                fp.truncate(complete)
+                break
+            complete += len(line)
+            try:
+                filename = json.loads(line)["filename"]
+            except (ValueError, KeyError, TypeError):
+                print(f"{output}:{number}: skipping unreadable result",
+                      file=sys.stderr)
+                continue
+            filenames.add(os.path.realpath(filename))
+    return filenames
+
+
+def ingest(filenames, fp, num_workers=None, draft=True, chunksize=8):
+    """Decode each of filenames, writing each result to fp as a JSON
+    line as it completes.  Return the number of results with errors.
+    """
+    if num_workers == 1:
+        return _write_results((decode_screenshot(filename, draft)
+                               for filename in filenames), fp)
+
+    with multiprocessing.Pool(num_workers) as pool:
+        return _write_results(
+            pool.imap_unordered(_decode_screenshot,
+                                ((filename, draft) for filename in filenames),
+                                chunksize),
+            fp)
+
+
+def _decode_screenshot(args):
+    return decode_screenshot(*args)
+
+
+def _write_results(results, fp):
+    num_errors = 0
+    for result in results:
+        fp.write(json.dumps(result) + "\n")
+        fp.flush()
+        if result["errors"]:
+            num_errors += 1
+    return num_errors
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(
+        description="Decode BKDK screenshots to JSON lines")
+    parser.add_argument("--chunksize", action="store", type=int, default=8,
+                        help="screenshots sent to a worker at a time "
+                        "(default: 8)")
+    parser.add_argument("--full-resolution", action="store_true",
+                        help="decode JPEGs at full resolution rather "
+                        "than in draft mode")
+    parser.add_argument("--num-workers", action="store", type=int,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--output", "-o", action="store", metavar="FILE",
+                        help="append results to FILE, skipping "
+                        "screenshots already there, rather than "
+                        "writing them to standard output")
+    parser.add_argument("paths", nargs="+", metavar="PATH",
+                        help="a screenshot, a directory of screenshots, "
+                        "or a glob, e.g. \"shots/*.jpg\"")
+    args = parser.parse_args(args)
+
+    filenames = find_screenshots(args.paths)
+    num_found = len(filenames)
+    if args.output is None:
+        fp = sys.stdout
+    else:
+        done = processed_filenames(args.output)
+        filenames = [filename for filename in filenames
+                     if filename not in done]
+        fp = open(args.output, "a")
+    try:
+        num_errors = ingest(filenames, fp, num_workers=args.num_workers,
+                            draft=not args.full_resolution,
+                            chunksize=args.chunksize)
+    finally:
+        if fp is not sys.stdout:
+            fp.close()
+
+    print(f"{len(filenames)} of {num_found} screenshots decoded, "
+          f"{num_errors} with errors", file=sys.stderr)
+    return 1 if num_errors else 0
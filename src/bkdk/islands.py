@@ -0,0 +1,289 @@
+"""Island-model evolution.
+
+A single large population speciates and reproduces in one process,
+leaving every other core idle between evaluations.  In island mode
+the population is split into several smaller ones, each evolving in
+its own process.  Every migration_interval generations the islands
+pause, and each sends copies of its fittest genomes to the next
+island in a ring, where they replace that island's newest offspring.
+The --num-workers evaluation processes are shared between the islands.
+
+Each island writes its own checkpoints, metrics and statistics, in
+files named as evolve names them but prefixed with "island-N-" or,
+for statistics, in an island-N subdirectory.  Islands resume from
+checkpoints of the same generation; emigrants due to leave at that
+generation are lost.
+"""
+import collections
+import copy
+import multiprocessing
+import os
+import random
+import re
+import time
+
+import neat
+
+from neat.math_util import mean
+
+from . import evolve, parallel
+from .checkpoint import AsyncCheckpointer
+from .metrics import MetricsReporter
+from .species import FastSpeciesSet
+from .stats import StatsStore
+
+IslandReport = collections.namedtuple("IslandReport", (
+    "generation",
+    "best_genome",
+    "best_fitness",
+    "mean_fitness",
+    "num_species",
+    "emigrants",
+))
+
+
+def stats_directory(stats_dir, island):
+    """Return the directory island stores its statistics in."""
+    return os.path.join(stats_dir, f"island-{island}")
+
+
+def island_filename(filename, island):
+    """Return the name island uses for filename, or filename prefix."""
+    directory, basename = os.path.split(filename)
+    return os.path.join(directory, f"island-{island}-{basename}")
+
+
+def island_checkpoints(filename, num_islands):
+    """Return the checkpoint of each island of the generation of
+    filename, which is any island's checkpoint."""
+    directory, basename = os.path.split(filename)
+    match = re.fullmatch(r"island-\d+-(.+)", basename)
+    if match is None:
+        raise SystemExit(f"{filename}: not an island checkpoint")
+    checkpoints = [island_filename(os.path.join(directory, match.group(1)),
+                                   island)
+                   for island in range(num_islands)]
+    missing = [checkpoint for checkpoint in checkpoints
+               if not os.path.exists(checkpoint)]
+    if missing:
+        raise SystemExit(f"{', '.join(missing)}: not found")
+    return checkpoints
+
+
+def split_population(pop_size, num_islands):
+    """Return the size of each island's population."""
+    size, extra = divmod(pop_size, num_islands)
+    return [size + (island < extra) for island in range(num_islands)]
+
+
+def split_workers(num_workers, num_islands):
+    """Return the number of evaluation processes each island uses."""
+    return max(1, num_workers // num_islands)
+
+
+class _LastGeneration(neat.reporting.BaseReporter):
+    """Remember the statistics and fittest genomes of the most
+    recently evaluated generation."""
+    def __init__(self, num_fittest):
+        self.num_fittest = num_fittest
+
+    def post_evaluate(self, config, population, species, best_genome):
+        genomes = sorted(population.values(),
+                         key=lambda genome: genome.fitness, reverse=True)
+        self.fittest = [copy.copy(genome)
+                        for genome in genomes[:self.num_fittest]]
+        self.best_fitness = best_genome.fitness
+        self.mean_fitness = mean(genome.fitness for genome in genomes)
+        self.num_species = len(species.species)
+
+
+class _StdOutReporter(neat.reporting.BaseReporter):
+    """Print a line summarizing each of island's generations."""
+    def __init__(self, island):
+        self.island = island
+
+    def start_generation(self, generation):
+        self.generation = generation
+        self._started = time.perf_counter()
+
+    def post_evaluate(self, config, population, species, best_genome):
+        elapsed = time.perf_counter() - self._started
+        fitness = mean(genome.fitness for genome in population.values())
+        print(f"Island {self.island} generation {self.generation}: "
+              f"best {best_genome.fitness:.5f}, mean {fitness:.5f}, "
+              f"{len(species.species)} species, "
+              f"evaluated in {elapsed:.3f} sec", flush=True)
+
+
+def immigrate(population, immigrants):
+    """Replace population's newest genomes with copies of immigrants,
+    and respeciate.  Genome keys increase as they're created, so the
+    newest genomes are offspring, never elites carried over from the
+    previous generation."""
+    p = population
+    newest = sorted(p.population, reverse=True)
+    for old_key, immigrant in zip(newest, immigrants):
+        del p.population[old_key]
+        genome = copy.copy(immigrant)
+        genome.key = next(p.reproduction.genome_indexer)
+        genome.fitness = None
+        p.population[genome.key] = genome
+        p.reproduction.ancestors[genome.key] = tuple()
+    p.species.speciate(p.config, p.population, p.generation)
+
+
+def _island_main(island, args, pop_size, num_workers, checkpoint, conn):
+    """Evolve one island, as directed by the coordinator, resuming
+    from checkpoint unless it's None."""
+    if args.random_seed is not None:
+        random.seed(f"{args.random_seed}/{island}")
+    else:
+        random.seed()
+
+    config, eval_config = evolve.load_config(args)
+    config.pop_size = pop_size
+    if checkpoint is not None:
+        p = evolve.restore_checkpoint(checkpoint, config)
+    else:
+        p = neat.Population(config)
+
+    # Record where the time goes.  This reporter must be added first.
+    metrics = MetricsReporter(p, island_filename(args.metrics_file, island))
+    p.add_reporter(metrics)
+
+    p.add_reporter(_StdOutReporter(island))
+    if eval_config.seed == "random":
+        p.add_reporter(evolve.RandomSeedUpdater(config))
+    else:
+        config.random_seed = int(eval_config.seed)
+    last = _LastGeneration(args.migrants)
+    p.add_reporter(last)
+    if not args.profile:
+        stats = StatsStore(stats_directory(args.stats_dir, island),
+                           truncate=checkpoint is None,
+                           resumed=p if checkpoint is not None else None)
+        p.add_reporter(stats)
+        checkpointer = AsyncCheckpointer(
+            filename_prefix=island_filename("neat-checkpoint-", island),
+            adopt_existing=checkpoint is not None)
+        p.add_reporter(checkpointer)
+
+    evaluator = None
+    if num_workers > 1:
+        evaluator = parallel.PersistentEvaluator(
+            num_workers, config,
+            evaluator=args.evaluator,
+            num_games=eval_config.num_games)
+        p.add_reporter(evaluator)
+        score, ff = evaluator.score, evaluator.evaluate
+    else:
+        score, ff = evolve.serial_evaluator(args.evaluator,
+                                            eval_config.num_games)
+    ff = evolve.wrap_evaluator(p, eval_config, args.evaluator, score, ff)
+
+    try:
+        while True:
+            message = conn.recv()
+            if message[0] == "stop":
+                break
+            _, num_generations, immigrants = message
+            if immigrants:
+                immigrate(p, immigrants)
+            p.run(ff, num_generations)
+            conn.send(IslandReport(p.generation, p.best_genome,
+                                   last.best_fitness, last.mean_fitness,
+                                   last.num_species, last.fittest))
+    finally:
+        if evaluator is not None:
+            evaluator.close()
+        if isinstance(p.species, FastSpeciesSet):
+            p.species.close()
+        if not args.profile:
+            checkpointer.close()
+            stats.close()
+        metrics.close()
+        conn.close()
+
+
+def run(args, config, eval_config):
+    """Evolve args.islands populations, each in its own process, with
+    args.migrants genomes migrating every args.migration_interval
+    generations, and return the fittest genome found."""
+    if args.listen is not None:
+        raise SystemExit("--islands cannot be used with --listen")
+    if args.fitness_cache is not None:
+        raise SystemExit("--islands cannot be used with --fitness-cache")
+    if args.profile_workers is not None:
+        raise SystemExit("--islands cannot be used with --profile-workers")
+
+    num_islands = args.islands
+    num_workers = split_workers(args.num_workers, num_islands)
+    checkpoints = [None] * num_islands
+    if args.resume is not None:
+        checkpoints = island_checkpoints(args.resume, num_islands)
+    connections = []
+    processes = []
+    for island, (pop_size, checkpoint) in enumerate(zip(
+            split_population(config.pop_size, num_islands), checkpoints)):
+        conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=_island_main,
+            args=(island, args, pop_size, num_workers, checkpoint,
+                  child_conn),
+            name=f"island-{island}")
+        process.start()
+        child_conn.close()
+        connections.append(conn)
+        processes.append(process)
+
+    best_genome = None
+    generation = 0
+    immigrants = [[] for _ in range(num_islands)]
+    try:
+        while (args.max_generations is None
+               or generation < args.max_generations):
+            num_generations = args.migration_interval
+            if args.max_generations is not None:
+                num_generations = min(num_generations,
+                                      args.max_generations - generation)
+            try:
+                for conn, arrivals in zip(connections, immigrants):
+                    conn.send(("run", num_generations, arrivals))
+                reports = [conn.recv() for conn in connections]
+            except (EOFError, OSError):
+                raise SystemExit("an island exited unexpectedly")
+            generation += num_generations
+
+            print(f"\n ****** Islands after generation "
+                  f"{reports[0].generation - 1} ******\n")
+            best_island = None
+            for island, report in enumerate(reports):
+                print(f"Island {island}: best {report.best_fitness:.5f}, "
+                      f"mean {report.mean_fitness:.5f}, "
+                      f"{report.num_species} species")
+                if (best_genome is None
+                        or report.best_genome.fitness > best_genome.fitness):
+                    best_genome = report.best_genome
+                    best_island = island
+            source = "" if best_island is None else f" (island {best_island})"
+            print(f"Overall best: {best_genome.fitness:.5f}{source}")
+
+            if (not config.no_fitness_termination
+                    and best_genome.fitness >= config.fitness_threshold):
+                break
+
+            # Each island's emigrants go to the next island in the ring.
+            immigrants = [reports[island - 1].emigrants
+                          for island in range(num_islands)]
+    finally:
+        for conn in connections:
+            try:
+                conn.send(("stop",))
+            except OSError:
+                pass
+        for process in processes:
+            process.join()
+        for conn in connections:
+            conn.close()
+
+    return best_genome
@@ -0,0 +1,241 @@
+"""Fitness evaluation with every game advanced in lockstep.
+
+Rather than playing one game at a time through the Gymnasium
+environment, calling net.activate once per move, the functions
+here play all of a generation's games at once: every board is
+stepped by one BoardBatch, and each network is activated for all
+of its live games with one matrix product per layer.
+"""
+import numpy as np
+
+from neat import activations
+from neat.graphs import required_for_output
+
+from .batch import BoardBatch, ShapeStreams
+from .env import action_scores
+from .metrics import timed
+
+NUM_GAMES = 5
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(5.0 * z, -60.0, 60.0)))
+
+
+def _tanh(z):
+    return np.tanh(np.clip(2.5 * z, -60.0, 60.0))
+
+
+def _relu(z):
+    return np.maximum(z, 0.0)
+
+
+def _identity(z):
+    return z
+
+
+def _clamped(z):
+    return np.clip(z, -1.0, 1.0)
+
+
+def _abs(z):
+    return np.abs(z)
+
+
+# NumPy equivalents of NEAT-Python's activation functions.
+_ACTIVATIONS = {
+    activations.sigmoid_activation: _sigmoid,
+    activations.tanh_activation: _tanh,
+    activations.relu_activation: _relu,
+    activations.identity_activation: _identity,
+    activations.clamped_activation: _clamped,
+    activations.abs_activation: _abs,
+}
+
+
+class BatchNetwork:
+    """A feed-forward network that is activated for many inputs at
+    once.  Outputs match those of neat.nn.FeedForwardNetwork, to
+    within floating point rounding.
+    """
+    def __init__(self, num_inputs, num_values, output_index, layers):
+        self.num_inputs = num_inputs
+        self.num_values = num_values
+        self.output_index = output_index
+        self.layers = layers
+
+    @classmethod
+    def create(cls, genome, config):
+        """Receives a genome and returns its phenotype."""
+        genome_config = config.genome_config
+        input_keys = genome_config.input_keys
+        output_keys = genome_config.output_keys
+        connections = [cg.key for cg in genome.connections.values()
+                       if cg.enabled]
+
+        # Value slots: inputs first, then outputs, then hidden nodes.
+        # Outputs that aren't evaluated stay at 0.0, as they do in
+        # neat.nn.FeedForwardNetwork.
+        index = {key: i for i, key in enumerate(input_keys + output_keys)}
+        links = {}
+        for key in connections:
+            inode, onode = key
+            links.setdefault(onode, []).append(
+                (inode, genome.connections[key].weight))
+            for node in key:
+                index.setdefault(node, len(index))
+
+        layers = []
+        for layer in cls._feed_forward_layers(input_keys, output_keys,
+                                              connections, links):
+            layer = sorted(layer)
+            weights = np.zeros((len(layer), len(index)))
+            for row, node in enumerate(layer):
+                for inode, weight in links[node]:
+                    weights[row, index[inode]] += weight
+            nodes = [genome.nodes[node] for node in layer]
+            for ng in nodes:
+                if ng.aggregation != "sum":
+                    raise ValueError(f"unsupported aggregation "
+                                     f"'{ng.aggregation}'")
+            funcs = [_ACTIVATIONS[genome_config.activation_defs.get(
+                ng.activation)] for ng in nodes]
+            layers.append((
+                np.array([index[node] for node in layer]),
+                weights,
+                np.array([ng.bias for ng in nodes])[:, None],
+                np.array([ng.response for ng in nodes])[:, None],
+                cls._group_activations(funcs)))
+
+        return cls(len(input_keys), len(index),
+                   [index[key] for key in output_keys], layers)
+
+    @staticmethod
+    def _feed_forward_layers(inputs, outputs, connections, links):
+        """Equivalent to neat.graphs.feed_forward_layers, but linear
+        rather than quadratic in the number of connections."""
+        required = required_for_output(inputs, outputs, connections)
+        layers = []
+        s = set(inputs)
+        while True:
+            c = set(b for (a, b) in connections if a in s and b not in s)
+            t = set(n for n in c
+                    if n in required
+                    and all(a in s for a, _ in links[n]))
+            if not t:
+                return layers
+            layers.append(t)
+            s |= t
+
+    @staticmethod
+    def _group_activations(funcs):
+        """Return a list of (func, rows) with one entry per distinct
+        activation function in funcs."""
+        if len(set(funcs)) == 1:
+            return [(funcs[0], slice(None))]
+        groups = {}
+        for row, func in enumerate(funcs):
+            groups.setdefault(func, []).append(row)
+        return [(func, np.array(rows)) for func, rows in groups.items()]
+
+    def activate(self, inputs):
+        """Activate the network for each row of inputs, returning
+        an array with one row of outputs for each row of inputs."""
+        values = np.zeros((self.num_values, len(inputs)))
+        values[:self.num_inputs] = inputs.T
+        for nodes, weights, bias, response, funcs in self.layers:
+            z = bias + response * (weights @ values)
+            for func, rows in funcs:
+                values[nodes[rows]] = func(z[rows])
+        return values[self.output_index].T
+
+
+def _game_rngs(seed, games):
+    """Return one random number generator for each of games.  Game 0
+    deals the same shapes as Env.reset(seed=seed) would."""
+    seedseq = np.random.SeedSequence(seed)
+    return [np.random.Generator(np.random.PCG64(
+        seedseq if game == 0 else
+        np.random.SeedSequence(seedseq.entropy, spawn_key=(game,))))
+            for game in games]
+
+
+def play(nets, seed=None, num_games=NUM_GAMES, first_game=0):
+    """Play num_games games with each of nets, returning a (len(nets),
+    num_games) array of each game's score, less one point for every
+    illegal move attempted, as scored by evolve.eval_network.  Every
+    network plays the same num_games sequences of shapes: games
+    first_game to first_game + num_games - 1 of those seed deals.
+    """
+    streams = ShapeStreams(_game_rngs(
+        seed, range(first_game, first_game + num_games)))
+    owners, games = np.divmod(np.arange(len(nets) * num_games), num_games)
+    boards = BoardBatch(streams, games)
+    penalties = np.zeros(len(boards), dtype=np.int64)
+    results = np.zeros((len(nets), num_games))
+
+    with timed("env_step"):
+        valid = boards.valid_actions
+    while len(boards):
+        with timed("observation"):
+            inputs = boards.observations
+        with timed("activation"):
+            outputs = np.empty(valid.shape)
+            starts = np.flatnonzero(np.diff(owners, prepend=-1))
+            for start, end in zip(starts,
+                                  list(starts[1:]) + [len(boards)]):
+                outputs[start:end] = action_scores(
+                    nets[owners[start]].activate(inputs[start:end]))
+
+        # Each game tries actions in descending order of activation
+        # (ties broken by descending index) until one is legal, and
+        # is penalized for every illegal action it tries on the way.
+        actions = outputs.shape[1] - 1 - np.argmax(
+            np.where(valid, outputs, -np.inf)[:, ::-1], axis=1)
+        chosen = outputs[np.arange(len(boards)), actions][:, None]
+        penalties += ((outputs > chosen)
+                      | ((outputs == chosen)
+                         & (np.arange(outputs.shape[1]) > actions[:, None]))
+                      ).sum(axis=1)
+
+        with timed("env_step"):
+            boards.one_move(actions)
+            valid = boards.valid_actions
+        terminated = ~valid.any(axis=1)
+        if terminated.any():
+            results[owners[terminated], games[terminated]] = (
+                boards.score[terminated] - penalties[terminated])
+            live = ~terminated
+            boards.select(live)
+            valid = valid[live]
+            owners = owners[live]
+            games = games[live]
+            penalties = penalties[live]
+
+    return results
+
+
+def score_genomes(genomes, config, first_game=0, num_games=NUM_GAMES):
+    """Return a dict mapping each genome's id to its average score
+    over the specified games."""
+    genomes = list(genomes)
+    nets = [BatchNetwork.create(genome, config) for _, genome in genomes]
+    scores = play(nets, seed=config.random_seed, num_games=num_games,
+                  first_game=first_game).mean(axis=1)
+    return {genome_id: float(score)
+            for (genome_id, _), score in zip(genomes, scores)}
+
+
+def eval_genomes(genomes, config, num_games=NUM_GAMES):
+    """Fitness function wrapped for Population.run()."""
+    genomes = list(genomes)
+    fitnesses = score_genomes(genomes, config, num_games=num_games)
+    for genome_id, genome in genomes:
+        genome.fitness = fitnesses[genome_id]
+
+
+def eval_genome(genome, config, num_games=NUM_GAMES):
+    """Fitness function wrapped for ParallelEvaluator."""
+    net = BatchNetwork.create(genome, config)
+    return float(play([net], seed=config.random_seed,
+                      num_games=num_games).mean())
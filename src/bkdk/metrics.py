@@ -0,0 +1,121 @@
+"""Per-generation timing of the phases of evolution.
+
+Code doing something worth timing wraps it in ``with timed(phase)``.
+The time spent in each phase accumulates in the process doing the
+work; worker processes send theirs back with their results, which
+merge_times adds to the coordinator's.  MetricsReporter collects the
+totals at the end of each generation, along with the time spent
+evaluating, reproducing and speciating, and writes them to a file,
+one JSON object per generation.  Phases timed in worker processes
+are summed over all workers, so with many workers they may add up to
+more than the evaluation's wall time.
+"""
+import json
+import threading
+import time
+
+import neat
+
+_lock = threading.Lock()
+_times = {}
+
+
+def add_time(phase, seconds):
+    with _lock:
+        _times[phase] = _times.get(phase, 0.0) + seconds
+
+
+def merge_times(times):
+    """Add the times returned by another process's take_times."""
+    for phase, seconds in times.items():
+        add_time(phase, seconds)
+
+
+def take_times():
+    """Return the time spent in each phase since the last call."""
+    global _times
+    with _lock:
+        times, _times = _times, {}
+    return times
+
+
+class timed:
+    """Context manager that adds the time spent in its body to phase."""
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        add_time(self.phase, time.perf_counter() - self._start)
+
+
+class MetricsReporter(neat.reporting.BaseReporter):
+    """Write the time spent in each phase of each generation to
+    filename, one JSON object per line.  Add it to the population
+    before any other reporters, so that speciation is timed
+    accurately; the time other reporters spend at the end of a
+    generation, checkpointing for example, is included in that
+    generation's record, which is written at the start of the next
+    generation, or on close.  Records are started once genomes have
+    been evaluated, so the generation that reaches the fitness
+    threshold, which ends without reproducing or speciating, is
+    recorded too.
+    """
+    def __init__(self, population, filename="evolve-metrics.jsonl"):
+        self.filename = filename
+        self._fp = open(filename, "a")
+        self._record = None
+
+        # Population.run calls reproduce then speciate between the
+        # post_evaluate and end_generation reports.
+        reproduction = population.reproduction
+        reproduce = reproduction.reproduce
+
+        def timed_reproduce(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return reproduce(*args, **kwargs)
+            finally:
+                self._reproduced = time.perf_counter()
+                add_time("reproduction", self._reproduced - start_time)
+
+        reproduction.reproduce = timed_reproduce
+
+    def close(self):
+        self._write_record()
+        self._fp.close()
+
+    def _write_record(self):
+        if self._record is None:
+            return
+        self._record.update(sorted(take_times().items()))
+        self._fp.write(json.dumps(self._record) + "\n")
+        self._fp.flush()
+        self._record = None
+
+    def start_generation(self, generation):
+        self._write_record()
+        take_times()
+        self.generation = generation
+        self._started = time.perf_counter()
+        self._reproduced = None
+
+    def post_evaluate(self, config, population, species, best_genome):
+        now = time.perf_counter()
+        evaluation = now - self._started
+        self._record = {
+            "generation": self.generation,
+            "population": len(population),
+            "generation_time": evaluation,
+            "evaluation": evaluation,
+            "evaluation_per_genome": evaluation / len(population),
+        }
+
+    def end_generation(self, config, population, species_set):
+        now = time.perf_counter()
+        self._record["generation_time"] = now - self._started
+        if self._reproduced is not None:
+            self._record["speciation"] = now - self._reproduced
@@ -0,0 +1,182 @@
+"""Parallel fitness evaluation in long-lived worker processes.
+
+neat.ParallelEvaluator pickles every genome along with the entire
+configuration, one genome per task, every generation.  The workers
+here receive the configuration once, when they start, and are then
+sent genomes in compact chunks.  Chunks are handed out as workers
+become free, so a slow chunk doesn't hold up the rest.
+"""
+import math
+import multiprocessing
+import os
+import time
+
+import gymnasium as gym
+import neat
+import numpy as np
+
+from . import evolve, lockstep, metrics, profiling
+
+
+def pack_genome(genome):
+    """Return a compact, picklable representation of the parts of
+    genome needed to build its network."""
+    nodes = genome.nodes.values()
+    connections = [cg for cg in genome.connections.values() if cg.enabled]
+    return (genome.key,
+            np.array([ng.key for ng in nodes], dtype=np.int32),
+            np.array([(ng.bias, ng.response) for ng in nodes]),
+            tuple((ng.activation, ng.aggregation) for ng in nodes),
+            np.array([cg.key for cg in connections],
+                     dtype=np.int32).reshape((-1, 2)),
+            np.array([cg.weight for cg in connections]))
+
+
+def unpack_genome(packed, config):
+    """Rebuild a genome from the output of pack_genome."""
+    key, node_keys, node_values, node_funcs, conn_keys, weights = packed
+    genome_config = config.genome_config
+    genome = config.genome_type(key)
+    for node_key, (bias, response), (activation, aggregation) \
+            in zip(node_keys.tolist(), node_values.tolist(), node_funcs):
+        ng = genome_config.node_gene_type(node_key)
+        ng.bias = bias
+        ng.response = response
+        ng.activation = activation
+        ng.aggregation = aggregation
+        genome.nodes[node_key] = ng
+    for conn_key, weight in zip(map(tuple, conn_keys.tolist()),
+                                weights.tolist()):
+        cg = genome_config.connection_gene_type(conn_key)
+        cg.weight = weight
+        cg.enabled = True
+        genome.connections[conn_key] = cg
+    return genome
+
+
+# Per-worker state, set up by _init_worker.
+_config = None
+_env = None
+_profiler = None
+
+
+def _init_worker(config, profile=None):
+    global _config, _profiler
+    _config = config
+    if profile is not None:
+        _profiler = profiling.create_profiler(profile)
+
+
+def _warm_env():
+    global _env
+    if _env is None:
+        _env = gym.make("bkdk/BKDK-v0")
+    return _env
+
+
+def _eval_chunk(task):
+    """Evaluate one chunk of packed genomes.  Returns a list of
+    (genome key, fitness), the worker's pid, the time spent, the
+    time spent in each phase, from metrics.take_times, and the
+    chunk's profile, if the worker is profiling."""
+    start_time = time.perf_counter()
+    metrics.take_times()
+    if _profiler is not None:
+        _profiler.start()
+    evaluator, seed, first_game, num_games, chunk = task
+    genomes = [unpack_genome(packed, _config) for packed in chunk]
+    if evaluator == "lockstep":
+        nets = [lockstep.BatchNetwork.create(genome, _config)
+                for genome in genomes]
+        fitnesses = lockstep.play(
+            nets, seed=seed, num_games=num_games,
+            first_game=first_game).mean(axis=1).tolist()
+    elif first_game:
+        raise ValueError(f"{evaluator} evaluator cannot skip games")
+    else:
+        fitnesses = [evolve.eval_network(
+            neat.nn.FeedForwardNetwork.create(genome, _config),
+            num_games=num_games, seed=seed, env=_warm_env())
+                     for genome in genomes]
+    results = [(genome.key, fitness)
+               for genome, fitness in zip(genomes, fitnesses)]
+    profile = _profiler.stop() if _profiler is not None else None
+    return (results, os.getpid(), time.perf_counter() - start_time,
+            metrics.take_times(), profile)
+
+
+class PersistentEvaluator(neat.reporting.BaseReporter):
+    """Evaluate genomes in a pool of long-lived worker processes.
+
+    Add the evaluator to the population as a reporter as well to
+    have it report per-worker utilization after each evaluation.
+    If profile is one of profiling.KINDS the workers profile their
+    evaluations, and the merged results are kept in self.profile.
+    """
+    def __init__(self, num_workers, config, evaluator="lockstep",
+                 chunks_per_worker=4, num_games=lockstep.NUM_GAMES,
+                 profile=None):
+        self.num_workers = num_workers
+        self.evaluator = evaluator
+        self.chunks_per_worker = chunks_per_worker
+        self.num_games = num_games
+        self.profile = None
+        if profile is not None:
+            self.profile = profiling.MergedProfile(profile)
+        self.start_generation(None)
+        self._pool = multiprocessing.Pool(num_workers, _init_worker,
+                                          (config, profile))
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    @property
+    def utilization(self):
+        """The fraction of this generation's evaluation time each
+        worker spent busy, keyed by worker pid."""
+        return {pid: busy / self._wall_time
+                for pid, busy in sorted(self._busy_time.items())}
+
+    def evaluate(self, genomes, config):
+        genomes = dict(genomes)
+        for genome_id, fitness in self.score(genomes.items(), config).items():
+            genomes[genome_id].fitness = fitness
+
+    def score(self, genomes, config, first_game=0, num_games=None):
+        """Return a dict mapping each genome's id to its average score
+        over the specified games (by default, all of them)."""
+        if num_games is None:
+            num_games = self.num_games
+        start_time = time.perf_counter()
+        packed = [pack_genome(genome) for _, genome in genomes]
+        chunk_size = math.ceil(
+            len(packed) / (self.num_workers * self.chunks_per_worker))
+        tasks = ((self.evaluator, config.random_seed, first_game, num_games,
+                  packed[start:start + chunk_size])
+                 for start in range(0, len(packed), chunk_size))
+
+        scores = {}
+        for results, pid, elapsed, times, profile \
+                in self._pool.imap_unordered(_eval_chunk, tasks):
+            scores.update(results)
+            metrics.merge_times(times)
+            if profile is not None:
+                self.profile.add(profile)
+            self._busy_time[pid] = self._busy_time.get(pid, 0) + elapsed
+        self._wall_time += time.perf_counter() - start_time
+        return scores
+
+    def start_generation(self, generation):
+        self._busy_time = {}
+        self._wall_time = 0.0
+
+    def post_evaluate(self, config, population, species, best_genome):
+        if not self.utilization:
+            return
+        # Workers that received no chunks were idle throughout.
+        idle = [0.0] * (self.num_workers - len(self.utilization))
+        utilization = list(self.utilization.values()) + idle
+        print("Worker utilization: {} (mean {:.0%})".format(
+            " ".join(f"{u:.0%}" for u in utilization),
+            sum(utilization) / len(utilization)))
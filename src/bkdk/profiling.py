@@ -0,0 +1,143 @@
+"""Profiling of evaluation in worker processes.
+
+evolve --profile runs everything in one process, under cProfile.
+With --profile-workers each evaluator worker instead profiles the
+chunks of genomes it evaluates, either with cProfile or with Sampler,
+a statistical profiler driven by SIGPROF, and sends the results back
+along with the chunk's fitnesses.  MergedProfile combines every
+worker's results into one report: a text summary, plus either a
+pstats file or, for sampled profiles, a file of collapsed stacks for
+flame graph tools.
+"""
+import collections
+import cProfile
+import os
+import pstats
+import signal
+
+KINDS = ("cprofile", "sample")
+
+
+class CProfiler:
+    """Profile each chunk with cProfile."""
+    kind = "cprofile"
+
+    def start(self):
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self):
+        """Stop profiling and return what was recorded."""
+        self._profile.disable()
+        self._profile.create_stats()
+        return self._profile.stats
+
+
+def _frame_name(code):
+    filename = os.path.join(*code.co_filename.split(os.sep)[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """Record the stack every interval seconds of CPU time."""
+    kind = "sample"
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+
+    def start(self):
+        self._stacks = collections.Counter()
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        """Stop sampling and return the number of times each stack
+        was seen, keyed by semicolon-separated frames, outermost
+        first."""
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+        return dict(self._stacks)
+
+    def _sample(self, signum, frame):
+        names = []
+        while frame is not None:
+            names.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        self._stacks[";".join(reversed(names))] += 1
+
+
+def create_profiler(kind):
+    if kind == "cprofile":
+        return CProfiler()
+    if kind == "sample":
+        return Sampler()
+    raise ValueError(f"unknown profiler {kind!r}")
+
+
+class _RecordedStats:
+    """Adapts stats returned by CProfiler.stop for pstats.Stats."""
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class MergedProfile:
+    """The combined results of many profilers of the same kind."""
+    def __init__(self, kind):
+        if kind not in KINDS:
+            raise ValueError(f"unknown profiler {kind!r}")
+        self.kind = kind
+        self.num_profiles = 0
+        self._stats = None
+        self._stacks = collections.Counter()
+
+    def add(self, profile):
+        """Add the output of a profiler's stop method."""
+        self.num_profiles += 1
+        if self.kind == "sample":
+            self._stacks.update(profile)
+        elif self._stats is None:
+            self._stats = pstats.Stats(_RecordedStats(profile))
+        else:
+            self._stats.add(_RecordedStats(profile))
+
+    def write(self, prefix, limit=40):
+        """Write the merged profile to files named prefix with a
+        suffix, and return their names."""
+        summary = f"{prefix}.txt"
+        if self.kind == "sample":
+            details = f"{prefix}.collapsed"
+            with open(details, "w") as fp:
+                for stack, count in sorted(self._stacks.items()):
+                    print(stack, count, file=fp)
+            with open(summary, "w") as fp:
+                self._write_sample_summary(fp, limit)
+        else:
+            details = f"{prefix}.pstats"
+            with open(summary, "w") as fp:
+                print(f"{self.num_profiles} profiles merged\n", file=fp)
+                if self._stats is not None:
+                    self._stats.stream = fp
+                    self._stats.dump_stats(details)
+                    self._stats.sort_stats("cumulative").print_stats(limit)
+        return summary, details
+
+    def _write_sample_summary(self, fp, limit):
+        total = sum(self._stacks.values())
+        inclusive = collections.Counter()
+        exclusive = collections.Counter()
+        for stack, count in self._stacks.items():
+            frames = stack.split(";")
+            exclusive[frames[-1]] += count
+            inclusive.update(dict.fromkeys(set(frames), count))
+        print(f"{total} samples from {self.num_profiles} profiles",
+              file=fp)
+        if not total:
+            return
+        for title, counts in (("self", exclusive),
+                              ("cumulative", inclusive)):
+            print(f"\nMost samples ({title}):", file=fp)
+            for name, count in counts.most_common(limit):
+                print(f"{count:8d} {count / total:6.1%}  {name}", file=fp)
@@ -0,0 +1,61 @@
+"""Fitness evaluation by successive halving.
+
+Rather than playing every genome the same number of games, a
+RacingEvaluator plays a few games with every genome, discards the
+worse-scoring fraction, plays more games with the remainder, and so
+on, until it has played as many games in total as playing every
+genome num_games games would have.  Genomes that clearly won't be
+selected get few games, and contenders get more.
+
+Every genome's fitness is its average score over the games it
+played, so fitnesses stay on the same scale as without racing.
+"""
+
+
+class RacingEvaluator:
+    """Evaluate genomes by successive halving.
+
+    score must take a list of (genome id, genome) tuples, the
+    configuration object, and the index and number of the games to
+    play, and return a dict mapping genome ids to average scores.
+    lockstep.score_genomes and the score methods of the parallel and
+    distributed evaluators all do this.
+    """
+    def __init__(self, score, num_games, initial_games=2,
+                 keep_fraction=0.5):
+        if not 0 < keep_fraction <= 1:
+            raise ValueError("keep_fraction must be in (0, 1]")
+        self.score = score
+        self.num_games = num_games
+        self.initial_games = initial_games
+        self.keep_fraction = keep_fraction
+        self.rounds = []
+
+    def evaluate(self, genomes, config):
+        genomes = dict(genomes)
+        budget = len(genomes) * self.num_games
+        total_score = dict.fromkeys(genomes, 0.0)
+        contenders = list(genomes)
+        games_played = 0
+        new_games = self.initial_games
+        self.rounds = []
+
+        while True:
+            new_games = min(new_games, budget // len(contenders))
+            if new_games < 1:
+                break
+            scores = self.score([(gid, genomes[gid]) for gid in contenders],
+                                config, games_played, new_games)
+            self.rounds.append((len(contenders), new_games))
+            budget -= len(contenders) * new_games
+            games_played += new_games
+            for gid in contenders:
+                total_score[gid] += scores[gid] * new_games
+                genomes[gid].fitness = total_score[gid] / games_played
+
+            # Keep the best, and double the games they've played.
+            num_kept = max(1, int(len(contenders) * self.keep_fraction))
+            contenders.sort(key=lambda gid: genomes[gid].fitness,
+                            reverse=True)
+            del contenders[num_kept:]
+            new_games = games_played
@@ -0,0 +1,250 @@
+"""Recording of episodes, for watching later.
+
+EpisodeRecorder wraps an Env, or a TinyScreen, and records every
+every-th episode as compact rows: each observation's bits, packed,
+along with the action that led to it, the reward and the score.
+Rows are collected into chunks, which a background thread compresses
+and writes to a directory, one file per chunk, so memory use is
+bounded however long the run.  Nothing is rendered while recording:
+read_episodes reads the episodes back, and rendering them to screens,
+frames or image files is done offline, on demand.
+"""
+import glob
+import json
+import os
+import queue
+import threading
+
+import gymnasium as gym
+import numpy as np
+
+from gymnasium.spaces.utils import flatten, flatdim
+
+from .env import BOARD_SIZE, NUM_CHOICES
+from .ts.core import TinyScreen
+from .ts.rgb import rgb_frames
+
+METADATA = "recording.json"
+CHUNK_PATTERN = "chunk-{:06d}.npz"
+
+# The action recorded for the first observation of each episode.
+NO_ACTION = -1
+
+
+class EpisodeRecorder(gym.Wrapper):
+    """Record every every-th episode of env in directory, in files
+    of up to chunk_size steps.  At most max_pending chunks wait to
+    be written; if the writer falls further behind, stepping waits.
+    If directory already holds a recording, this one is appended to
+    it, with episodes numbered after those already recorded; its
+    observations must be of the same kind.
+    """
+    def __init__(self, env, directory="episodes", every=1,
+                 chunk_size=4096, max_pending=4):
+        super().__init__(env)
+        self.directory = directory
+        self.every = every
+        self.chunk_size = chunk_size
+
+        space = env.observation_space
+        if isinstance(space, gym.spaces.Dict):
+            kind = "env"
+        elif space.shape == (19, 19):
+            kind = "tinyscreen"
+        else:
+            raise ValueError(f"can't record observations in {space}")
+        metadata = {"observation": kind, "bits": flatdim(space)}
+        os.makedirs(directory, exist_ok=True)
+        metadata_filename = os.path.join(directory, METADATA)
+        if os.path.exists(metadata_filename):
+            with open(metadata_filename) as fp:
+                existing = json.load(fp)
+            if existing != metadata:
+                raise ValueError(f"can't append {metadata} observations "
+                                 f"to {directory}, which has {existing}")
+        else:
+            with open(metadata_filename, "w") as fp:
+                json.dump(metadata, fp)
+
+        # Carry on after any chunks already in directory.
+        chunk_filenames = _chunk_filenames(directory)
+        self._next_chunk = len(chunk_filenames)
+        self._episode = -1
+        if chunk_filenames:
+            with np.load(chunk_filenames[-1]) as chunk:
+                self._episode = int(chunk["episode"].max())
+        self._first_episode = self._episode + 1
+        self._recording = False
+        self._start_chunk()
+
+        self._queue = queue.Queue(max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def reset(self, **kwargs):
+        observation, info = self.env.reset(**kwargs)
+        self._episode += 1
+        self._step = 0
+        self._recording = \
+            (self._episode - self._first_episode) % self.every == 0
+        if self._recording:
+            self._record(observation, NO_ACTION, 0, info)
+        return observation, info
+
+    def step(self, action):
+        (observation,
+         reward,
+         terminated, truncated, info) = self.env.step(action)
+        self._step += 1
+        if self._recording:
+            choice, row, column = self.env.unwrapped._decode_action(action)
+            self._record(observation,
+                         (choice * BOARD_SIZE + row) * BOARD_SIZE + column,
+                         reward, info)
+        return observation, reward, terminated, truncated, info
+
+    def _start_chunk(self):
+        self._rows = {"episode": [], "step": [], "observation": [],
+                      "action": [], "reward": [], "score": []}
+
+    def _record(self, observation, action, reward, info):
+        rows = self._rows
+        rows["episode"].append(self._episode)
+        rows["step"].append(self._step)
+        rows["observation"].append(
+            np.packbits(flatten(self.env.observation_space, observation)))
+        rows["action"].append(action)
+        rows["reward"].append(reward)
+        rows["score"].append(info["score"])
+        if len(rows["step"]) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Queue the steps recorded since the last chunk was queued."""
+        self._raise_error()
+        rows = self._rows
+        if not rows["step"]:
+            return
+        chunk = {
+            "episode": np.array(rows["episode"], dtype=np.int64),
+            "step": np.array(rows["step"], dtype=np.int64),
+            "observation": np.array(rows["observation"], dtype=np.uint8),
+            "action": np.array(rows["action"], dtype=np.int16),
+            "reward": np.array(rows["reward"], dtype=np.int64),
+            "score": np.array(rows["score"], dtype=np.int64),
+        }
+        filename = os.path.join(self.directory,
+                                CHUNK_PATTERN.format(self._next_chunk))
+        self._next_chunk += 1
+        self._start_chunk()
+        self._queue.put((filename, chunk))
+
+    def close(self):
+        """Write everything recorded, then close env."""
+        try:
+            self.flush()
+            self._queue.put(None)
+            self._thread.join()
+            self._raise_error()
+        finally:
+            super().close()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _write(self):
+        while (item := self._queue.get()) is not None:
+            filename, chunk = item
+            try:
+                tmpfile = f"{filename}.tmp"
+                with open(tmpfile, "wb") as fp:
+                    np.savez_compressed(fp, **chunk)
+                os.replace(tmpfile, filename)
+            except Exception as e:
+                self._error = e
+
+
+def _chunk_filenames(directory):
+    return sorted(glob.glob(os.path.join(directory,
+                                         CHUNK_PATTERN.replace("{:06d}",
+                                                               "*"))))
+
+
+class Episode:
+    """One recorded episode.  Observations are packed bits; use
+    screens, or frames, to see them."""
+    def __init__(self, kind, bits, episode, step, observation, action,
+                 reward, score):
+        self.kind = kind
+        self.bits = bits
+        self.episode = episode
+        self.steps = step
+        self.observations = observation
+        self.actions = action
+        self.rewards = reward
+        self.scores = score
+
+    def __len__(self):
+        return len(self.steps)
+
+    def screens(self):
+        """Return the episode's observations as TinyScreen screens,
+        a (steps, 19, 19) array."""
+        bits = np.unpackbits(self.observations, axis=1, count=self.bits)
+        if self.kind == "tinyscreen":
+            return bits.reshape((-1, 19, 19))
+        num_board = BOARD_SIZE**2
+        boards = bits[:, :num_board].reshape((-1, BOARD_SIZE, BOARD_SIZE))
+        choices = bits[:, num_board:].reshape((len(self), NUM_CHOICES,
+                                               5, 5))
+        return TinyScreen.screens(boards, choices, self.scores)
+
+    def frames(self, cellsize=TinyScreen.CELLSIZE):
+        """Return the episode's RGB frames, as rgb_array rendering
+        would have."""
+        return rgb_frames(self.screens(), cellsize)
+
+    def write_images(self, prefix, cellsize=TinyScreen.CELLSIZE):
+        """Write each frame to a PNG file named prefix, the step
+        number and ".png", and return their names."""
+        from PIL import Image
+
+        filenames = []
+        for step, frame in zip(self.steps.tolist(), self.frames(cellsize)):
+            filename = f"{prefix}{step:06d}.png"
+            Image.fromarray(frame).save(filename)
+            filenames.append(filename)
+        return filenames
+
+
+def read_episodes(directory="episodes"):
+    """Yield each episode recorded in directory, reading one chunk
+    at a time."""
+    with open(os.path.join(directory, METADATA)) as fp:
+        metadata = json.load(fp)
+    columns = ("episode", "step", "observation", "action", "reward",
+               "score")
+    pending = None
+    for filename in _chunk_filenames(directory):
+        with np.load(filename) as chunk:
+            chunk = {column: chunk[column] for column in columns}
+        if pending is not None:
+            chunk = {column: np.concatenate((pending[column], chunk[column]))
+                     for column in columns}
+        # The last episode may continue in the next chunk.
+        starts = [0] + (np.flatnonzero(np.diff(chunk["episode"]))
+                        + 1).tolist()
+        for start, end in zip(starts[:-1], starts[1:]):
+            yield _episode(metadata, chunk, columns, start, end)
+        pending = {column: chunk[column][starts[-1]:] for column in columns}
+    if pending is not None and len(pending["step"]):
+        yield _episode(metadata, pending, columns, 0, len(pending["step"]))
+
+
+def _episode(metadata, chunk, columns, start, end):
+    return Episode(metadata["observation"], metadata["bits"],
+                   int(chunk["episode"][start]),
+                   *(chunk[column][start:end] for column in columns[1:]))
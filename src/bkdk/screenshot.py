@@ -1,72 +1,131 @@
+import functools
+
+from collections import namedtuple
+
 import numpy as np
-from PIL import Image, ImageOps
+from PIL import Image
 
 
-def Screenshot(*args, **kwargs):
+def Screenshot(*args, draft=False, **kwargs):
+    """Open a screenshot.  If draft is true, JPEGs are decoded at
+    the smallest size that keeps MIN_DRAFT_PIXELS in each cell.
+    Either way, the board and choices are located in the coordinates
+    of the full-resolution screenshot, its screen_size."""
     img = Image.open(*args, **kwargs)
     # https://stackoverflow.com/a/11050571
     cls = img.__class__
     img.__class__ = cls.__class__(cls.__name__ + "Screenshot",
                                   (cls, ScreenshotDecoder), {})
+    img.screen_size = width, height = img.size
+    img.scale = 1
+    scale = draft_scale(layout(img.size)) if draft else 1
+    if scale > 1:
+        # JPEG decoders scale by 1/2, 1/4 or 1/8, rounding up.
+        img.draft("RGB", (width // scale, height // scale))
+        img.scale = next(scale for scale in (8, 4, 2, 1)
+                         if img.size == (-(-width // scale),
+                                         -(-height // scale)))
     return img
 
 
+# Where the board and the choices are in a screenshot, as the
+# centers and cell sizes of each.
+Layout = namedtuple("Layout", ("board", "choices"))
+Grid = namedtuple("Grid", ("cen_xy", "cellsize"))
+
+
+@functools.lru_cache()
+def layout(size):
+    """Return the Layout of screenshots of size.  Screenshots from
+    one device share a size, so this is computed once per device."""
+    width, height = size
+    boardsize = min(size) * 17 // 18
+    cellsize = boardsize // 9
+    yoffset = width * 5 // 72
+    board = Grid((width // 2, height // 2 - yoffset), cellsize)
+
+    xcen = width // 2
+    xcen_plusminus = width * 5 // 16
+    ycen = board.cen_xy[1] + width * 105 // 144
+    cellsize = width // 18
+    return Layout(board, tuple(
+        Grid((xcen + xcen_plusminus * (i - 1), ycen), cellsize)
+        for i in range(3)))
+
+
+@functools.lru_cache(maxsize=1024)
+def cell_centers(cen_xy, cellsize, num_rows, num_cols):
+    """Return the centers of a grid of num_rows x num_cols cells,
+    centered on cen_xy, row by row."""
+    centers = []
+    for row in range(num_rows):
+        yoff = (row * 2 - (num_rows - 1)) * cellsize // 2
+        for col in range(num_cols):
+            xoff = (col * 2 - (num_cols - 1)) * cellsize // 2
+            centers.append((cen_xy[0] + xoff, cen_xy[1] + yoff))
+    return tuple(centers)
+
+
+# Screenshots opened in draft mode keep at least this many pixels in
+# each cell's rect, so that one stray pixel doesn't take a cell below
+# MIN_CONFIDENCE.
+MIN_DRAFT_PIXELS = 100
+
+
+def draft_scale(layout):
+    """Return the largest scale screenshots of layout can be decoded
+    at while keeping MIN_DRAFT_PIXELS in each cell."""
+    side = min(2 * (grid.cellsize // 3)
+               for grid in (layout.board, *layout.choices))
+    for scale in 8, 4, 2:
+        if (side // scale)**2 >= MIN_DRAFT_PIXELS:
+            return scale
+    return 1
+
+
+@functools.lru_cache(maxsize=1024)
+def cell_rects(cen_xy, cellsize, shapes, scale=1):
+    """Return the rects of the cells of grids of each of shapes, all
+    centered on cen_xy, one after another, as a read-only array.  If
+    scale is given the rects are of an image scaled by 1/scale."""
+    r = cellsize // 3
+    centers = np.array(sum((cell_centers(cen_xy, cellsize, *shape)
+                            for shape in shapes), ()))
+    rects = scale_rects(np.hstack((centers - r, centers + r)), scale)
+    rects.flags.writeable = False
+    return rects
+
+
+def scale_rects(rects, scale):
+    """Return the rects of an image scaled by 1/scale that best match
+    rects, all the same size, of the full-size image."""
+    if scale == 1:
+        return rects
+    origins = -(-rects[:, :2] // scale)
+    size = (rects[0, 2:] - rects[0, :2]) // scale
+    return np.hstack((origins, origins + size))
+
+
 class ScreenshotDecoder:
     @property
-    def board(self):
-        boardsize = min(self.size) * 17 // 18
-        cellsize = boardsize // 9
-        yoffset = self.width * 5 // 72
-        return BoardDecoder(self,
-                            (self.width // 2,
-                             self.height // 2 - yoffset),
-                            cellsize)
+    def layout(self):
+        return layout(self.screen_size)
 
     @property
-    def choices(self):
-        xcen = self.width // 2
-        xcen_plusminus = self.width * 5 // 16
-        ycen = self.board.cen_xy[1] + self.width * 105 // 144
-        cellsize = self.width // 18
-        return tuple(
-            ChoiceDecoder(self,
-                          ((xcen + xcen_plusminus * (i - 1),
-                            ycen)),
-                          cellsize)
-            for i in range(3))
-
-
-class BoardDecoder:
-    def __init__(self, img, cen_xy, cellsize):
-        self.img = img
-        self.cen_xy = cen_xy
-        self.cellsize = cellsize
+    def board(self):
+        return BoardDecoder(self, *self.layout.board)
 
     @property
-    def cells(self):
-        for row in range(-4, 5):
-            ycen = self.cen_xy[1] + row * self.cellsize
-            for col in range(-4, 5):
-                xcen = self.cen_xy[0] + col * self.cellsize
-                yield CellDecoder(self.img, (xcen, ycen), self.cellsize)
-
-    def tolist(self):
-        return np.asarray([cell.is_set for cell in self.cells],
-                          dtype=np.uint8).reshape((9, 9)).tolist()
+    def choices(self):
+        return tuple(ChoiceDecoder(self, *choice)
+                     for choice in self.layout.choices)
 
 
-class ChoiceDecoder:
+class GridDecoder:
     def __init__(self, img, cen_xy, cellsize):
         self.img = img
         self.cen_xy = cen_xy
         self.cellsize = cellsize
-        for self.num_rows in 4, 5:
-            for self.num_cols in 4, 5:
-                try:
-                    list(cell.is_set for cell in self.cells)
-                    return
-                except CellDecodingError:
-                    pass
 
     @property
     def _shape(self):
@@ -74,17 +133,48 @@ class ChoiceDecoder:
 
     @property
     def cells(self):
-        for row in range(self.num_rows):
-            yoff = (row * 2 - (self.num_rows - 1)) * self.cellsize // 2
-            ycen = self.cen_xy[1] + yoff
-            for col in range(self.num_cols):
-                xoff = (col * 2 - (self.num_cols - 1)) * self.cellsize // 2
-                xcen = self.cen_xy[0] + xoff
-                yield CellDecoder(self.img, (xcen, ycen), self.cellsize)
+        for xcen, ycen in cell_centers(self.cen_xy, self.cellsize,
+                                       *self._shape):
+            yield CellDecoder(self.img, (xcen, ycen), self.cellsize)
+
+    def confidences(self):
+        """Return the percentage of each cell's pixels that are its
+        color, as a list of rows."""
+        (_, confidences), = grid_results(
+            self.img, self.cen_xy, self.cellsize, (self._shape,))
+        return confidences.reshape(self._shape).tolist()
+
+    def _decode(self):
+        (colors, confidences), = grid_results(
+            self.img, self.cen_xy, self.cellsize, (self._shape,))
+        return decode_colors(
+            colors, confidences,
+            lambda: cell_rects(self.cen_xy, self.cellsize, (self._shape,)),
+        ).reshape(self._shape)
+
+
+class BoardDecoder(GridDecoder):
+    num_rows = num_cols = 9
 
     def tolist(self):
-        result = np.asarray([cell.is_set for cell in self.cells],
-                            dtype=np.uint8).reshape(self._shape)
+        return self._decode().tolist()
+
+
+class ChoiceDecoder(GridDecoder):
+    LAYOUTS = ((4, 4), (4, 5), (5, 4), (5, 5))
+
+    def __init__(self, img, cen_xy, cellsize):
+        super().__init__(img, cen_xy, cellsize)
+        # Decode the cells of every layout together, then use the
+        # first layout whose cells can all be decoded.
+        results = grid_results(img, cen_xy, cellsize, self.LAYOUTS)
+        for (self.num_rows, self.num_cols), (_, confidences) in zip(
+                self.LAYOUTS, results):
+            if confidences.min() >= MIN_CONFIDENCE:
+                return
+
+    def tolist(self):
+        result = self._decode()
         if self.num_cols < 5:
             result = np.hstack((result, np.zeros((self.num_rows, 1),
                                                  dtype=result.dtype)))
@@ -107,16 +197,109 @@ class CellDecoder:
 
     @property
     def is_set(self):
-        img = self.img.crop(self.rect)
-        img = ImageOps.posterize(img, 1)
-        num_pixels = img.width * img.height
-        colors = img.getcolors(num_pixels)
-        max_count, color = max(colors)
-        confidence = 100 * max_count // num_pixels
-        if confidence < 99:
-            raise CellDecodingError(f"{confidence}% at {self.rect}")
-        return 0 in color
+        return bool(decode_cells(self.img, (self,))[0])
 
 
 class CellDecodingError(ValueError):
     pass
+
+
+# A cell is decoded from the most common color in its rect, with
+# each channel posterized to one bit.  Cells where fewer than this
+# percentage of pixels are that color can't be decoded.
+MIN_CONFIDENCE = 99
+
+# The posterized white, the only color of unset cells.
+_WHITE = 7
+
+
+def _color_codes(img):
+    """Return img's pixels posterized to one bit per channel, as
+    color codes 0-7 of each channel's top bit, red's the most
+    significant.  The codes are computed once per image."""
+    codes = getattr(img, "_bkdk_color_codes", None)
+    if codes is None:
+        rgb = img if img.mode == "RGB" else img.convert("RGB")
+        bits = np.frombuffer(rgb.tobytes(), dtype=np.uint8).reshape(
+            (img.height, img.width, 3)) >> 7
+        codes = (bits[..., 0] << 2) | (bits[..., 1] << 1) | bits[..., 2]
+        img._bkdk_color_codes = codes
+    return codes
+
+
+def cell_colors(img, rects):
+    """Return the most common posterized color of each of rects, all
+    the same size, as computed by ImageOps.posterize(img.crop(rect),
+    1).getcolors(), and the percentage of each rect's pixels that
+    are that color.  Colors are returned as _color_codes.  Pixels
+    outside img are black, as crop makes them."""
+    codes = _color_codes(img)
+    rects = np.asarray(rects, dtype=np.int64).reshape((-1, 4))
+    num_rects = len(rects)
+    width = rects[0, 2] - rects[0, 0]
+    height = rects[0, 3] - rects[0, 1]
+    ys = rects[:, 1, None, None] + np.arange(height)[:, None]
+    xs = rects[:, 0, None, None] + np.arange(width)
+    img_height, img_width = codes.shape
+    outside = (ys < 0) | (ys >= img_height) | (xs < 0) | (xs >= img_width)
+    clipped = outside.any()
+    if clipped:
+        ys = np.clip(ys, 0, img_height - 1)
+        xs = np.clip(xs, 0, img_width - 1)
+    pixels = np.take(codes, ys * img_width + xs)
+    if clipped:
+        pixels[outside] = 0
+
+    counts = np.bincount(
+        (pixels.reshape((num_rects, -1))
+         + 8 * np.arange(num_rects)[:, None]).ravel(),
+        minlength=8 * num_rects).reshape((num_rects, 8))
+    # Like max(getcolors()), take the greatest color of equal counts.
+    colors = 7 - np.argmax(counts[:, ::-1], axis=1)
+    max_counts = counts[np.arange(num_rects), colors]
+    return colors, 100 * max_counts // (width * height)
+
+
+def grid_results(img, cen_xy, cellsize, shapes):
+    """Return the colors and confidences cell_colors finds for the
+    cells of grids of each of shapes, centered on cen_xy.  Results
+    are memoized per image, by center, cell size and shape, and the
+    grids not yet decoded are decoded together."""
+    results = getattr(img, "_bkdk_grid_results", None)
+    if results is None:
+        results = img._bkdk_grid_results = {}
+    keys = [(cen_xy, cellsize, shape) for shape in shapes]
+    missing = tuple(key[2] for key in keys if key not in results)
+    if missing:
+        colors, confidences = cell_colors(
+            img, cell_rects(cen_xy, cellsize, missing, img.scale))
+        start = 0
+        for shape in missing:
+            end = start + shape[0] * shape[1]
+            results[cen_xy, cellsize, shape] = (colors[start:end],
+                                                confidences[start:end])
+            start = end
+    return [results[key] for key in keys]
+
+
+def decode_colors(colors, confidences, rects):
+    """Return whether each cell of colors and confidences, as found
+    by cell_colors, is set, as an array of 0 and 1.  Raises
+    CellDecodingError for the first cell whose color is uncertain,
+    as CellDecoder.is_set would.  rects is called for the cells'
+    rects, for the error message."""
+    uncertain = np.flatnonzero(confidences < MIN_CONFIDENCE)
+    if uncertain.size:
+        index = uncertain[0]
+        rect = tuple(rects()[index].tolist())
+        raise CellDecodingError(f"{confidences[index]}% at {rect}")
+    return (colors != _WHITE).astype(np.uint8)
+
+
+def decode_cells(img, cells):
+    """Return whether each of cells, CellDecoders of the same size,
+    is set, as an array of 0 and 1.  Raises CellDecodingError for
+    the first cell whose color is uncertain."""
+    rects = np.array([cell.rect for cell in cells])
+    return decode_colors(*cell_colors(img, scale_rects(rects, img.scale)),
+                         lambda: rects)
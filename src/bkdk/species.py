@@ -0,0 +1,340 @@
+"""Faster speciation for large genomes.
+
+NEAT-Python's DefaultSpeciesSet computes every genetic distance it
+needs in pure Python, one gene at a time.  With our 156 inputs and
+243 outputs genomes have thousands of connections, and speciating a
+large population takes longer than evaluating it.
+
+FastSpeciesSet speciates exactly as DefaultSpeciesSet does, but it
+holds each genome's genes in NumPy arrays, computes the distances
+each phase of speciation will need up front, in batches (and,
+optionally, in parallel), and keeps distances between generations
+for genomes that survive.  Distances are computed in the same order
+and with the same operations as DefaultGenome.distance, so they are
+identical, bit for bit, and so is the resulting speciation.
+"""
+import math
+import multiprocessing
+
+import numpy as np
+
+from neat.math_util import mean, stdev
+from neat.species import DefaultSpeciesSet, GenomeDistanceCache, Species
+
+# Activation and aggregation function names, as small integers.
+_FUNCTION_CODES = {}
+
+
+def _function_codes(names):
+    return np.array([_FUNCTION_CODES.setdefault(name, len(_FUNCTION_CODES))
+                     for name in names], dtype=np.int64)
+
+
+class _GeneArrays:
+    """A genome's genes, as arrays in the genome's own gene order."""
+    def __init__(self, genome):
+        nodes = list(genome.nodes.values())
+        self.node_keys = np.array([ng.key for ng in nodes], dtype=np.int64)
+        self.bias = np.array([ng.bias for ng in nodes])
+        self.response = np.array([ng.response for ng in nodes])
+        self.activation = _function_codes(ng.activation for ng in nodes)
+        self.aggregation = _function_codes(ng.aggregation for ng in nodes)
+
+        conns = list(genome.connections.values())
+        self.conn_keys = np.array([i * 2**32 + o for i, o in
+                                   (cg.key for cg in conns)],
+                                  dtype=np.int64)
+        self.weight = np.array([cg.weight for cg in conns])
+        self.enabled = np.array([cg.enabled for cg in conns], dtype=bool)
+
+        self.node_order = np.argsort(self.node_keys)
+        self.sorted_node_keys = self.node_keys[self.node_order]
+        self.conn_order = np.argsort(self.conn_keys)
+        self.sorted_conn_keys = self.conn_keys[self.conn_order]
+
+
+def _gene_distances(a, others, keys, sorted_keys, order, values):
+    """Compare genome a's genes with those of each of others.
+
+    Returns the number of genes in each genome in others, the number
+    of genes they share with a, and an array whose rows are the per-gene
+    distances of the genes each shares with a, as computed by
+    values(a_index, others_index), ordered as a's genes are, padded
+    with zeros.
+    """
+    lengths = np.array([len(getattr(b, keys)) for b in others])
+    if not len(getattr(a, keys)) or not lengths.any():
+        return lengths, np.zeros(len(others), dtype=np.int64), None
+
+    # Find each of others' genes in a.
+    other_keys = np.concatenate([getattr(b, keys) for b in others])
+    a_sorted_keys = getattr(a, sorted_keys)
+    pos = np.minimum(np.searchsorted(a_sorted_keys, other_keys),
+                     len(a_sorted_keys) - 1)
+    other_index = np.flatnonzero(a_sorted_keys[pos] == other_keys)
+    a_index = getattr(a, order)[pos[other_index]]
+    owner = np.repeat(np.arange(len(others)), lengths)[other_index]
+
+    # Lay the shared genes out one row per genome, in a's gene order.
+    by_owner = np.lexsort((a_index, owner))
+    a_index = a_index[by_owner]
+    other_index = other_index[by_owner]
+    owner = owner[by_owner]
+    num_shared = np.bincount(owner, minlength=len(others))
+    starts = np.cumsum(num_shared) - num_shared
+    columns = np.arange(len(owner)) - np.repeat(starts, num_shared)
+    rows = np.zeros((len(others), num_shared.max()))
+    rows[owner, columns] = values(a_index, other_index)
+    return lengths, num_shared, rows
+
+
+def _part_distances(a_length, lengths, num_shared, rows,
+                    disjoint_coefficient):
+    """Combine the output of _gene_distances as the node and
+    connection parts of DefaultGenome.distance do."""
+    distances = np.zeros(len(lengths))
+    if rows is not None and rows.shape[1]:
+        # Sum from left to right, as DefaultGenome.distance does.
+        distances = np.cumsum(rows, axis=1)[:, -1]
+    disjoint = a_length + lengths - 2 * num_shared
+    longest = np.maximum(a_length, lengths)
+    nonempty = longest > 0
+    distances[nonempty] = ((distances[nonempty]
+                            + disjoint_coefficient * disjoint[nonempty])
+                           / longest[nonempty])
+    return distances
+
+
+def _distances(task):
+    """Equivalent to [a.distance(b, ...) for b in others]."""
+    a, others, weight_coefficient, disjoint_coefficient = task
+
+    bias = np.concatenate([b.bias for b in others])
+    response = np.concatenate([b.response for b in others])
+    activation = np.concatenate([b.activation for b in others])
+    aggregation = np.concatenate([b.aggregation for b in others])
+
+    def node_values(ia, ib):
+        d = (np.abs(a.bias[ia] - bias[ib])
+             + np.abs(a.response[ia] - response[ib]))
+        d += np.where(a.activation[ia] != activation[ib], 1.0, 0.0)
+        d += np.where(a.aggregation[ia] != aggregation[ib], 1.0, 0.0)
+        return d * weight_coefficient
+
+    weight = np.concatenate([b.weight for b in others])
+    enabled = np.concatenate([b.enabled for b in others])
+
+    def connection_values(ia, ib):
+        d = np.abs(a.weight[ia] - weight[ib])
+        d += np.where(a.enabled[ia] != enabled[ib], 1.0, 0.0)
+        return d * weight_coefficient
+
+    node_distances = _part_distances(
+        len(a.node_keys),
+        *_gene_distances(a, others, "node_keys", "sorted_node_keys",
+                         "node_order", node_values),
+        disjoint_coefficient)
+    connection_distances = _part_distances(
+        len(a.conn_keys),
+        *_gene_distances(a, others, "conn_keys", "sorted_conn_keys",
+                         "conn_order", connection_values),
+        disjoint_coefficient)
+    return (node_distances + connection_distances).tolist()
+
+
+class _DistanceCache(GenomeDistanceCache):
+    """A GenomeDistanceCache that takes distances from the species
+    set's longer-lived cache rather than computing them itself."""
+    def __init__(self, config, species_set):
+        super().__init__(config)
+        self._species_set = species_set
+
+    def __call__(self, genome0, genome1):
+        g0 = genome0.key
+        g1 = genome1.key
+        d = self.distances.get((g0, g1))
+        if d is None:
+            d = self._species_set._distance(genome0, genome1)
+            self.distances[g0, g1] = d
+            self.distances[g1, g0] = d
+            self.misses += 1
+        else:
+            self.hits += 1
+        return d
+
+
+class FastSpeciesSet(DefaultSpeciesSet):
+    """A drop-in replacement for DefaultSpeciesSet, configured by the
+    same [DefaultSpeciesSet] section.  Set num_workers to compute
+    distances in that many processes.
+    """
+    num_workers = 1
+
+    def __init__(self, config, reporters):
+        super().__init__(config, reporters)
+        self._init_caches()
+
+    def _init_caches(self):
+        self._genes = {}
+        self._distances = {}
+        self._genome_config = None
+        self._pool = None
+
+    def __getstate__(self):
+        # Caches are rebuilt as needed, and pools can't be pickled.
+        state = self.__dict__.copy()
+        for name in ("_genes", "_distances", "_genome_config", "_pool"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_caches()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def _gene_arrays(self, genome):
+        genes = self._genes.get(genome.key)
+        if genes is None:
+            genes = self._genes[genome.key] = _GeneArrays(genome)
+        return genes
+
+    def _distance(self, genome0, genome1):
+        """Return genome0.distance(genome1, ...)."""
+        key = genome0.key, genome1.key
+        d = self._distances.get(key)
+        if d is None:
+            d = self._distances[key] = _distances((
+                self._gene_arrays(genome0),
+                [self._gene_arrays(genome1)],
+                self._genome_config.compatibility_weight_coefficient,
+                self._genome_config.compatibility_disjoint_coefficient))[0]
+        return d
+
+    def _precompute(self, pairs):
+        """Compute the distances for many (genome0, genome1) pairs
+        in batches of pairs that share the same genome0."""
+        batches = {}
+        for genome0, genome1 in pairs:
+            if (genome0.key, genome1.key) not in self._distances:
+                batches.setdefault(genome0.key, (genome0, []))[1].append(
+                    genome1)
+        if not batches:
+            return
+
+        coefficients = (self._genome_config.compatibility_weight_coefficient,
+                        self._genome_config.compatibility_disjoint_coefficient)
+        tasks = []
+        for genome0, others in batches.values():
+            genes0 = self._gene_arrays(genome0)
+            others_genes = [self._gene_arrays(g) for g in others]
+            chunk_size = max(1, math.ceil(len(others) / self.num_workers))
+            for start in range(0, len(others), chunk_size):
+                tasks.append((genome0, others[start:start + chunk_size],
+                              (genes0, others_genes[start:start + chunk_size])
+                              + coefficients))
+
+        if self.num_workers > 1:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(self.num_workers)
+            results = self._pool.map(_distances, [t[2] for t in tasks])
+        else:
+            results = map(_distances, (t[2] for t in tasks))
+
+        for (genome0, others, _), distances in zip(tasks, results):
+            for genome1, d in zip(others, distances):
+                self._distances[genome0.key, genome1.key] = d
+
+    def speciate(self, config, population, generation):
+        """
+        Place genomes into species by genetic similarity.
+
+        This is DefaultSpeciesSet.speciate, with the distances each
+        phase will need precomputed.
+        """
+        assert isinstance(population, dict)
+
+        compatibility_threshold = \
+            self.species_set_config.compatibility_threshold
+        self._genome_config = config.genome_config
+
+        # Find the best representatives for each existing species.
+        unspeciated = set(population)
+        self._precompute((s.representative, g)
+                         for s in self.species.values()
+                         for g in population.values())
+        distances = _DistanceCache(config.genome_config, self)
+        new_representatives = {}
+        new_members = {}
+        for sid, s in self.species.items():
+            candidates = []
+            for gid in unspeciated:
+                g = population[gid]
+                d = distances(s.representative, g)
+                candidates.append((d, g))
+
+            # The new representative is the genome closest to the
+            # current representative.
+            ignored_rdist, new_rep = min(candidates, key=lambda x: x[0])
+            new_rid = new_rep.key
+            new_representatives[sid] = new_rid
+            new_members[sid] = [new_rid]
+            unspeciated.remove(new_rid)
+
+        # Partition population into species based on genetic similarity.
+        self._precompute((population[rid], population[gid])
+                         for rid in new_representatives.values()
+                         for gid in unspeciated)
+        while unspeciated:
+            gid = unspeciated.pop()
+            g = population[gid]
+
+            # Find the species with the most similar representative.
+            candidates = []
+            for sid, rid in new_representatives.items():
+                rep = population[rid]
+                d = distances(rep, g)
+                if d < compatibility_threshold:
+                    candidates.append((d, sid))
+
+            if candidates:
+                ignored_sdist, sid = min(candidates, key=lambda x: x[0])
+                new_members[sid].append(gid)
+            else:
+                # No species is similar enough, create a new species, using
+                # this genome as its representative.
+                sid = next(self.indexer)
+                new_representatives[sid] = gid
+                new_members[sid] = [gid]
+
+        # Update species collection based on new speciation.
+        self.genome_to_species = {}
+        for sid, rid in new_representatives.items():
+            s = self.species.get(sid)
+            if s is None:
+                s = Species(sid, generation)
+                self.species[sid] = s
+
+            members = new_members[sid]
+            for gid in members:
+                self.genome_to_species[gid] = sid
+
+            member_dict = dict((gid, population[gid]) for gid in members)
+            s.update(population[rid], member_dict)
+
+        gdmean = mean(distances.distances.values())
+        gdstdev = stdev(distances.distances.values())
+        self.reporters.info(
+            'Mean genetic distance {0:.3f}, standard deviation {1:.3f}'
+            .format(gdmean, gdstdev))
+
+        # Only distances involving genomes of this generation can be
+        # needed again: keep those for the next generation.
+        self._genes = {key: self._genes[key] for key in population
+                       if key in self._genes}
+        self._distances = {key: d for key, d in self._distances.items()
+                           if key[0] in population and key[1] in population}
@@ -0,0 +1,218 @@
+"""Evolution statistics, stored on disk a column at a time.
+
+neat.StatisticsReporter keeps every generation's best genome, and
+every genome's fitness, in memory for the whole run.  StatsStore
+instead appends each generation's statistics to a directory of
+column files, and keeps only a small hall of fame of the best genomes
+seen.  StatsReader reads the columns back, reading only rows appended
+since it last looked, and can be passed to visualize.plot_stats and
+visualize.plot_species in place of a StatisticsReporter.
+"""
+import copy
+import os
+import pickle
+
+import neat
+import numpy as np
+
+from neat.math_util import mean, stdev
+
+# Each table is a set of columns, each column a file of raw values.
+TABLES = {
+    "generations": (
+        ("generation", "<i8"),
+        ("fitness_mean", "<f8"),
+        ("fitness_stdev", "<f8"),
+        ("fitness_best", "<f8"),
+        ("best_genome", "<i8"),
+    ),
+    # Rows refer to generations by their row in the generations
+    # table: a resumed run repeats the generation it resumes from.
+    "species": (
+        ("generation_row", "<i8"),
+        ("species", "<i8"),
+        ("size", "<i8"),
+    ),
+}
+
+HALL_OF_FAME = "hall_of_fame.pkl"
+
+
+def _column_filename(directory, table, column):
+    return os.path.join(directory, f"{table}.{column}")
+
+
+class StatsStore(neat.reporting.BaseReporter):
+    """Append each generation's statistics to the column files in
+    directory, and keep the hall_of_fame_size fittest genomes seen
+    in directory/hall_of_fame.pkl.  Existing statistics are kept
+    unless truncate is true.  A run resumed from a checkpoint passes
+    the restored population as resumed: the statistics of the
+    generation it repeats and those after it, and genomes bred after
+    the checkpoint was saved, are then dropped, so the resumed run
+    carries on from where its checkpoint left off.
+    """
+    def __init__(self, directory="evolve-stats", hall_of_fame_size=10,
+                 truncate=False, resumed=None):
+        self.directory = directory
+        self.hall_of_fame_size = hall_of_fame_size
+        os.makedirs(directory, exist_ok=True)
+        if resumed is not None and not truncate:
+            self._rewind(resumed.generation)
+
+        mode = "wb" if truncate else "ab"
+        self._files = {table: [open(_column_filename(directory, table,
+                                                     column), mode)
+                               for column, _ in columns]
+                       for table, columns in TABLES.items()}
+        self._num_generations = self._files["generations"][0].tell() \
+            // np.dtype(TABLES["generations"][0][1]).itemsize
+
+        self.hall_of_fame = []
+        filename = os.path.join(directory, HALL_OF_FAME)
+        if not truncate and os.path.exists(filename):
+            with open(filename, "rb") as fp:
+                self.hall_of_fame = pickle.load(fp)
+        if resumed is not None and self.hall_of_fame:
+            # Genome keys carry on from the highest in the checkpoint.
+            last_key = max(resumed.population)
+            hall_of_fame = [genome for genome in self.hall_of_fame
+                            if genome.key <= last_key]
+            if len(hall_of_fame) < len(self.hall_of_fame):
+                self._write_hall_of_fame(hall_of_fame)
+
+    def _rewind(self, generation):
+        """Drop the statistics of generation and later generations."""
+        if not os.path.exists(_column_filename(self.directory,
+                                               "generations",
+                                               "generation")):
+            return
+        reader = StatsReader(self.directory)
+        later = np.flatnonzero(reader.get_generations() >= generation)
+        num_rows = {"generations": later[0] if len(later) else len(reader)}
+        num_rows["species"] = np.count_nonzero(
+            reader._table("species")["generation_row"]
+            < num_rows["generations"])
+        for table, columns in TABLES.items():
+            for column, dtype in columns:
+                os.truncate(_column_filename(self.directory, table, column),
+                            int(num_rows[table]) * np.dtype(dtype).itemsize)
+
+    def close(self):
+        for files in self._files.values():
+            for fp in files:
+                fp.close()
+
+    def _append(self, table, *columns):
+        for fp, (_, dtype), values in zip(self._files[table], TABLES[table],
+                                          columns):
+            fp.write(np.asarray(values, dtype=dtype).tobytes())
+            fp.flush()
+
+    def start_generation(self, generation):
+        self.generation = generation
+
+    def post_evaluate(self, config, population, species, best_genome):
+        fitnesses = [genome.fitness for genome in population.values()]
+        sizes = sorted((sid, len(s.members))
+                       for sid, s in species.species.items())
+        self._append("species",
+                     [self._num_generations] * len(sizes),
+                     [sid for sid, _ in sizes],
+                     [size for _, size in sizes])
+        # The generations table is written last: readers take it
+        # as the number of complete generations.
+        self._append("generations",
+                     [self.generation],
+                     [mean(fitnesses)],
+                     [stdev(fitnesses)],
+                     [best_genome.fitness],
+                     [best_genome.key])
+        self._num_generations += 1
+        self._update_hall_of_fame(population.values())
+
+    def _update_hall_of_fame(self, genomes):
+        known = {genome.key for genome in self.hall_of_fame}
+        candidates = self.hall_of_fame + [genome for genome in genomes
+                                          if genome.key not in known]
+        candidates.sort(key=lambda genome: genome.fitness, reverse=True)
+        hall_of_fame = candidates[:self.hall_of_fame_size]
+        if [id(genome) for genome in hall_of_fame] \
+           == [id(genome) for genome in self.hall_of_fame]:
+            return
+        # Copies, as elites' fitnesses change when they're reevaluated.
+        self._write_hall_of_fame(
+            [genome if genome.key in known else copy.copy(genome)
+             for genome in hall_of_fame])
+
+    def _write_hall_of_fame(self, hall_of_fame):
+        self.hall_of_fame = hall_of_fame
+        filename = os.path.join(self.directory, HALL_OF_FAME)
+        tmpfile = f"{filename}.tmp"
+        with open(tmpfile, "wb") as fp:
+            pickle.dump(hall_of_fame, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpfile, filename)
+
+
+class StatsReader:
+    """Read the statistics written by a StatsStore.  Each call
+    reads whatever has been appended since the last."""
+    def __init__(self, directory="evolve-stats"):
+        self.directory = directory
+        self._columns = {table: {column: np.empty(0, dtype)
+                                 for column, dtype in columns}
+                         for table, columns in TABLES.items()}
+
+    def _table(self, table):
+        """Return a dict of the columns of table, updated with any
+        rows written since it was last read."""
+        columns = self._columns[table]
+        read = len(next(iter(columns.values())))
+        available = min(
+            os.path.getsize(_column_filename(self.directory, table, column))
+            // np.dtype(dtype).itemsize
+            for column, dtype in TABLES[table])
+        if available > read:
+            for column, dtype in TABLES[table]:
+                new = np.fromfile(
+                    _column_filename(self.directory, table, column),
+                    dtype=dtype, count=available - read,
+                    offset=read * np.dtype(dtype).itemsize)
+                columns[column] = np.concatenate((columns[column], new))
+        return columns
+
+    def __len__(self):
+        return len(self._table("generations")["generation"])
+
+    def get_generations(self):
+        return self._table("generations")["generation"]
+
+    def get_fitness_mean(self):
+        return self._table("generations")["fitness_mean"]
+
+    def get_fitness_stdev(self):
+        return self._table("generations")["fitness_stdev"]
+
+    def get_fitness_best(self):
+        return self._table("generations")["fitness_best"]
+
+    def get_best_genome_keys(self):
+        return self._table("generations")["best_genome"]
+
+    def get_species_sizes(self):
+        """Return the size of every species in every generation, as
+        neat.StatisticsReporter.get_species_sizes does."""
+        num_generations = len(self)
+        species = self._table("species")
+        # Ignore species of generations not yet complete.
+        rows = species["generation_row"] < num_generations
+        sids = species["species"][rows]
+        sizes = np.zeros((num_generations, sids.max(initial=0)),
+                         dtype=np.int64)
+        sizes[species["generation_row"][rows], sids - 1] = \
+            species["size"][rows]
+        return sizes.tolist()
+
+    def get_hall_of_fame(self):
+        with open(os.path.join(self.directory, HALL_OF_FAME), "rb") as fp:
+            return pickle.load(fp)
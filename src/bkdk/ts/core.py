@@ -1,10 +1,12 @@
-import importlib
 import gymnasium as gym
 import numpy as np
 import time
 
 from gymnasium import spaces
 
+from .rgb import rgb_frames
+from .viewer import Viewer
+
 
 class TinyScreen(gym.ObservationWrapper):
     """Replace the board and choices observation space with a
@@ -22,118 +24,110 @@ class TinyScreen(gym.ObservationWrapper):
         rows[4] = A
         cls._big_B = np.array(rows, dtype=np.uint8)
 
-        cls._inter_shape_pad = np.zeros((5, 1), dtype=np.uint8)
-        cls._inter_area_pad = np.zeros((1, 19), dtype=np.uint8)
-
         scorebits = np.arange(20, dtype=np.uint8)
         evens, odds = scorebits.reshape((10, 2)).T.tolist()
         odds.reverse()
         cls._scorebits = tuple(odds[1:] + evens)
+        cls._score_shifts = np.array(cls._scorebits, dtype=np.int64)
+
+        # Everything but the board, choices and score.
+        screen = np.zeros((19, 19), dtype=np.uint8)
+        screen[3:12, :5] = cls._big_B
+        screen[3:12, 14:] = cls._big_D
+        cls._blank_screen = screen
+
+        cls._initialized = True
+
+    # The areas of the screen that change, as views of a screen, or
+    # of a stack of screens.
+
+    @staticmethod
+    def _score_area(screens):
+        """Return the score area, a 19-pixel row."""
+        return screens[..., 1, :]
+
+    @staticmethod
+    def _board_area(screens):
+        """Return the 9x9 board area."""
+        return screens[..., 3:12, 5:14]
+
+    @staticmethod
+    def _choices_area(screens):
+        """Return the three 5x5 choice areas, as a 3x5x5 view."""
+        area = screens[..., 13:18, 1:19]
+        area = area.reshape(area.shape[:-1] + (3, 6))[..., :5]
+        return area.swapaxes(-3, -2)
 
     _initialized = False
 
     def __init__(self, env):
         if not self._initialized:
             self._initialize()
-            self._initialized = True
 
         super().__init__(env)
 
         self.observation_space = spaces.Box(
             low=0, high=1, dtype=np.uint8, shape=(19, 19))
+        self._screen = self._blank_screen.copy()
 
         # Rendering
-        if self.render_mode in ("human", "rgb_array"):
-            self._window = None
-            self._clock = None
+        self._viewer = None
 
     def observation(self, obs):
-        # Score area (19x1)
-        score_area = np.array(
-            [[(self.unwrapped._board.score & (1 << bit)) >> bit
-              for bit in self._scorebits]],
-            dtype=np.uint8)
-
-        # Board area (19x9; shape=(19, 9))
-        board_area = (self._big_B, obs["board"], self._big_D)
-        board_area = np.concatenate(board_area, axis=1)
-
-        # Choice area (19x5; shape = (5,19))
-        choices_area = sum(((choice, self._inter_shape_pad)
-                            for choice in obs["choices"]),
-                           start=(self._inter_shape_pad,))
-        choices_area = np.concatenate(choices_area, axis=1)
-
-        # Everything
-        screen = sum(((area, self._inter_area_pad)
-                      for area in (score_area,
-                                   board_area,
-                                   choices_area)),
-                     start=(self._inter_area_pad,))
-        self._screen = np.concatenate(screen, axis=0)
+        screen = self._screen
+        self._board_area(screen)[...] = obs["board"]
+        self._choices_area(screen)[...] = obs["choices"]
+        np.bitwise_and(
+            np.right_shift(self.unwrapped._board.score, self._score_shifts),
+            1, out=self._score_area(screen), casting="unsafe")
 
         if self.render_mode == "human":
             self.render()
 
-        return self._screen
+        # The screen is updated in place, so callers get a copy.
+        return screen.copy()
+
+    @classmethod
+    def screens(cls, boards, choices, scores, out=None):
+        """Return the screens of many games at once, as an (N,19,19)
+        array, given their (N,9,9) boards, (N,3,5,5) choices and (N,)
+        scores.  If out is supplied the screens are written into it;
+        it must be C-contiguous.
+        """
+        if not cls._initialized:
+            cls._initialize()
+        scores = np.asarray(scores)
+        if out is not None and not out.flags.c_contiguous:
+            raise ValueError("out must be C-contiguous")
+        if out is None:
+            out = np.empty((len(scores),) + cls._blank_screen.shape,
+                           dtype=np.uint8)
+        out[...] = cls._blank_screen
+        cls._board_area(out)[...] = boards
+        cls._choices_area(out)[...] = choices
+        np.bitwise_and(np.right_shift(scores[:, None], cls._score_shifts),
+                       1, out=cls._score_area(out), casting="unsafe")
+        return out
 
     def render(self):
         if self.render_mode is None:
             return
-        return self._render_pygame(self.render_mode)
+        if self.render_mode == "human":
+            if self._viewer is None:
+                self._viewer = Viewer(self._screen.shape,
+                                      fps=self.metadata["render_fps"],
+                                      cellsize=self.CELLSIZE)
+            self._viewer.show(self._screen)
+            return
+        return rgb_frames(self._screen, self.CELLSIZE)
 
     CELLSIZE = 40
 
-    def _import_pygame(self, name="pygame"):
-        if name not in globals():
-            globals()[name] = importlib.import_module(name)
-
-    def _render_pygame(self, mode):
-        self._import_pygame()
-
-        shape = self._screen.shape
-        if self._window is None:
-            pygame.init()
-            window_size = [d * self.CELLSIZE for d in reversed(shape)]
-            if mode == "human":
-                pygame.display.set_caption("BKDK")
-                self._window = pygame.display.set_mode(window_size)
-            elif mode == "rgb_array":
-                self._window = pygame.Surface(window_size)
-
-        if self._clock is None:
-            self._clock = pygame.time.Clock()
-
-        for row in range(shape[0]):
-            y = row * self.CELLSIZE
-            for col in range(shape[1]):
-                x = col * self.CELLSIZE
-                is_set = self._screen[row][col]
-                color = (0, is_set * 255, 0)
-                rect = pygame.Rect((x, y,
-                                    self.CELLSIZE,
-                                    self.CELLSIZE))
-
-                pygame.draw.rect(self._window,
-                                 color,
-                                 rect,
-                                 border_radius=self.CELLSIZE//5)
-                pygame.draw.rect(self._window,
-                                 (0, 0, 112),
-                                 rect,
-                                 width=self.CELLSIZE//20,
-                                 border_radius=self.CELLSIZE//5)
-
-        if mode == "human":
-            pygame.display.update()
-            self._clock.tick(self.metadata["render_fps"])
-        elif mode == "rgb_array":
-            pixels = np.array(pygame.surfarray.pixels3d(self._window))
-            return np.transpose(pixels, axes=(1, 0, 2))
-
     def close(self):
-        if getattr(self, "_window", None) is not None:
-            pygame.quit()
+        if getattr(self, "_viewer", None) is not None:
+            self._viewer.close()
+            self._viewer = None
+        super().close()
 
 
 def profile(run_length_seconds=5, render_mode=None):
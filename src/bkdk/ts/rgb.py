@@ -0,0 +1,80 @@
+"""Rendering of TinyScreen screens as RGB arrays, with NumPy alone.
+
+Every cell of a screen is drawn as one of two tiles, for "off" and
+"on", rendered once per cell size.  The tiles are the rounded squares
+CellRenderer's sprites are, with corners rasterized as pygame.draw
+rasterizes them, so headless rendering doesn't need pygame.  At the
+default cell size they are pixel-identical to the sprites; at some
+other sizes thin outlines differ by a pixel at each corner.  A whole
+stack of screens is rendered by indexing the tiles with the screens.
+"""
+import functools
+
+import numpy as np
+
+from .viewer import BACKGROUND, EDGE, OFF, ON
+
+
+def _corner_columns(radius):
+    """Return the first column covered in each of the top radius rows
+    of a rounded rectangle's top-left corner, found with the midpoint
+    circle algorithm pygame.draw uses."""
+    columns = np.full(radius, radius)
+    f = 1 - radius
+    ddf_x = 0
+    ddf_y = -2 * radius
+    x = 0
+    y = radius
+    while x < y:
+        if f >= 0:
+            y -= 1
+            ddf_y += 2
+            f += ddf_y
+        x += 1
+        ddf_x += 2
+        f += ddf_x + 1
+        columns[radius - y:] = np.minimum(columns[radius - y:], radius - x)
+        columns[radius - x:] = np.minimum(columns[radius - x:], radius - y)
+    return columns
+
+
+def _rounded_square(size, radius):
+    """Return a size x size mask of a square with rounded corners."""
+    mask = np.ones((size, size), dtype=bool)
+    if radius < 2:
+        return mask
+    for row, column in enumerate(_corner_columns(radius).tolist()):
+        for y in (row, size - 1 - row):
+            mask[y, :column] = False
+            mask[y, size - column:] = False
+    return mask
+
+
+@functools.lru_cache()
+def cell_tiles(cellsize):
+    """Return the "off" and "on" cell tiles, as a (2, cellsize,
+    cellsize, 3) array."""
+    radius = cellsize // 5
+    width = cellsize // 20
+    tiles = np.empty((2, cellsize, cellsize, 3), dtype=np.uint8)
+    tiles[...] = BACKGROUND
+    tiles[:, _rounded_square(cellsize, radius)] = EDGE
+    if width:
+        inner = np.zeros((cellsize, cellsize), dtype=bool)
+        inner[width:-width, width:-width] = _rounded_square(
+            cellsize - 2 * width, max(radius - width, 0))
+        tiles[0, inner] = OFF
+        tiles[1, inner] = ON
+    tiles.flags.writeable = False
+    return tiles
+
+
+def rgb_frames(screens, cellsize=40):
+    """Return the RGB frame of a screen, or of each of a stack of
+    screens, as an array of shape screens.shape[:-2] + (rows *
+    cellsize, columns * cellsize, 3)."""
+    screens = np.asarray(screens)
+    rows, columns = screens.shape[-2:]
+    tiles = cell_tiles(cellsize)[screens]
+    return tiles.swapaxes(-4, -3).reshape(
+        screens.shape[:-2] + (rows * cellsize, columns * cellsize, 3))
@@ -0,0 +1,209 @@
+"""Display of TinyScreen screens in a separate process.
+
+Drawing to a window and waiting for the display to be ready for the
+next frame take far longer than stepping the environment.  A Viewer
+instead shows screens in a process of its own: show() copies the
+latest screen into shared memory and returns immediately, and the
+viewer process draws whatever screen is latest at display rate.
+Screens shown between frames are never drawn, and of those drawn
+only the cells that changed are redrawn.
+
+The viewer process is a new Python interpreter that runs main(), not
+one started by multiprocessing, so the script that created the Viewer
+isn't imported again in it, and needn't guard its top-level code.
+The shared memory is a memory-mapped temporary file.
+"""
+import mmap
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+BACKGROUND = (0, 0, 0)
+ON = (0, 255, 0)
+OFF = (0, 0, 0)
+EDGE = (0, 0, 112)
+
+
+def _cell_sprite(color, cellsize):
+    import pygame
+
+    sprite = pygame.Surface((cellsize, cellsize))
+    sprite.fill(BACKGROUND)
+    rect = sprite.get_rect()
+    pygame.draw.rect(sprite,
+                     color,
+                     rect,
+                     border_radius=cellsize//5)
+    pygame.draw.rect(sprite,
+                     EDGE,
+                     rect,
+                     width=cellsize//20,
+                     border_radius=cellsize//5)
+    return sprite
+
+
+class CellRenderer:
+    """Draw screens on surface, a cell at a time, from pre-rendered
+    sprites.  Only cells that changed since the last screen drawn
+    are redrawn."""
+    def __init__(self, surface, cellsize):
+        self.surface = surface
+        self.cellsize = cellsize
+        self._sprites = (_cell_sprite(OFF, cellsize),
+                         _cell_sprite(ON, cellsize))
+        self._drawn = None
+
+    def draw(self, screen):
+        """Draw screen, and return the rects of the cells redrawn."""
+        screen = np.asarray(screen)
+        if self._drawn is None or self._drawn.shape != screen.shape:
+            rows, cols = np.indices(screen.shape).reshape(2, -1)
+        else:
+            rows, cols = np.nonzero(screen != self._drawn)
+        self._drawn = screen.copy()
+        cellsize = self.cellsize
+        sprites = self._sprites
+        return self.surface.blits(
+            [(sprites[value], (col * cellsize, row * cellsize))
+             for row, col, value in zip(rows.tolist(), cols.tolist(),
+                                        screen[rows, cols].tolist())])
+
+
+# The shared memory starts with these counters, as uint64s, and the
+# screen follows.
+_SEQUENCE, _FRAMES, _STOP = range(3)
+_ONE = np.uint64(1)
+_HEADER_SIZE = 3 * 8
+
+
+class _SharedScreen:
+    """The memory a Viewer shares with its process."""
+    def __init__(self, fp, shape):
+        size = _HEADER_SIZE + int(np.prod(shape))
+        self._mmap = mmap.mmap(fp.fileno(), size)
+        self.counters = np.frombuffer(self._mmap, dtype=np.uint64,
+                                      count=3)
+        self.screen = np.frombuffer(self._mmap, dtype=np.uint8,
+                                    offset=_HEADER_SIZE).reshape(shape)
+
+    def write(self, screen):
+        """Replace the screen.  The sequence is odd while the screen
+        is being written, and advanced by two once it has been."""
+        self.counters[_SEQUENCE] += _ONE
+        self.screen[:] = screen
+        self.counters[_SEQUENCE] += _ONE
+
+    def read(self):
+        """Return the sequence and a copy of the screen, or None if
+        the screen was being written while it was copied."""
+        sequence = self.counters[_SEQUENCE]
+        if sequence & _ONE:
+            return None
+        screen = self.screen.copy()
+        if self.counters[_SEQUENCE] != sequence:
+            return None
+        return sequence, screen
+
+    def close(self):
+        del self.counters, self.screen
+        self._mmap.close()
+
+
+class Viewer:
+    """Show screens in a window, in a separate process, at up to fps
+    frames per second."""
+    def __init__(self, shape=(19, 19), fps=60, cellsize=40, caption="BKDK"):
+        self.shape = tuple(shape)
+        fd, self._filename = tempfile.mkstemp(prefix="bkdk-viewer-")
+        with os.fdopen(fd, "wb+") as fp:
+            fp.truncate(_HEADER_SIZE + int(np.prod(shape)))
+            self._shared = _SharedScreen(fp, self.shape)
+
+        # Make sure the viewer process imports this bkdk.
+        package_dir = os.path.dirname(os.path.dirname(
+            os.path.dirname(os.path.abspath(__file__))))
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            [package_dir] + env.get("PYTHONPATH", "").split(os.pathsep))
+        self._process = subprocess.Popen(
+            [sys.executable, "-c", f"from {__name__} import main; main()",
+             self._filename,
+             ",".join(map(str, self.shape)), str(fps), str(cellsize),
+             caption],
+            env=env,
+            stdin=subprocess.DEVNULL)
+
+    @property
+    def closed(self):
+        """True once the window has been closed."""
+        return self._process.poll() is not None
+
+    @property
+    def frames_drawn(self):
+        """The number of frames the viewer has drawn."""
+        return int(self._shared.counters[_FRAMES])
+
+    def show(self, screen):
+        """Make screen the next screen to display."""
+        self._shared.write(np.reshape(screen, self.shape))
+
+    def close(self):
+        if self._shared is None:
+            return
+        self._shared.counters[_STOP] = 1
+        try:
+            self._process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+        self._shared.close()
+        self._shared = None
+        os.unlink(self._filename)
+
+
+def _viewer_main(filename, shape, fps, cellsize, caption):
+    """Draw the latest screen until stopped, the window is closed or
+    the process that started the viewer exits."""
+    import pygame
+
+    parent = os.getppid()
+    with open(filename, "rb+") as fp:
+        shared = _SharedScreen(fp, shape)
+    counters = shared.counters
+    pygame.init()
+    pygame.display.set_caption(caption)
+    window = pygame.display.set_mode([d * cellsize for d in reversed(shape)])
+    window.fill(BACKGROUND)
+    pygame.display.update()
+    renderer = CellRenderer(window, cellsize)
+    clock = pygame.time.Clock()
+    shown = 0
+    try:
+        while not counters[_STOP] and os.getppid() == parent:
+            if any(event.type == pygame.QUIT
+                   for event in pygame.event.get()):
+                break
+            if counters[_SEQUENCE] != shown:
+                # Try again next frame if show() was writing a screen.
+                latest = shared.read()
+                if latest is not None:
+                    shown, screen = latest
+                    pygame.display.update(renderer.draw(screen))
+                    counters[_FRAMES] += _ONE
+            clock.tick(fps)
+    finally:
+        pygame.quit()
+        del counters
+        shared.close()
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    filename, shape, fps, cellsize, caption = args
+    _viewer_main(filename,
+                 tuple(int(d) for d in shape.split(",")),
+                 int(fps), int(cellsize), caption)
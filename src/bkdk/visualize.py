@@ -11,10 +11,16 @@ def plot_stats(statistics, ylog=False, view=False, filename='avg_fitness.svg'):
         warnings.warn("This display is not available due to a missing optional dependency (matplotlib)")
         return
 
-    generation = range(len(statistics.most_fit_genomes))
-    best_fitness = [c.fitness for c in statistics.most_fit_genomes]
-    avg_fitness = np.array(statistics.get_fitness_mean())
-    stdev_fitness = np.array(statistics.get_fitness_stdev())
+    # statistics may be a bkdk.stats.StatsReader, which reads rows
+    # as they're written, so every column is cut to the first's length.
+    if hasattr(statistics, "get_generations"):
+        generation = np.array(statistics.get_generations())
+        best_fitness = np.array(statistics.get_fitness_best())[:len(generation)]
+    else:
+        best_fitness = [c.fitness for c in statistics.most_fit_genomes]
+        generation = range(len(best_fitness))
+    avg_fitness = np.array(statistics.get_fitness_mean())[:len(generation)]
+    stdev_fitness = np.array(statistics.get_fitness_stdev())[:len(generation)]
 
     plt.plot(generation, avg_fitness, 'b-', label="average")
     plt.plot(generation, avg_fitness - stdev_fitness, 'g-.', label="-1 sd")
@@ -0,0 +1,40 @@
+"""Fixtures shared by the tests of evolution."""
+
+import os
+import random
+import pytest
+
+NEAT_CONFIG = os.path.join(os.path.dirname(__file__), "..", "neat.cfg")
+
+
+@pytest.fixture
+def config():
+    """neat.cfg, with a population of 4 evaluated with seed 23.  Test
+    modules needing other settings override this, starting from it."""
+    neat = pytest.importorskip("neat")
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                         neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                         NEAT_CONFIG)
+    config.pop_size = 4
+    config.random_seed = 23
+    return config
+
+
+@pytest.fixture
+def genomes(config):
+    """The (genome_id, genome) pairs of a new population."""
+    neat = pytest.importorskip("neat")
+    random.seed(23)
+    return list(neat.Population(config).population.items())
+
+
+def _fake_fitness(genomes, config):
+    for _, genome in genomes:
+        genome.fitness = sum(cg.weight for cg in genome.connections.values())
+
+
+@pytest.fixture
+def fake_fitness():
+    """A fitness function that plays no games: each genome's fitness
+    is the sum of its connection weights."""
+    return _fake_fitness
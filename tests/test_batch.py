@@ -0,0 +1,61 @@
+"""Tests for the vectorized game engine."""
+
+import numpy as np
+import pytest
+from gymnasium.utils import seeding
+from bkdk.batch import BoardBatch, ShapeStreams, EMPTY
+from bkdk.board import Board
+from bkdk.shapes import ALL_SHAPES
+
+
+def _choices(board):
+    return [EMPTY if shape is None else ALL_SHAPES.index(shape)
+            for shape in board.choices]
+
+
+def _valid_actions(board):
+    return sorted(choice * 81 + row * 9 + col
+                  for choice, (row, col) in board.valid_moves)
+
+
+@pytest.mark.parametrize("seed", (23, 186283))
+def test_matches_board(seed):
+    """BoardBatch plays exactly as Board does."""
+    boards = [Board(random_number_generator=seeding.np_random(seed)[0])
+              for _ in range(4)]
+    batch = BoardBatch(
+        ShapeStreams(seeding.np_random(seed)[0] for _ in range(4)),
+        range(4))
+    pick = np.random.default_rng(seed)
+
+    while len(batch):
+        assert batch.rows.tolist() == [board.rows for board in boards]
+        assert batch.choices.tolist() == list(map(_choices, boards))
+        assert batch.score.tolist() == [board.score for board in boards]
+
+        valid = batch.valid_actions
+        assert [np.flatnonzero(v).tolist() for v in valid] \
+            == list(map(_valid_actions, boards))
+
+        actions = np.array([pick.choice(np.flatnonzero(v)) for v in valid])
+        expect_rewards = []
+        for board, action in zip(boards, actions):
+            choice, position = divmod(int(action), 81)
+            expect_rewards.append(board.one_move(choice, divmod(position, 9)))
+        assert batch.one_move(actions).tolist() == expect_rewards
+
+        live = batch.valid_actions.any(axis=1)
+        batch.select(live)
+        boards = [board for board, keep in zip(boards, live) if keep]
+
+
+def test_observations():
+    """Observations are flattened board and choices."""
+    batch = BoardBatch(ShapeStreams([seeding.np_random(23)[0]]), [0])
+    batch.one_move(np.array([2 * 81 + 3 * 9 + 4]))
+    board = np.zeros((9, 9), dtype=np.int64)
+    board[3, 4:6] = board[4:6, 5] = 1
+    observation = batch.observations[0]
+    assert observation.shape == (156,)
+    assert np.array_equal(observation[:81], board.flatten())
+    assert not observation[-25:].any()
@@ -0,0 +1,82 @@
+"""Tests for the benchmark suite."""
+
+import json
+import pytest
+
+from bkdk import benchmark
+
+
+def test_measure():
+    """Times are per operation."""
+    calls = []
+
+    def func():
+        calls.append(None)
+        return 10
+
+    result = benchmark.measure(func, repeat=3, warmup=2, min_time=0)
+    assert result["loops"] == 1
+    assert len(calls) == 2 + 1 + 3
+    assert len(result["times"]) == 3
+    assert result["min"] <= result["median"] <= max(result["times"])
+
+
+def test_compare():
+    """Benchmarks slower than baseline by more than the threshold
+    are regressions."""
+    baseline = {"results": {"a": {"median": 1.0},
+                            "b": {"median": 1.0},
+                            "c": {"skipped": "no reason"}}}
+    results = {"results": {"a": {"median": 1.05},
+                           "b": {"median": 1.5},
+                           "c": {"median": 9.0},
+                           "d": {"median": 9.0}}}
+    assert benchmark.compare(results, baseline, 0.1) == [("b", 1.5)]
+    assert benchmark.compare(results, baseline, 0.01) == [("a", 1.05),
+                                                          ("b", 1.5)]
+
+
+def test_main(tmp_path, capsys):
+    """Results are written as JSON, and compared with a baseline."""
+    output = tmp_path / "results.json"
+    args = ["--repeat=2", "--min-time=0", "--warmup=0", "board.resolve"]
+    assert benchmark.main(args + [f"--output={output}"]) == 0
+    with open(output) as fp:
+        results = json.load(fp)
+    assert list(results["results"]) == ["board.resolve"]
+    assert results["results"]["board.resolve"]["median"] > 0
+
+    # An impossibly fast baseline.
+    results["results"]["board.resolve"]["median"] = 1e-12
+    baseline = tmp_path / "baseline.json"
+    with open(baseline, "w") as fp:
+        json.dump(results, fp)
+    assert benchmark.main(args + [f"--baseline={baseline}"]) == 1
+    assert "REGRESSION: board.resolve" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("name", list(benchmark.BENCHMARKS))
+def test_benchmarks_run(name):
+    """Every benchmark runs."""
+    try:
+        func = benchmark.BENCHMARKS[name]()
+    except benchmark.SkipBenchmark:
+        pytest.skip()
+    assert func() > 0
+
+
+def test_scaling(capsys):
+    """Throughput is measured for every worker count and mode."""
+    results = benchmark.scaling([1, 2], duration=0.1)
+    assert [(result["mode"], result["workers"])
+            for result in results["results"]] == [("processes", 1),
+                                                  ("processes", 2),
+                                                  ("threads", 1),
+                                                  ("threads", 2)]
+    for result in results["results"]:
+        assert result["steps_per_second"] > 0
+        assert result["memory_per_worker"] > 0
+        assert result["efficiency"] == pytest.approx(
+            result["speedup"] / result["workers"])
+    benchmark.print_scaling(results)
+    assert len(capsys.readouterr().out.splitlines()) == 5
@@ -0,0 +1,94 @@
+"""Tests for the fitness cache."""
+
+import copy
+import os
+import pytest
+
+neat = pytest.importorskip("neat")
+from bkdk.cache import FitnessCache, genome_hash  # noqa: E402
+
+
+class FakeScorer:
+    def __init__(self):
+        self.num_scored = 0
+
+    def __call__(self, genomes, config, first_game, num_games):
+        self.num_scored += len(genomes)
+        return {gid: float(gid + first_game) for gid, _ in genomes}
+
+
+def test_genome_hash(genomes):
+    """Genome hashes depend on structure, not identity."""
+    _, genome = genomes[0]
+    clone = copy.deepcopy(genome)
+    clone.key += 100
+    assert genome_hash(clone) == genome_hash(genome)
+    next(iter(clone.connections.values())).weight += 1e-9
+    assert genome_hash(clone) != genome_hash(genome)
+
+
+def test_hits(config, genomes):
+    """Identical genomes playing identical games are scored once."""
+    score = FakeScorer()
+    cache = FitnessCache(score, 5)
+    cache.evaluate(genomes, config)
+    cache.evaluate(genomes, config)
+    assert score.num_scored == len(genomes)
+    assert cache.hits == len(genomes)
+    assert [genome.fitness for _, genome in genomes] \
+        == [float(gid) for gid, _ in genomes]
+
+
+def test_different_games_miss(config, genomes):
+    """Scores are not reused for different games."""
+    score = FakeScorer()
+    cache = FitnessCache(score, 5)
+    cache.score(genomes, config, 0, 2)
+    cache.score(genomes, config, 2, 2)
+    config.random_seed += 1
+    cache.score(genomes, config, 0, 2)
+    assert score.num_scored == 3 * len(genomes)
+
+
+def test_eviction(config, genomes):
+    """The least recently used scores are evicted."""
+    score = FakeScorer()
+    cache = FitnessCache(score, 5, max_size=2)
+    cache.score(genomes[:2], config)
+    cache.score(genomes[:1], config)
+    cache.score(genomes[2:3], config)
+    assert len(cache) == 2
+    cache.score(genomes[:1], config)
+    assert score.num_scored == 3
+    cache.score(genomes[1:2], config)
+    assert score.num_scored == 4
+
+
+def test_persistence(config, genomes, tmp_path):
+    """Caches may be saved and reloaded."""
+    filename = os.path.join(tmp_path, "cache")
+    cache = FitnessCache(FakeScorer(), 5, filename=filename)
+    cache.evaluate(genomes, config)
+    cache.end_generation(config, None, None)
+
+    score = FakeScorer()
+    FitnessCache(score, 5, filename=filename).evaluate(genomes, config)
+    assert score.num_scored == 0
+
+
+def test_keyed_on_evaluator(config, genomes, tmp_path):
+    """Scores from other evaluators, or action heads, aren't used."""
+    filename = os.path.join(tmp_path, "cache")
+    cache = FitnessCache(FakeScorer(), 5, filename=filename)
+    cache.evaluate(genomes, config)
+    cache.end_generation(config, None, None)
+
+    score = FakeScorer()
+    FitnessCache(score, 5, filename=filename,
+                 evaluator="gym").evaluate(genomes, config)
+    assert score.num_scored == len(genomes)
+
+    score = FakeScorer()
+    config.genome_config.num_outputs = 21
+    FitnessCache(score, 5, filename=filename).evaluate(genomes, config)
+    assert score.num_scored == len(genomes)
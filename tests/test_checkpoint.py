@@ -0,0 +1,113 @@
+"""Tests for the asynchronous checkpointer."""
+
+import copy
+import os
+import random
+import threading
+import pytest
+
+neat = pytest.importorskip("neat")
+from bkdk.checkpoint import AsyncCheckpointer  # noqa: E402
+
+
+class UnpicklableReporter(neat.reporting.BaseReporter):
+    def __init__(self):
+        self.lock = threading.Lock()
+
+
+def test_rotation(config, fake_fitness, tmp_path):
+    """The last few checkpoints are kept, along with milestones."""
+    prefix = str(tmp_path / "checkpoint-")
+    checkpointer = AsyncCheckpointer(keep=2, milestone_interval=3,
+                                     filename_prefix=prefix)
+    random.seed(23)
+    p = neat.Population(config)
+    p.add_reporter(checkpointer)
+    p.add_reporter(UnpicklableReporter())
+    p.run(fake_fitness, 7)
+    checkpointer.close()
+    assert sorted(os.listdir(tmp_path)) == [
+        f"checkpoint-{generation}" for generation in (0, 3, 5, 6)]
+
+
+def test_rotation_after_resume(config, fake_fitness, tmp_path):
+    """Checkpoints written before resuming are rotated too."""
+    prefix = str(tmp_path / "checkpoint-")
+    checkpointer = AsyncCheckpointer(keep=5, milestone_interval=3,
+                                     filename_prefix=prefix)
+    random.seed(23)
+    p = neat.Population(config)
+    p.add_reporter(checkpointer)
+    p.run(fake_fitness, 5)
+    checkpointer.close()
+    (tmp_path / "checkpoint-notes").write_text("not a checkpoint")
+
+    p = AsyncCheckpointer.restore_checkpoint(prefix + "4")
+    checkpointer = AsyncCheckpointer(keep=2, milestone_interval=3,
+                                     filename_prefix=prefix,
+                                     adopt_existing=True)
+    p.add_reporter(checkpointer)
+    p.run(fake_fitness, 3)
+    checkpointer.close()
+    assert sorted(os.listdir(tmp_path)) == [
+        "checkpoint-0", "checkpoint-3", "checkpoint-5", "checkpoint-6",
+        "checkpoint-notes"]
+
+
+def test_fresh_run_keeps_existing(config, fake_fitness, tmp_path):
+    """A fresh run leaves another run's checkpoints alone."""
+    prefix = str(tmp_path / "checkpoint-")
+    checkpointer = AsyncCheckpointer(keep=5, milestone_interval=0,
+                                     filename_prefix=prefix)
+    random.seed(23)
+    p = neat.Population(config)
+    p.add_reporter(checkpointer)
+    p.run(fake_fitness, 5)
+    checkpointer.close()
+    for generation in range(5):
+        os.rename(f"{prefix}{generation}", f"{prefix}{generation + 5}")
+
+    checkpointer = AsyncCheckpointer(keep=2, milestone_interval=0,
+                                     filename_prefix=prefix)
+    p = neat.Population(config)
+    p.add_reporter(checkpointer)
+    p.run(fake_fitness, 3)
+    checkpointer.close()
+    assert sorted(os.listdir(tmp_path), key=lambda f: int(f[11:])) == [
+        f"checkpoint-{generation}" for generation in (1, 2, 5, 6, 7, 8, 9)]
+
+
+def test_restore(config, fake_fitness, tmp_path):
+    """Checkpoints restore the population and its random state."""
+    prefix = str(tmp_path / "checkpoint-")
+    checkpointer = AsyncCheckpointer(filename_prefix=prefix)
+    random.seed(23)
+    p = neat.Population(config)
+    p.add_reporter(checkpointer)
+    p.run(fake_fitness, 2)
+    expect_state = random.getstate()
+    # Changes after the checkpoint is queued aren't saved.
+    expect_genomes = {gid: str(g) for gid, g in p.population.items()}
+    for genome in p.population.values():
+        genome.fitness = None
+    checkpointer.close()
+
+    random.seed(5)
+    restored = AsyncCheckpointer.restore_checkpoint(f"{prefix}1", config)
+    assert restored.generation == 1
+    assert {gid: str(g) for gid, g in restored.population.items()} \
+        == expect_genomes
+    assert restored.species.reporters is restored.reporters
+    assert next(restored.reproduction.genome_indexer) > max(p.population)
+    assert random.getstate() == expect_state
+    restored.run(fake_fitness, 1)
+
+    # Genomes with other numbers of outputs can't be restored.
+    other = copy.deepcopy(config)
+    other.genome_config.num_outputs = 21
+    with pytest.raises(ValueError, match="num_outputs"):
+        AsyncCheckpointer.restore_checkpoint(f"{prefix}1", other)
+
+    # neat.Checkpointer can read our checkpoints, too.
+    restored = neat.Checkpointer.restore_checkpoint(f"{prefix}1")
+    assert sorted(restored.population) == sorted(p.population)
@@ -0,0 +1,68 @@
+"""Tests for distributed fitness evaluation."""
+
+import threading
+import pytest
+from multiprocessing.connection import Client
+
+neat = pytest.importorskip("neat")
+from bkdk import lockstep  # noqa: E402
+from bkdk.distributed import DistributedEvaluator  # noqa: E402
+
+AUTHKEY = b"test_distributed"
+
+
+@pytest.fixture
+def config(config):
+    config.pop_size = 6
+    return config
+
+
+@pytest.fixture
+def expect_fitnesses(config, genomes):
+    lockstep.eval_genomes(genomes, config)
+    fitnesses = [genome.fitness for _, genome in genomes]
+    for _, genome in genomes:
+        genome.fitness = None
+    return fitnesses
+
+
+def _evaluator(config, **kwargs):
+    return DistributedEvaluator(("localhost", 0), AUTHKEY, config,
+                                chunk_size=2, **kwargs)
+
+
+def test_evaluate(config, genomes, expect_fitnesses):
+    """Local workers stand in for remote ones."""
+    evaluator = _evaluator(config, num_local_workers=3)
+    try:
+        for _ in range(2):
+            evaluator.evaluate(genomes, config)
+            assert [g.fitness for _, g in genomes] == expect_fitnesses
+    finally:
+        evaluator.close()
+    assert evaluator.num_requeued == 0
+
+
+@pytest.mark.parametrize("disconnect", (True, False))
+def test_lost_worker(config, genomes, expect_fitnesses, disconnect):
+    """Jobs held by disconnected or silent workers are requeued."""
+    evaluator = _evaluator(config, heartbeat_interval=0.1,
+                           heartbeat_timeout=0.5)
+    thread = threading.Thread(target=evaluator.evaluate,
+                              args=(genomes, config))
+    thread.start()
+    try:
+        conn = Client(evaluator.address, authkey=AUTHKEY)
+        conn.recv()
+        conn.send(("pull",))
+        assert conn.recv()[0] == "job"
+        if disconnect:
+            conn.close()
+
+        evaluator.add_local_worker()
+        thread.join()
+        assert [g.fitness for _, g in genomes] == expect_fitnesses
+        assert evaluator.num_requeued == 1
+    finally:
+        evaluator.close()
+        conn.close()
@@ -5,6 +5,7 @@ import pytest
 import gymnasium as gym
 from gymnasium.spaces.utils import flatten_space
 import bkdk  # noqa: F401
+from bkdk.env import action_scores
 
 # Gymnasium's passive environment checker issues warnings about our
 # observation spaces having unconventional shapes, which clutters
@@ -250,3 +251,23 @@ def test_is_valid_action_used_up(env, action):
     env.reset(seed=23)
     env.step((0, 5, 5))
     assert not env.is_valid_action(action)
+
+
+def test_action_scores():
+    """Factored outputs score actions by choice, row and column."""
+    outputs = np.zeros(21)
+    outputs[1] = 3  # choice 1
+    outputs[3 + 2] = 2  # row 2
+    outputs[12 + 7] = 1  # column 7
+    scores = action_scores(outputs)
+    assert scores.shape == (243,)
+    assert np.argmax(scores) == 1 * 81 + 2 * 9 + 7
+    assert scores[1 * 81 + 2 * 9 + 7] == 6
+    assert scores[0] == 0
+    assert np.all(action_scores(np.stack([outputs] * 2)) == scores)
+
+    outputs = np.arange(243.0)
+    assert np.all(action_scores(outputs) == outputs)
+
+    with pytest.raises(ValueError):
+        action_scores(np.zeros(22))
@@ -0,0 +1,134 @@
+"""Tests for bulk screenshot decoding."""
+
+import json
+import os
+import shutil
+
+from PIL import Image
+
+from bkdk import ingest
+
+SCREENSHOTS = os.path.join(os.path.dirname(__file__), "resources",
+                           "screenshots")
+
+
+def copy_screenshots(directory):
+    os.makedirs(directory)
+    filenames = []
+    for basename in sorted(os.listdir(SCREENSHOTS)):
+        filenames.append(os.path.join(directory, basename))
+        shutil.copy(os.path.join(SCREENSHOTS, basename), filenames[-1])
+    return filenames
+
+
+def read_results(filename):
+    with open(filename) as fp:
+        return {result["filename"]: result for result in map(json.loads, fp)}
+
+
+def test_find_screenshots(tmp_path, monkeypatch):
+    """Directories are searched, and globs expanded."""
+    filenames = copy_screenshots(os.path.realpath(tmp_path / "shots"))
+    (tmp_path / "notes.txt").write_text("not a screenshot")
+    assert ingest.find_screenshots([str(tmp_path)]) == filenames
+    assert ingest.find_screenshots(
+        [str(tmp_path / "shots" / "*105149*"), filenames[1]]) == filenames[1:]
+    os.symlink(tmp_path / "shots", tmp_path / "link")
+    monkeypatch.chdir(tmp_path)
+    assert ingest.find_screenshots(
+        ["shots", os.path.join("link", "*.jpg")]) == filenames
+
+
+def test_decode_screenshot():
+    """Boards, choices and confidences are decoded."""
+    result = ingest.decode_screenshot(
+        os.path.join(SCREENSHOTS, "20230430-105149.jpg"))
+    assert result["errors"] == []
+    assert result["scale"] == 2
+    assert len(result["board"]) == 9
+    assert result["board_confidence"] == [[100] * 9] * 9
+    assert [choice["shape"] for choice in result["choices"]] == [
+        [4, 5], [4, 4], [4, 4]]
+    assert result["choices"][1]["cells"] == [
+        [0, 0, 0, 0, 0],
+        [0, 1, 1, 0, 0],
+        [0, 1, 1, 0, 0],
+        [0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0],
+    ]
+    assert result["choices"][1]["confidence"] == [[100] * 4] * 4
+
+
+def test_decode_unreadable_screenshot(tmp_path):
+    """Screenshots that can't be read are reported as errors."""
+    filename = str(tmp_path / "bad.jpg")
+    with open(filename, "w") as fp:
+        fp.write("not a JPEG")
+    result = ingest.decode_screenshot(filename)
+    assert result["board"] is None
+    assert result["errors"][0].startswith("UnidentifiedImageError")
+
+
+def test_decode_undecodable_choice(tmp_path):
+    """Choices that can't be decoded still have confidences, and
+    are decoded again at full resolution."""
+    filename = str(tmp_path / "checkered.jpg")
+    with Image.open(os.path.join(SCREENSHOTS, "20230430-105149.jpg")) as img:
+        # Checker the first choice, so no layout's cells are certain.
+        for x in range(40, 240, 16):
+            for y in range(1140, 1340, 16):
+                color = (0, 0, 0) if (x + y) // 16 % 2 else (255,) * 3
+                img.paste(color, (x, y, x + 16, y + 16))
+        img.save(filename, quality=95)
+    result = ingest.decode_screenshot(filename)
+    assert result["scale"] == 1
+    assert result["board"] is not None
+    assert len(result["errors"]) == 1
+    assert result["errors"][0].startswith("choice 0: ")
+    choice = result["choices"][0]
+    assert choice["cells"] is None
+    assert choice["shape"] == [5, 5]
+    assert len(choice["confidence"]) == 5
+    assert min(map(min, choice["confidence"])) < 99
+    assert result["choices"][1]["cells"] is not None
+
+
+def test_main_resumes(tmp_path, monkeypatch, capsys):
+    """Screenshots already in the output are skipped."""
+    filenames = copy_screenshots(os.path.realpath(tmp_path / "shots"))
+    output = str(tmp_path / "results.jsonl")
+    assert ingest.main(["--num-workers=2", "-o", output,
+                        str(tmp_path / "shots")]) == 0
+    results = read_results(output)
+    assert sorted(results) == filenames
+
+    # Restarted from elsewhere, with equivalent paths.
+    monkeypatch.chdir(tmp_path / "shots")
+    assert ingest.main(["--num-workers=1", "-o", output, "*.jpg"]) == 0
+    assert "0 of 2 screenshots decoded" in capsys.readouterr().err
+    assert read_results(output) == results
+
+
+def test_main_keeps_results(tmp_path, capsys):
+    """Unreadable results are skipped and partial lines truncated,
+    and the other results kept."""
+    filenames = copy_screenshots(os.path.realpath(tmp_path / "shots"))
+    output = str(tmp_path / "results.jsonl")
+    assert ingest.main(["--num-workers=1", "-o", output,
+                        str(tmp_path / "shots")]) == 0
+    results = read_results(output)
+    with open(output, "rb") as fp:
+        lines = fp.readlines()
+
+    # Interrupted midway through writing the second result, after
+    # something wrote garbage after the first.
+    with open(output, "wb") as fp:
+        fp.write(lines[0] + b"garbage\n" + lines[1][:10])
+    assert ingest.main(["--num-workers=1", "-o", output,
+                        str(tmp_path / "shots")]) == 0
+    err = capsys.readouterr().err
+    assert ":2: skipping unreadable result" in err
+    assert "1 of 2 screenshots decoded" in err
+    with open(output, "rb") as fp:
+        assert fp.readlines() == [lines[0], b"garbage\n", lines[1]]
+    assert sorted(results) == filenames
@@ -0,0 +1,125 @@
+"""Tests for island-model evolution."""
+
+import argparse
+import os
+import random
+import pytest
+
+neat = pytest.importorskip("neat")
+from bkdk import evolve, islands  # noqa: E402
+from bkdk.stats import StatsReader  # noqa: E402
+
+CONFIG_FILENAME = os.path.join(os.path.dirname(__file__), "..", "neat.cfg")
+
+
+def test_split_population():
+    assert islands.split_population(10, 3) == [4, 3, 3]
+    assert islands.split_population(8, 2) == [4, 4]
+
+
+def test_split_workers():
+    assert islands.split_workers(8, 3) == 2
+    assert islands.split_workers(2, 4) == 1
+
+
+def test_island_checkpoints(tmp_path):
+    prefix = str(tmp_path / "neat-checkpoint-")
+    assert islands.island_filename(prefix, 1) \
+        == str(tmp_path / "island-1-neat-checkpoint-")
+    for island in range(2):
+        (tmp_path / f"island-{island}-neat-checkpoint-7").touch()
+    assert islands.island_checkpoints(
+        str(tmp_path / "island-1-neat-checkpoint-7"), 2) == [
+            str(tmp_path / f"island-{island}-neat-checkpoint-7")
+            for island in range(2)]
+    with pytest.raises(SystemExit, match="island-2-neat-checkpoint-7"):
+        islands.island_checkpoints(
+            str(tmp_path / "island-0-neat-checkpoint-7"), 3)
+    with pytest.raises(SystemExit, match="not an island checkpoint"):
+        islands.island_checkpoints(prefix + "7", 2)
+
+
+def test_immigrate(config, fake_fitness):
+    """Immigrants replace the newest genomes, with new keys."""
+    config.pop_size = 6
+    random.seed(23)
+    home = neat.Population(config)
+    home.run(fake_fitness, 1)
+    away = neat.Population(config)
+    away.run(fake_fitness, 1)
+
+    immigrants = list(away.population.values())[:2]
+    keys = sorted(home.population)
+    islands.immigrate(home, immigrants)
+
+    assert len(home.population) == len(keys)
+    assert sorted(home.population)[:-2] == keys[:-2]
+    new_keys = sorted(home.population)[-2:]
+    assert min(new_keys) > max(keys)
+    for key, immigrant in zip(new_keys, immigrants):
+        genome = home.population[key]
+        assert genome is not immigrant
+        assert genome.connections == immigrant.connections
+        assert genome.fitness is None
+    speciated = set()
+    for species in home.species.species.values():
+        speciated.update(species.members)
+    assert speciated == set(home.population)
+
+
+def test_run(tmp_path, monkeypatch, capfd):
+    """Islands evolve in parallel, each with its share of the worker
+    processes, its own checkpoints and metrics, and the fittest genome
+    is returned.  Runs resume from every island's checkpoints."""
+    monkeypatch.chdir(tmp_path)
+    args = argparse.Namespace(
+        action_head=None,
+        config_filename=CONFIG_FILENAME,
+        evaluation_seed="23",
+        evaluator="lockstep",
+        fitness_cache=None,
+        islands=2,
+        listen=None,
+        max_generations=3,
+        metrics_file=str(tmp_path / "evolve-metrics.jsonl"),
+        migrants=1,
+        migration_interval=2,
+        num_games=1,
+        num_workers=4,
+        population_size=8,
+        profile=False,
+        profile_workers=None,
+        racing=None,
+        random_seed=23,
+        resume=None,
+        speciation="fast",
+        stats_dir=str(tmp_path / "stats"))
+    config, eval_config = evolve.load_config(args)
+
+    winner = islands.run(args, config, eval_config)
+
+    best = []
+    for island in range(2):
+        stats = StatsReader(islands.stats_directory(args.stats_dir, island))
+        assert stats.get_generations().tolist() == [0, 1, 2]
+        best.extend(stats.get_fitness_best().tolist())
+    assert winner.fitness == max(best)
+    out = capfd.readouterr().out
+    for island in range(2):
+        assert f"Island {island} generation 2: best " in out
+        with open(f"island-{island}-evolve-metrics.jsonl") as fp:
+            assert len(fp.readlines()) == 3
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [f"island-{island}-{name}" for island in range(2)
+         for name in ("evolve-metrics.jsonl", "neat-checkpoint-0",
+                      "neat-checkpoint-1", "neat-checkpoint-2")]
+        + ["stats"])
+
+    args.resume = "island-1-neat-checkpoint-1"
+    args.max_generations = 2
+    config, eval_config = evolve.load_config(args)
+    islands.run(args, config, eval_config)
+    assert "Islands after generation 2 " in capfd.readouterr().out
+    for island in range(2):
+        stats = StatsReader(islands.stats_directory(args.stats_dir, island))
+        assert stats.get_generations().tolist() == [0, 1, 2]
@@ -0,0 +1,96 @@
+"""Tests for lockstep fitness evaluation."""
+
+import argparse
+import os
+import numpy as np
+import pytest
+import gymnasium as gym
+from gymnasium.spaces.utils import flatten
+
+neat = pytest.importorskip("neat")
+from bkdk import lockstep  # noqa: E402
+from bkdk.env import NUM_FACTORED_OUTPUTS  # noqa: E402
+from bkdk.evolve import eval_network  # noqa: E402
+
+# Gymnasium's passive environment checker issues warnings about our
+# observation spaces having unconventional shapes, which clutters
+# pytest's output unnecessarily.  There's a Gymnasium issue, #269:
+# https://github.com/Farama-Foundation/Gymnasium/issues/269
+_GYMNASIUM_269 = r".*Box observation space.*"
+
+
+@pytest.fixture(params=("flat", "factored"))
+def config(request, config):
+    if request.param == "factored":
+        genome_config = config.genome_config
+        genome_config.num_outputs = NUM_FACTORED_OUTPUTS
+        genome_config.output_keys = list(range(NUM_FACTORED_OUTPUTS))
+    return config
+
+
+@pytest.mark.filterwarnings(f"ignore:{_GYMNASIUM_269}")
+def test_activation(config, genomes):
+    """BatchNetworks activate as FeedForwardNetworks do."""
+    env = gym.make("bkdk/BKDK-v0")
+    inputs = flatten(env.observation_space, env.reset(seed=23)[0])
+    for _, genome in genomes:
+        expect = neat.nn.FeedForwardNetwork.create(genome, config)
+        actual = lockstep.BatchNetwork.create(genome, config)
+        assert np.allclose(actual.activate(inputs[None])[0],
+                           expect.activate(inputs))
+
+
+@pytest.mark.filterwarnings(f"ignore:{_GYMNASIUM_269}")
+def test_play(config, genomes):
+    """Lockstep games score as eval_network scores them."""
+    nets = [lockstep.BatchNetwork.create(genome, config)
+            for _, genome in genomes]
+    scores = lockstep.play(nets, seed=23, num_games=2)
+    assert scores.shape == (len(genomes), 2)
+    for (_, genome), score in zip(genomes, scores[:, 0]):
+        net = neat.nn.FeedForwardNetwork.create(genome, config)
+        assert score == eval_network(net, num_games=1, seed=23)
+
+    # Later games' shapes are dealt by SeedSequences spawned from seed.
+    seedseq = np.random.SeedSequence(23).spawn(2)[1]
+    env = gym.make("bkdk/BKDK-v0")
+    for (_, genome), score in zip(genomes, scores[:, 1]):
+        net = neat.nn.FeedForwardNetwork.create(genome, config)
+        env.unwrapped.np_random = np.random.default_rng(seedseq)
+        assert score == eval_network(net, num_games=1, env=env)
+    env.close()
+
+
+@pytest.mark.parametrize("action_head,num_outputs",
+                         (("flat", 243), ("factored", 21)))
+def test_action_head_override(tmp_path, action_head, num_outputs):
+    """--action-head overrides the configured num_outputs."""
+    from bkdk import evolve
+
+    testdir = os.path.dirname(__file__)
+    with open(os.path.join(testdir, "..", "neat.cfg")) as fp:
+        text = fp.read().replace("= 243", "= 7")
+    config_filename = tmp_path / "neat.cfg"
+    config_filename.write_text(text)
+    args = argparse.Namespace(
+        action_head=action_head,
+        config_filename=str(config_filename),
+        evaluation_seed=None,
+        evaluator="lockstep",
+        num_games=None,
+        population_size=None,
+        racing=None,
+        speciation="fast")
+    config, _ = evolve.load_config(args)
+    assert config.genome_config.num_outputs == num_outputs
+    assert config.genome_config.output_keys == list(range(num_outputs))
+
+
+def test_evaluation_seed():
+    """Evaluation seeds are integers, or "random"."""
+    from bkdk import evolve
+
+    assert evolve.evaluation_seed("23") == "23"
+    assert evolve.evaluation_seed("random") == "random"
+    with pytest.raises(argparse.ArgumentTypeError):
+        evolve.evaluation_seed("23x")
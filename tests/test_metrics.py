@@ -0,0 +1,64 @@
+"""Tests for per-generation timing."""
+
+import json
+import random
+import pytest
+
+from bkdk import metrics
+
+neat = pytest.importorskip("neat")
+from bkdk import evolve, lockstep  # noqa: E402
+
+
+def test_timed():
+    metrics.take_times()
+    with metrics.timed("a"):
+        pass
+    with metrics.timed("a"):
+        pass
+    metrics.merge_times({"a": 1.0, "b": 2.0})
+    times = metrics.take_times()
+    assert sorted(times) == ["a", "b"]
+    assert 1.0 < times["a"] < 1.1
+    assert times["b"] == 2.0
+    assert metrics.take_times() == {}
+
+
+def test_reporter(config, tmp_path):
+    random.seed(23)
+    p = neat.Population(config)
+    filename = tmp_path / "metrics.jsonl"
+    reporter = metrics.MetricsReporter(p, filename)
+    p.add_reporter(reporter)
+    p.run(lockstep.eval_genomes, 2)
+    reporter.close()
+
+    with open(filename) as fp:
+        records = [json.loads(line) for line in fp]
+    assert [record["generation"] for record in records] == [0, 1]
+    for record in records:
+        assert record["population"] == 4
+        for phase in ("evaluation", "activation", "env_step", "observation",
+                      "reproduction", "speciation"):
+            assert record[phase] > 0
+        assert record["evaluation"] > record["activation"]
+
+
+def test_reporter_records_solution(config, tmp_path):
+    """The generation reaching the fitness threshold is recorded."""
+    config.fitness_threshold = -1e9
+    random.seed(23)
+    p = neat.Population(config)
+    filename = tmp_path / "metrics.jsonl"
+    reporter = metrics.MetricsReporter(p, filename)
+    p.add_reporter(reporter)
+    p.run(evolve.eval_genomes, 5)
+    reporter.close()
+
+    with open(filename) as fp:
+        records = [json.loads(line) for line in fp]
+    assert [record["generation"] for record in records] == [0]
+    record, = records
+    assert record["evaluation"] > 0
+    assert record["gym_games"] > 0
+    assert "speciation" not in record
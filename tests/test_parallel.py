@@ -0,0 +1,47 @@
+"""Tests for the persistent-worker parallel evaluator."""
+
+import pickle
+import pytest
+
+neat = pytest.importorskip("neat")
+from bkdk import lockstep  # noqa: E402
+from bkdk.parallel import (  # noqa: E402
+    PersistentEvaluator, pack_genome, unpack_genome)
+
+
+@pytest.fixture
+def config(config):
+    config.pop_size = 6
+    return config
+
+
+def test_packed_genomes_are_smaller(genomes):
+    """Packed genomes pickle smaller than genomes do."""
+    _, genome = genomes[0]
+    assert (len(pickle.dumps(pack_genome(genome)))
+            < len(pickle.dumps(genome)) // 2)
+
+
+def test_pack_unpack(config, genomes):
+    """Unpacked genomes build the same networks as the originals."""
+    for _, genome in genomes:
+        unpacked = unpack_genome(pickle.loads(pickle.dumps(
+            pack_genome(genome))), config)
+        assert unpacked.key == genome.key
+        nets = [lockstep.BatchNetwork.create(g, config)
+                for g in (genome, unpacked)]
+        expect, actual = lockstep.play(nets, seed=23, num_games=1)
+        assert actual == expect
+
+
+def test_evaluate(config, genomes):
+    """PersistentEvaluator assigns the lockstep evaluator's fitnesses."""
+    evaluator = PersistentEvaluator(2, config)
+    try:
+        evaluator.evaluate(genomes, config)
+    finally:
+        evaluator.close()
+    actual = [genome.fitness for _, genome in genomes]
+    lockstep.eval_genomes(genomes, config)
+    assert actual == [genome.fitness for _, genome in genomes]
+    assert 0 < len(evaluator.utilization) <= 2
@@ -0,0 +1,61 @@
+"""Tests for profiling in worker processes."""
+
+import pstats
+
+from bkdk import profiling
+
+
+def busy(n):
+    return sum(i * i for i in range(n))
+
+
+def test_sampler(tmp_path):
+    """Sampled stacks are merged and written as collapsed stacks."""
+    merged = profiling.MergedProfile("sample")
+    for _ in range(2):
+        sampler = profiling.Sampler()
+        sampler.start()
+        busy(2000000)
+        merged.add(sampler.stop())
+    summary, collapsed = merged.write(str(tmp_path / "profile"))
+
+    with open(collapsed) as fp:
+        lines = fp.read().splitlines()
+    assert lines
+    assert any("busy (tests/test_profiling.py:" in line for line in lines)
+    total = sum(int(line.rsplit(" ", 1)[1]) for line in lines)
+    with open(summary) as fp:
+        assert fp.readline() == f"{total} samples from 2 profiles\n"
+
+
+def test_cprofile(tmp_path):
+    """cProfile statistics are merged and written as pstats."""
+    merged = profiling.MergedProfile("cprofile")
+    for _ in range(3):
+        profiler = profiling.CProfiler()
+        profiler.start()
+        busy(10)
+        merged.add(profiler.stop())
+    summary, details = merged.write(str(tmp_path / "profile"))
+
+    stats = pstats.Stats(details).stats
+    (calls,) = [value[1] for key, value in stats.items()
+                if key[2] == "busy"]
+    assert calls == 3
+    with open(summary) as fp:
+        assert fp.readline() == "3 profiles merged\n"
+
+
+def test_workers(config, genomes, tmp_path):
+    """PersistentEvaluator merges its workers' profiles."""
+    from bkdk.parallel import PersistentEvaluator
+
+    evaluator = PersistentEvaluator(2, config, profile="cprofile")
+    try:
+        evaluator.evaluate(genomes, config)
+    finally:
+        evaluator.close()
+    assert evaluator.profile.num_profiles > 1
+    _, details = evaluator.profile.write(str(tmp_path / "profile"))
+    assert any(key[2] == "activate"
+               for key in pstats.Stats(details).stats)
@@ -0,0 +1,48 @@
+"""Tests for successive halving fitness evaluation."""
+
+import pytest
+from bkdk.racing import RacingEvaluator
+
+
+class Genome:
+    def __init__(self, key):
+        self.key = key
+        self.fitness = None
+
+
+class FakeScorer:
+    """Genome n scores n in every game."""
+    def __init__(self):
+        self.games_played = 0
+
+    def __call__(self, genomes, config, first_game, num_games):
+        self.games_played += len(genomes) * num_games
+        return {gid: float(genome.key) for gid, genome in genomes}
+
+
+@pytest.fixture
+def genomes():
+    return [(gid, Genome(gid)) for gid in range(100)]
+
+
+def test_budget(genomes):
+    """Racing plays no more games than playing every genome
+    num_games games would, and plays the best genomes most."""
+    score = FakeScorer()
+    evaluator = RacingEvaluator(score, 5)
+    evaluator.evaluate(genomes, None)
+    assert score.games_played <= len(genomes) * 5
+    assert evaluator.rounds == [(100, 2), (50, 2), (25, 4), (12, 8)]
+
+
+def test_fitness_scale(genomes):
+    """Fitness is each genome's average score."""
+    RacingEvaluator(FakeScorer(), 5).evaluate(genomes, None)
+    assert [genome.fitness for _, genome in genomes] == list(range(100))
+
+
+def test_no_racing(genomes):
+    """With initial_games = num_games every genome plays every game."""
+    evaluator = RacingEvaluator(FakeScorer(), 5, initial_games=5)
+    evaluator.evaluate(genomes, None)
+    assert evaluator.rounds == [(100, 5)]
@@ -0,0 +1,81 @@
+"""Tests for the episode recorder."""
+
+import os
+import numpy as np
+import pytest
+import gymnasium as gym
+
+from bkdk import TinyScreen
+from bkdk.recorder import NO_ACTION, EpisodeRecorder, read_episodes
+from bkdk.ts.rgb import rgb_frames
+
+# Gymnasium's passive environment checker issues warnings about our
+# observation spaces having unconventional shapes, which clutters
+# pytest's output unnecessarily.  There's a Gymnasium issue, #269:
+# https://github.com/Farama-Foundation/Gymnasium/issues/269
+_GYMNASIUM_269 = r".*Box observation space.*"
+
+
+def play(env, num_episodes, seed=23):
+    """Play num_episodes short games, returning the screens seen in
+    each."""
+    screen_env = env
+    while not isinstance(screen_env, TinyScreen) \
+            and hasattr(screen_env, "env"):
+        screen_env = screen_env.env
+    episodes = []
+    for episode in range(num_episodes):
+        env.reset(seed=seed + episode)
+        screens = [screen_env._screen.copy()]
+        for action in (0, (1, 0, 1), 2 * 81 + 7):
+            env.step(action)
+            screens.append(screen_env._screen.copy())
+        episodes.append(screens)
+    env.close()
+    return episodes
+
+
+@pytest.mark.parametrize("wrap_tinyscreen", (False, True))
+@pytest.mark.filterwarnings(f"ignore:{_GYMNASIUM_269}")
+def test_record(tmp_path, wrap_tinyscreen):
+    """Every every-th episode is recorded, in chunks, and reads back
+    as the screens the game showed."""
+    if wrap_tinyscreen:
+        env = EpisodeRecorder(TinyScreen(gym.make("bkdk/BKDK-v0")),
+                              tmp_path, every=2, chunk_size=3)
+    else:
+        env = TinyScreen(EpisodeRecorder(gym.make("bkdk/BKDK-v0"),
+                                         tmp_path, every=2, chunk_size=3))
+    expect = play(env, 5)[::2]
+
+    episodes = list(read_episodes(tmp_path))
+    assert [episode.episode for episode in episodes] == [0, 2, 4]
+    for episode, screens in zip(episodes, expect):
+        assert episode.steps.tolist() == [0, 1, 2, 3]
+        assert episode.actions.tolist() == [NO_ACTION, 0, 82, 169]
+        assert np.array_equal(episode.screens(), screens)
+        assert episode.scores[-1] > 0
+
+    frames = episodes[0].frames(cellsize=10)
+    assert np.array_equal(frames, rgb_frames(expect[0], cellsize=10))
+    filenames = episodes[0].write_images(str(tmp_path / "frame-"), 10)
+    assert [os.path.basename(filename) for filename in filenames] \
+        == [f"frame-00000{step}.png" for step in range(4)]
+
+
+@pytest.mark.filterwarnings(f"ignore:{_GYMNASIUM_269}")
+def test_append(tmp_path):
+    """Recordings appended to a directory carry on its episode
+    numbering, and must be of the same kind of observations."""
+    play(TinyScreen(EpisodeRecorder(gym.make("bkdk/BKDK-v0"), tmp_path,
+                                    chunk_size=3)), 2)
+    play(TinyScreen(EpisodeRecorder(gym.make("bkdk/BKDK-v0"), tmp_path,
+                                    every=2, chunk_size=5)), 3, seed=42)
+
+    episodes = list(read_episodes(tmp_path))
+    assert [episode.episode for episode in episodes] == [0, 1, 2, 4]
+    for episode in episodes:
+        assert episode.steps.tolist() == [0, 1, 2, 3]
+
+    with pytest.raises(ValueError):
+        EpisodeRecorder(TinyScreen(gym.make("bkdk/BKDK-v0")), tmp_path)
@@ -1,14 +1,25 @@
 import os
 import pytest
-from PIL import Image
-from bkdk.screenshot import Screenshot
-
-
-def load_test_screenshot(basename):
+from PIL import Image, ImageOps
+from bkdk import screenshot
+from bkdk.screenshot import (
+    MIN_CONFIDENCE,
+    MIN_DRAFT_PIXELS,
+    CellDecodingError,
+    ChoiceDecoder,
+    Screenshot,
+    cell_colors,
+    cell_rects,
+    draft_scale,
+    layout,
+)
+
+
+def load_test_screenshot(basename, **kwargs):
     testdir = os.path.dirname(__file__)
     resourcedir = os.path.join(testdir, "resources")
     ssdir = os.path.join(resourcedir, "screenshots")
-    return Screenshot(os.path.join(ssdir, basename))
+    return Screenshot(os.path.join(ssdir, basename), **kwargs)
 
 
 @pytest.fixture
@@ -116,3 +127,98 @@ def test_screenshot_fullskew_choice_cells(test_screenshot2):
         [0, 0, 0, 0, 0],
         [0, 0, 0, 0, 0],
     ]
+
+
+@pytest.mark.parametrize(
+    "rect",
+    ((100, 200, 150, 250),
+     (0, 0, 30, 30),
+     (-20, -10, 20, 30),
+     (700, 1500, 740, 1540),
+     ))
+def test_cell_colors_match_PIL(test_screenshot, rect):
+    """Cell colors are those PIL's posterize and getcolors find."""
+    count, color = max(ImageOps.posterize(test_screenshot.crop(rect), 1)
+                       .getcolors())
+    colors, confidences = cell_colors(test_screenshot, [rect])
+    r, g, b = (channel >> 7 for channel in color)
+    assert colors.tolist() == [(r << 2) | (g << 1) | b]
+    pixels = (rect[2] - rect[0]) * (rect[3] - rect[1])
+    assert confidences.tolist() == [100 * count // pixels]
+
+
+def test_uncertain_cells_raise(test_screenshot):
+    """Cells straddling colors can't be decoded."""
+    choice = test_screenshot.choices[0]
+    with pytest.raises(CellDecodingError, match=r"^\d+% at \("):
+        ChoiceDecoder(test_screenshot, choice.cen_xy,
+                      choice.cellsize * 3 // 2).tolist()
+
+
+def test_choice_layouts_decoded_once(test_screenshot2, monkeypatch):
+    """Choice cells are decoded in one pass, and not decoded again."""
+    calls = []
+    real_cell_colors = screenshot.cell_colors
+
+    def cell_colors(img, rects):
+        calls.append(len(rects))
+        return real_cell_colors(img, rects)
+
+    monkeypatch.setattr(screenshot, "cell_colors", cell_colors)
+    choices = test_screenshot2.choices
+    assert [choice._shape for choice in choices] == [(4, 5), (4, 4), (4, 4)]
+    assert calls == [16 + 20 + 20 + 25] * 3
+    for choice in choices + test_screenshot2.choices:
+        choice.tolist()
+    assert len(calls) == 3
+
+
+def test_layout_is_per_resolution(test_screenshot, test_screenshot2):
+    """Screenshots of the same size share one layout."""
+    assert test_screenshot.layout is test_screenshot2.layout
+    assert test_screenshot.layout == layout((720, 1520))
+    board = test_screenshot.board
+    assert (board.cen_xy, board.cellsize) == ((360, 710), 75)
+    assert [(choice.cen_xy, choice.cellsize)
+            for choice in test_screenshot.choices] == [
+                ((135, 1235), 40), ((360, 1235), 40), ((585, 1235), 40)]
+
+
+def test_cell_rects(test_screenshot):
+    """Cell rects are those of the grids' cells, one after another."""
+    choice = test_screenshot.choices[2]
+    rects = cell_rects(choice.cen_xy, choice.cellsize, ((4, 4), (5, 4)))
+    cells = list(choice.cells)
+    choice.num_rows = 4
+    cells = list(choice.cells) + cells
+    assert rects.tolist() == [list(cell.rect) for cell in cells]
+
+
+@pytest.mark.parametrize(
+    "basename",
+    ("20230430-103701.jpg",
+     "20230430-105149.jpg",
+     ))
+def test_draft_decoding(basename):
+    """Screenshots decoded in draft mode decode as at full size."""
+    full = load_test_screenshot(basename)
+    draft = load_test_screenshot(basename, draft=True)
+    assert draft.scale == 2
+    assert draft.size == (360, 760)
+    assert draft.screen_size == full.size
+    assert draft.layout is full.layout
+    assert draft.board.tolist() == full.board.tolist()
+    assert ([(choice._shape, choice.tolist()) for choice in draft.choices]
+            == [(choice._shape, choice.tolist()) for choice in full.choices])
+    cells = list(full.board.cells)
+    assert ([cell.is_set for cell in draft.board.cells]
+            == [cell.is_set for cell in cells])
+
+
+def test_draft_scale():
+    """Draft mode keeps enough pixels per cell for one stray pixel to
+    leave it decodable."""
+    assert MIN_DRAFT_PIXELS * (100 - MIN_CONFIDENCE) >= 100
+    assert draft_scale(layout((720, 1520))) == 2
+    assert draft_scale(layout((1440, 3040))) == 4
+    assert draft_scale(layout((360, 760))) == 1
@@ -0,0 +1,67 @@
+"""Tests for the fast species set."""
+
+import random
+import pytest
+
+neat = pytest.importorskip("neat")
+from bkdk.species import FastSpeciesSet, _GeneArrays, _distances  # noqa: E402
+
+
+@pytest.fixture
+def config(config):
+    config.pop_size = 30
+    config.species_set_config.compatibility_threshold = 1.0
+    return config
+
+
+def evolve(config, fitness_function, species_set_type, num_generations):
+    """Return the speciation and genetic distances of every generation."""
+    config.species_set_type = species_set_type
+    random.seed(23)
+    p = neat.Population(config)
+    history = []
+
+    class Recorder(neat.reporting.BaseReporter):
+        def info(self, msg):
+            history.append((msg, dict(p.species.genome_to_species)))
+
+    p.add_reporter(Recorder())
+    try:
+        p.run(fitness_function, num_generations)
+    finally:
+        if isinstance(p.species, FastSpeciesSet):
+            p.species.close()
+    return history
+
+
+def test_distance(config):
+    """Distances match DefaultGenome.distance exactly."""
+    random.seed(23)
+    genomes = list(neat.Population(config).population.values())
+    for genome in genomes[::2]:
+        for _ in range(5):
+            genome.mutate(config.genome_config)
+        # Exercise the terms that neat.cfg never mutates.
+        ng = genome.nodes[0]
+        ng.activation, ng.aggregation, ng.response = "tanh", "max", 2.0
+    genome_config = config.genome_config
+    genes = [_GeneArrays(genome) for genome in genomes]
+    for a, a_genes in zip(genomes, genes):
+        assert _distances((
+            a_genes, genes,
+            genome_config.compatibility_weight_coefficient,
+            genome_config.compatibility_disjoint_coefficient,
+        )) == [a.distance(b, genome_config) for b in genomes]
+
+
+@pytest.mark.parametrize("num_workers", (1, 2))
+def test_identical_speciation(config, fake_fitness, num_workers):
+    """FastSpeciesSet speciates exactly as DefaultSpeciesSet does."""
+    expect = evolve(config, fake_fitness, neat.DefaultSpeciesSet, 4)
+
+    class SpeciesSet(FastSpeciesSet):
+        pass
+
+    SpeciesSet.num_workers = num_workers
+    assert evolve(config, fake_fitness, SpeciesSet, 4) == expect
+    assert len(set(expect[-1][1].values())) > 1
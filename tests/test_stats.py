@@ -0,0 +1,99 @@
+"""Tests for the on-disk statistics store."""
+
+import random
+import pytest
+
+neat = pytest.importorskip("neat")
+from bkdk.stats import StatsReader, StatsStore  # noqa: E402
+
+
+@pytest.fixture
+def config(config):
+    config.pop_size = 10
+    config.species_set_config.compatibility_threshold = 1.0
+    return config
+
+
+def test_store(config, fake_fitness, tmp_path):
+    """Stored statistics match neat.StatisticsReporter's, and are
+    read incrementally."""
+    directory = str(tmp_path / "stats")
+    store = StatsStore(directory, hall_of_fame_size=3)
+    expect = neat.StatisticsReporter()
+    reader = StatsReader(directory)
+    random.seed(23)
+    p = neat.Population(config)
+    p.add_reporter(store)
+    p.add_reporter(expect)
+
+    p.run(fake_fitness, 2)
+    assert len(reader) == 2
+    p.run(fake_fitness, 3)
+    store.close()
+
+    assert reader.get_generations().tolist() == [0, 1, 2, 3, 4]
+    # StatisticsReporter sums fitnesses in a different order.
+    assert reader.get_fitness_mean().tolist() \
+        == pytest.approx(expect.get_fitness_mean())
+    assert reader.get_fitness_stdev().tolist() \
+        == pytest.approx(expect.get_fitness_stdev())
+    assert reader.get_fitness_best().tolist() \
+        == [genome.fitness for genome in expect.most_fit_genomes]
+    assert reader.get_best_genome_keys().tolist() \
+        == [genome.key for genome in expect.most_fit_genomes]
+    assert reader.get_species_sizes() == expect.get_species_sizes()
+    assert len(expect.get_species_sizes()[-1]) > 1
+
+    fitnesses = [genome.fitness for genome in reader.get_hall_of_fame()]
+    assert len(fitnesses) == 3
+    assert fitnesses == sorted(fitnesses, reverse=True)
+    assert fitnesses[0] == max(reader.get_fitness_best())
+
+
+def test_resume(config, fake_fitness, tmp_path):
+    """Statistics are appended to unless truncated."""
+    directory = str(tmp_path / "stats")
+    for truncate, expect in ((False, 2), (False, 4), (True, 2)):
+        store = StatsStore(directory, truncate=truncate)
+        random.seed(23)
+        p = neat.Population(config)
+        p.add_reporter(store)
+        p.run(fake_fitness, 2)
+        store.close()
+        reader = StatsReader(directory)
+        assert len(reader) == expect
+        assert len(reader.get_species_sizes()) == expect
+
+
+def test_resume_from_checkpoint(config, fake_fitness, tmp_path):
+    """Resuming from a checkpoint drops the statistics, and genomes,
+    of the generations after it."""
+    from bkdk.checkpoint import AsyncCheckpointer
+
+    directory = str(tmp_path / "stats")
+    prefix = str(tmp_path / "checkpoint-")
+    store = StatsStore(directory, hall_of_fame_size=100)
+    checkpointer = AsyncCheckpointer(keep=10, filename_prefix=prefix)
+    random.seed(23)
+    p = neat.Population(config)
+    p.add_reporter(store)
+    p.add_reporter(checkpointer)
+    p.run(fake_fitness, 5)
+    checkpointer.close()
+    store.close()
+
+    p = AsyncCheckpointer.restore_checkpoint(prefix + "2", config)
+    store = StatsStore(directory, hall_of_fame_size=100, resumed=p)
+    last_key = max(p.population)
+    assert max(genome.key for genome in store.hall_of_fame) <= last_key
+    reader = StatsReader(directory)
+    assert reader.get_generations().tolist() == [0, 1]
+    assert len(reader.get_species_sizes()) == 2
+
+    p.add_reporter(store)
+    p.run(fake_fitness, 2)
+    store.close()
+    assert reader.get_generations().tolist() == [0, 1, 2, 3]
+    assert len(reader.get_species_sizes()) == 4
+    assert [genome.key for genome in reader.get_hall_of_fame()] \
+        == [genome.key for genome in store.hall_of_fame]
@@ -1,3 +1,7 @@
+import os
+import subprocess
+import sys
+import time
 import numpy as np
 import pytest
 import gymnasium as gym
@@ -192,3 +196,167 @@ def test_step(env, actions, expect_observation):
     actual_observation = _transform(observation)
     print(actual_observation)
     assert actual_observation == expect_observation
+
+
+@pytest.mark.filterwarnings(f"ignore:{_GYMNASIUM_269}")
+def test_observations_are_independent(env, initial_observation):
+    """Stepping doesn't change previously returned observations."""
+    before = initial_observation.copy()
+    env.step(0)
+    assert np.array_equal(initial_observation, before)
+
+
+@pytest.mark.filterwarnings(f"ignore:{_GYMNASIUM_269}")
+def test_score_area(env, initial_observation):
+    """The score is shown in binary, least significant bit in the
+    middle, with bits alternating outwards."""
+    env.unwrapped._board.score = 0b1011
+    obs = env.unwrapped._observation
+    score_row = env.observation(obs)[1]
+    assert "".join(" #"[pix] for pix in score_row) == "       ###         "
+
+
+@pytest.mark.filterwarnings(f"ignore:{_GYMNASIUM_269}")
+def test_screens(env):
+    """Batched screens are the screens of each game."""
+    boards, choices, scores, expect = [], [], [], []
+    observation, info = env.reset(seed=23)
+    for action in (None, 0, (1, 0, 1), (2, 0, 7)):
+        if action is not None:
+            observation, _, _, _, info = env.step(action)
+        obs = env.unwrapped._observation
+        boards.append(obs["board"])
+        choices.append(obs["choices"])
+        scores.append(info["score"])
+        expect.append(observation)
+
+    actual = TinyScreen.screens(boards, choices, scores)
+    assert actual.dtype == np.uint8
+    assert np.array_equal(actual, expect)
+
+    out = np.ones((len(expect), 19, 19), dtype=np.uint8)
+    assert TinyScreen.screens(boards, choices, scores, out=out) is out
+    assert np.array_equal(out, expect)
+
+
+@pytest.mark.filterwarnings(f"ignore:{_GYMNASIUM_269}")
+def test_human_rendering(monkeypatch):
+    """In human mode screens are shown by a viewer process, without
+    stepping waiting for the display."""
+    pytest.importorskip("pygame")
+    monkeypatch.setenv("SDL_VIDEODRIVER", "dummy")
+    env = TinyScreen(gym.make("bkdk/BKDK-v0", render_mode="human"))
+    try:
+        env.reset(seed=23)
+        start = time.perf_counter()
+        for _ in range(120):
+            env.step(0)
+            env.reset()
+        # Stepping at 60 frames per second would take 4 seconds.
+        assert time.perf_counter() - start < 2
+        viewer = env._viewer
+        deadline = time.perf_counter() + 30
+        while not viewer.frames_drawn and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        assert viewer.frames_drawn
+    finally:
+        env.close()
+    assert viewer.closed
+
+
+def test_cell_renderer():
+    """Only changed cells are redrawn, and the result is the same as
+    drawing the whole screen."""
+    pygame = pytest.importorskip("pygame")
+    from bkdk.ts.viewer import CellRenderer
+
+    first = np.zeros((19, 19), dtype=np.uint8)
+    first[3, 4] = 1
+    second = first.copy()
+    second[3, 4] = 0
+    second[5, 6] = 1
+
+    renderer = CellRenderer(pygame.Surface((190, 190)), 10)
+    assert len(renderer.draw(first)) == 19 * 19
+    rects = renderer.draw(second)
+    assert sorted((rect.x, rect.y) for rect in rects) == [(40, 30),
+                                                          (60, 50)]
+    expect = CellRenderer(pygame.Surface((190, 190)), 10)
+    expect.draw(second)
+    assert np.array_equal(pygame.surfarray.array3d(renderer.surface),
+                          pygame.surfarray.array3d(expect.surface))
+
+
+@pytest.mark.filterwarnings(f"ignore:{_GYMNASIUM_269}")
+def test_rgb_array():
+    """rgb_array frames are drawn without pygame, exactly as pygame
+    draws them."""
+    from bkdk.ts.rgb import rgb_frames
+
+    env = TinyScreen(gym.make("bkdk/BKDK-v0", render_mode="rgb_array"))
+    screens = [env.reset(seed=23)[0]]
+    frames = [env.render()]
+    for action in (0, (1, 0, 1)):
+        screens.append(env.step(action)[0])
+        frames.append(env.render())
+    env.close()
+    assert frames[0].shape == (19 * 40, 19 * 40, 3)
+    assert frames[0].dtype == np.uint8
+    assert np.array_equal(rgb_frames(screens), frames)
+
+    pygame = pytest.importorskip("pygame")
+    from bkdk.ts.viewer import CellRenderer
+    renderer = CellRenderer(pygame.Surface((19 * 40, 19 * 40)), 40)
+    for screen, frame in zip(screens, frames):
+        renderer.draw(screen)
+        expect = pygame.surfarray.array3d(renderer.surface).swapaxes(0, 1)
+        assert np.array_equal(frame, expect)
+
+
+def test_viewer_from_unguarded_script(tmp_path):
+    """Viewers work from scripts whose top-level code isn't guarded
+    by if __name__ == "__main__"."""
+    pytest.importorskip("pygame")
+    script = tmp_path / "unguarded.py"
+    script.write_text("\n".join((
+        "import time",
+        "import numpy as np",
+        "from bkdk.ts.viewer import Viewer",
+        "viewer = Viewer()",
+        "viewer.show(np.ones((19, 19), dtype=np.uint8))",
+        "deadline = time.perf_counter() + 30",
+        "while not viewer.frames_drawn and time.perf_counter() < deadline:",
+        "    time.sleep(0.05)",
+        "print(viewer.frames_drawn, viewer.closed)",
+        "viewer.close()",
+        "print(viewer.closed)",
+    )))
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy")
+    result = subprocess.run([sys.executable, str(script)], env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["1", "False", "True"]
+
+
+def test_shared_screen(tmp_path):
+    """Screens are only read while no screen is being written."""
+    from bkdk.ts.viewer import _SEQUENCE, _SharedScreen
+
+    with open(tmp_path / "shared", "wb+") as fp:
+        fp.truncate(24 + 19 * 19)
+        shared = _SharedScreen(fp, (19, 19))
+    screen = np.ones((19, 19), dtype=np.uint8)
+    shared.write(screen)
+    sequence, copy = shared.read()
+    assert sequence == 2
+    assert np.array_equal(copy, screen)
+
+    # Part way through writing the next screen.
+    shared.counters[_SEQUENCE] += np.uint64(1)
+    shared.screen[:9] = 0
+    assert shared.read() is None
+    shared.counters[_SEQUENCE] += np.uint64(1)
+    sequence, copy = shared.read()
+    assert sequence == 4
+    assert copy[:9].sum() == 0
+    shared.close()